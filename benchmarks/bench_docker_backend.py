@@ -0,0 +1,68 @@
+"""
+Benchmark of the Docker backends used by the Firewall Tester.
+
+Runs the same operations (ps, inspect, exec, copy) through the docker CLI
+backend and the Engine API backend against one running container and prints
+the mean time per operation and the savings of the API backend.
+
+Usage (from the repository root, with Docker running):
+    python3 benchmarks/bench_docker_backend.py --container <id> [--iterations 20]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.docker_backend import ApiBackend, CliBackend  # noqa: E402
+
+
+def run_operations(backend, container_id, iterations, local_file):
+    """Runs every benchmarked operation `iterations` times on a backend."""
+    for _ in range(iterations):
+        backend.list_container_ids()
+        backend.inspect([container_id])
+        backend.exec(container_id, ["true"])
+        backend.exec(container_id, ["ip", "-4", "-json", "a"])
+        backend.copy_to(container_id, local_file, "/tmp/firewall_tester_bench.txt")
+    return backend.timing_summary()
+
+
+def main():
+    """
+        Main method.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the docker CLI and Engine API backends")
+    parser.add_argument("--container", required=True, help="ID or name of a running container")
+    parser.add_argument("--iterations", type=int, default=20, help="Repetitions of each operation")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("80/TCP\n53/UDP\n")
+        local_file = f.name
+
+    try:
+        cli = run_operations(CliBackend(), args.container, args.iterations, local_file)
+        try:
+            api = run_operations(ApiBackend(), args.container, args.iterations, local_file)
+        except Exception as e:
+            print(f"Engine API backend unavailable: {e}")
+            api = {}
+    finally:
+        os.unlink(local_file)
+
+    print(f"{'operation':<12}{'cli (ms)':>12}{'api (ms)':>12}{'saving':>10}")
+    for operation in sorted(cli):
+        cli_ms = cli[operation]["mean_ms"]
+        api_ms = api.get(operation, {}).get("mean_ms")
+        if api_ms is None:
+            print(f"{operation:<12}{cli_ms:>12.2f}{'-':>12}{'-':>10}")
+            continue
+        saving = (1 - api_ms / cli_ms) * 100 if cli_ms else 0.0
+        print(f"{operation:<12}{cli_ms:>12.2f}{api_ms:>12.2f}{saving:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
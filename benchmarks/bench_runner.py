@@ -0,0 +1,474 @@
+"""
+Overhead benchmark of the host side of the Firewall Tester.
+
+Measures what the tool itself costs around the docker calls: host discovery
+(ContainerManager.refresh_hosts), loading a test suite and
+resolving its hosts, running every test with TestRunner.run_single_test and
+analysing the results with TestRunner.analyze_test_result. No Docker is
+needed: the runner talks to ReplayBackend, which answers each docker call
+from a recording after a configurable latency.
+
+The recording holds the responses of a lab (ps, inspect, 'ip -4 -json a'
+and the listening sockets of each container). By default a synthetic lab of
+--hosts containers is used; --record FILE captures one from the running
+containers, and --recording FILE replays it. client.py results are not
+recorded, they are built for each probe: an allowed test is answered, a
+blocked one is either refused or dropped after reaching the destination (so
+the destination's log is read), alternately.
+
+Overhead is the wall time minus the latency injected by the backend. The
+throughput of each case can be saved as a baseline and later compared with
+it; the comparison exits with status 1 when a case lost more throughput
+than the tolerance, so it can guard against regressions.
+
+Usage (from the repository root, no Docker needed):
+    python3 benchmarks/bench_runner.py [--tests 300] [--latency-ms 1] [--save-baseline runner.json]
+    python3 benchmarks/bench_runner.py --baseline runner.json [--tolerance 0.3]
+    python3 benchmarks/bench_runner.py --suite tests/atividade-2026-01.json --recording lab.json
+    python3 benchmarks/bench_runner.py --record lab.json   # with Docker running
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from core.container_manager import ContainerManager  # noqa: E402
+from core.docker_backend import _TimingMixin, get_backend  # noqa: E402
+from core.port_inventory import LISTENING_SOCKETS_COMMAND  # noqa: E402
+from core.test_runner import TestRunner  # noqa: E402
+
+PORTS_CONF = os.path.join(REPO_DIR, "config", "ports.conf")
+IMAGE = "firewall_tester"
+
+
+def synthetic_recording(hosts):
+    """
+    Builds the recording of a lab of `hosts` tester containers, plus two
+    containers of other images that discovery must leave out. Every tester
+    container listens on the ports of config/ports.conf.
+
+    Returns:
+        dict: {"ps": [ids], "inspect": {id: dict}, "ip": {id: stdout}, "ss": {id: stdout}}
+    """
+    with open(PORTS_CONF, encoding="utf-8") as f:
+        ports = [line.strip().split("/") for line in f if "/" in line]
+    sockets = "".join(
+        f"tcp   LISTEN 0      128          0.0.0.0:{port}        0.0.0.0:*\n" if protocol.upper() == "TCP"
+        else f"udp   UNCONN 0      0            0.0.0.0:{port}        0.0.0.0:*\n"
+        for port, protocol in ports if protocol.upper() in ("TCP", "UDP")
+    )
+
+    recording = {"ps": [], "inspect": {}, "ip": {}, "ss": {}}
+    for index in range(1, hosts + 3):
+        container_id = f"{index:012x}"
+        tester = index <= hosts
+        name = f"host-{index}" if tester else f"other-{index}"
+        recording["ps"].append(container_id)
+        recording["inspect"][container_id] = {
+            "Id": container_id * 5 + container_id[:4],
+            "Name": f"/{name}",
+            "Config": {"Hostname": name, "Image": f"{IMAGE}:latest" if tester else "postgres:16"},
+            "State": {"Running": True},
+        }
+        if tester:
+            recording["ip"][container_id] = json.dumps([
+                {"ifindex": 1, "ifname": "lo", "addr_info": [{"family": "inet", "local": "127.0.0.1", "prefixlen": 8}]},
+                {"ifindex": 2, "ifname": "eth0",
+                 "addr_info": [{"family": "inet", "local": f"172.31.{index // 250}.{index % 250 + 1}", "prefixlen": 16}]},
+            ])
+            recording["ss"][container_id] = sockets
+    return recording
+
+
+def record(path, backend_name):
+    """Records the responses of the running containers into a file."""
+    backend = get_backend(backend_name)
+    container_ids = backend.list_container_ids()
+    recording = {"ps": container_ids, "inspect": {}, "ip": {}, "ss": {}}
+    for data in backend.inspect(container_ids):
+        container_id = next((cid for cid in container_ids if data["Id"].startswith(cid)), data["Id"])
+        recording["inspect"][container_id] = data
+        if IMAGE in data["Config"]["Image"]:
+            recording["ip"][container_id] = backend.exec(container_id, ["ip", "-4", "-json", "a"]).stdout
+            recording["ss"][container_id] = backend.exec(container_id, ["sh", "-c", LISTENING_SOCKETS_COMMAND]).stdout
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(recording, f, indent=4)
+    print(f"Recorded {len(recording['ip'])} tester containers (of {len(container_ids)}) to {path}")
+
+
+class ReplayBackend(_TimingMixin):
+    """
+    A docker backend answering from a recording. Every call sleeps for the
+    configured latency first; the time spent sleeping is kept so it can be
+    taken out of the measurements.
+    """
+    name = "replay"
+
+    def __init__(self, recording, latency_ms=1.0):
+        self._init_timings()
+        self.recording = recording
+        self.latency = latency_ms / 1000
+        self.slept = 0.0
+        self._sleeping = 0
+        self._sleeping_since = 0.0
+        self._slept_lock = threading.Lock()
+        # What the fake client does for each (dst_ip, protocol, port): 'allowed', 'refused' or 'dropped'.
+        self.policy = {}
+        self._container_by_ip = {}
+        for container_id, stdout in recording["ip"].items():
+            for interface in json.loads(stdout or "[]"):
+                for address in interface.get("addr_info", []):
+                    self._container_by_ip[address.get("local")] = container_id
+        self._logs = {}  # destination container: server log bytes
+        self._logs_lock = threading.Lock()
+
+    def _wait(self):
+        # Calls waiting in parallel overlap: only the time during which at
+        # least one of them waits is counted as injected latency.
+        started = time.perf_counter()
+        with self._slept_lock:
+            if not self._sleeping:
+                self._sleeping_since = started
+            self._sleeping += 1
+        if self.latency:
+            time.sleep(self.latency)
+        with self._slept_lock:
+            self._sleeping -= 1
+            if not self._sleeping:
+                self.slept += time.perf_counter() - self._sleeping_since
+        return started
+
+    def list_container_ids(self, image=None):
+        """Returns the IDs of the recorded containers, only those of an image if given."""
+        started = self._wait()
+        self._record("ps", started)
+        return [cid for cid in self.recording["ps"]
+                if image is None or image in self.recording["inspect"].get(cid, {}).get("Config", {}).get("Image", "")]
+
+    def inspect(self, container_ids):
+        """Returns the recorded inspect dictionaries, with one call for any number of IDs."""
+        started = self._wait()
+        self._record("inspect", started)
+        return [self.recording["inspect"][cid] for cid in container_ids if cid in self.recording["inspect"]]
+
+    def exec(self, container_id, cmd, timeout=None, detach=False, workdir=None):
+        """Answers the commands the runner and the container manager send."""
+        started = self._wait()
+        try:
+            return subprocess.CompletedProcess(cmd, *self._answer(container_id, cmd))
+        finally:
+            self._record("exec", started)
+
+    def exec_stream(self, container_id, cmd, timeout=None, stop=None):
+        """Arrival events are not replayed: the runner reads the server log instead."""
+        return iter(())
+
+    def copy_to(self, container_id, local_path, container_path):
+        """Accepts the copy without doing anything."""
+        started = self._wait()
+        self._record("copy", started)
+        return subprocess.CompletedProcess([], 0, stdout="", stderr="")
+
+    def _answer(self, container_id, cmd):
+        """Returns (returncode, stdout, stderr) for a command."""
+        if cmd == ["ip", "-4", "-json", "a"] and container_id in self.recording["ip"]:
+            return 0, self.recording["ip"][container_id], ""
+        if cmd == ["sh", "-c", LISTENING_SOCKETS_COMMAND] and container_id in self.recording["ss"]:
+            return 0, self.recording["ss"][container_id], ""
+        if len(cmd) > 5 and cmd[1].endswith("client.py"):
+            return 0, json.dumps(self._client_result(*cmd[2:6])), ""
+        if cmd[:2] == ["sh", "-c"] and "server_log.jsonl" in cmd[2]:
+            offset = re.search(r"tail -c \+(\d+)", cmd[2])
+            with self._logs_lock:
+                log = bytes(self._logs.get(container_id, b""))
+            start = int(offset.group(1)) - 1 if offset else 0
+            return 0, f"1\n{log[start:].decode('utf-8')}", ""
+        return 1, "", f"replay: no recorded response for {cmd}"
+
+    def _client_result(self, dst_ip, protocol, port, test_id):
+        """Builds the JSON client.py prints for one probe, following the policy."""
+        behaviour = self.policy.get((dst_ip, protocol, str(port)), "allowed")
+        result = {
+            "id": test_id, "timestamp_teste": "2025", "client_ip": "172.31.0.250", "client_port": 40000,
+            "server_ip": dst_ip, "server_port": int(port), "protocol": protocol,
+            "server_response": behaviour == "allowed", "status": "0",
+            "status_msg": "ok", "message": "Test successfully completed",
+            "outcome": {"allowed": "received", "refused": "refused", "dropped": "timeout"}[behaviour],
+            "rtt": {"samples": 1, "min_ms": 0.21, "p50_ms": 0.21, "p95_ms": 0.21, "max_ms": 0.21},
+            "client_timing": {"startup_ms": None, "probe_ms": 0.3},
+        }
+        destination = self._container_by_ip.get(dst_ip)
+        if behaviour == "dropped" and destination is not None:
+            # The probe reached the destination, the reply was dropped on the way back.
+            entry = {"id": test_id, "protocol": protocol, "server_ip": dst_ip, "server_port": int(port),
+                     "client_ip": result["client_ip"], "client_port": result["client_port"], "packet_arrived": True}
+            with self._logs_lock:
+                self._logs.setdefault(destination, bytearray()).extend((json.dumps(entry) + "\n").encode("utf-8"))
+        return result
+
+
+def generate_suite(path, hosts_data, tests):
+    """Writes a suite of `tests` rows between the discovered hosts, in the format saved by the Tests tab."""
+    ports = [("TCP", "80"), ("TCP", "22"), ("UDP", "53"), ("TCP", "443"), ("ICMP", "1"), ("UDP", "123")]
+    rows = []
+    pairs = [(src, dst) for src in hosts_data for dst in hosts_data if src is not dst] or [(hosts_data[0], hosts_data[0])]
+    for index, ((src, dst), (protocol, port)) in enumerate(zip(itertools.cycle(pairs), itertools.cycle(ports))):
+        if index == tests:
+            break
+        rows.append({
+            "#": str(index + 1), "Container ID": src["id"],
+            "Source": f"{src['hostname']} ({src['ip'].split(', ')[0]})",
+            "Destination": f"{dst['hostname']} ({dst['ip'].split(', ')[0]})",
+            "Protocol": protocol, "Src Port": "*", "Dst Port": port,
+            "Expected": "Allowed" if index % 3 else "Blocked",
+            "src_hostname_only": src["hostname"],
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=4)
+
+
+def hosts_map_of(hosts_data):
+    """Builds the {display text: {"id", "hostname", "ip"}} map of the Tests tab (update_hosts_list)."""
+    hosts_map = {}
+    for host in hosts_data:
+        for ip in [ip.strip() for ip in host["ip"].split(",")] if host["ip"] != "N/A" else ["N/A"]:
+            display_text = host["hostname"] if ip == "N/A" else f"{host['hostname']} ({ip})"
+            hosts_map[display_text] = {"id": host["id"], "hostname": host["hostname"],
+                                       "ip": host["hostname"] if ip == "N/A" else ip}
+    return hosts_map
+
+
+def load_suite(path, hosts_map):
+    """
+    Loads a suite and resolves its hosts the way the Tests tab does
+    (_load_from_file, then TestWorker._build_test_spec), without the dialogs:
+    rows whose source host is not in the lab are skipped.
+
+    Returns:
+        list: Test specs {"container_id", "destination_ip", "protocol", "dst_port",
+              "container_id_destination", "expected"}.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        tests_data = json.load(f)
+
+    by_hostname = {}
+    for display_text, data in hosts_map.items():
+        by_hostname.setdefault(data["hostname"], (data["id"], display_text))
+
+    specs = []
+    for test in tests_data:
+        src_hostname = test.get("src_hostname_only") or test.get("Source", test.get("Origem", "")).split(" (")[0]
+        src_id, _ = by_hostname.get(src_hostname, (None, None))
+        if src_id is None:
+            continue
+        dst_text = test.get("Destination", test.get("Destino", ""))
+        dst_hostname = dst_text.split(" (")[0].strip()
+        dst_id, dst_display = by_hostname.get(dst_hostname, (None, dst_text))
+        protocol = test.get("Protocol", test.get("Protocolo", ""))
+        expected = test.get("Expected", test.get("Esperado", ""))
+
+        destination = hosts_map.get(dst_display) or next(
+            (data for data in hosts_map.values() if data["hostname"] == dst_hostname), None)
+        specs.append({
+            "container_id": src_id,
+            "destination_ip": destination["ip"] if destination else dst_text,
+            "protocol": protocol,
+            "dst_port": "1" if protocol.upper() == "ICMP" else test.get("Dst Port", test.get("P. Destino", "")),
+            "container_id_destination": dst_id,
+            "expected": "yes" if expected == "Allowed" else "no",
+        })
+    return specs
+
+
+def set_policy(backend, specs):
+    """Allowed tests are answered; blocked ones are refused or dropped, alternately."""
+    blocked = itertools.cycle(["refused", "dropped"])
+    for spec in specs:
+        key = (spec["destination_ip"], spec["protocol"].lower(), str(spec["dst_port"]))
+        backend.policy[key] = "allowed" if spec["expected"] == "yes" else next(blocked)
+
+
+class Case:
+    """Wall time and injected latency of the rounds of one benchmarked case."""
+    def __init__(self, backend, unit):
+        self.backend = backend
+        self.unit = unit
+        self.rounds = []  # (operations, wall seconds, slept seconds)
+
+    @contextlib.contextmanager
+    def round(self, operations):
+        """Measures one round of `operations` operations."""
+        slept = self.backend.slept
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            yield
+        self.rounds.append((operations, time.perf_counter() - started, self.backend.slept - slept))
+
+    def summary(self):
+        """Returns {"unit", "per_s", "overhead_ms"}: medians over the rounds."""
+        return {
+            "unit": self.unit,
+            "per_s": round(statistics.median(n / wall for n, wall, _ in self.rounds), 1),
+            "overhead_ms": round(statistics.median((wall - slept) / n * 1000 for n, wall, slept in self.rounds), 4),
+        }
+
+
+def run_cases(backend, suite_path, rounds, repeat):
+    """
+    Runs every case `rounds` times; the fast ones (suite loading, analysis)
+    are repeated `repeat` times in each round.
+
+    Returns:
+        dict: {case: {"unit", "per_s", "overhead_ms"}} and the number of tests per round.
+    """
+    manager = ContainerManager(docker_image_name=IMAGE, backend=backend)
+    runner = TestRunner(use_agent=False, backend=backend, port_inventory=manager.port_inventory,
+                        adaptive_timeouts=False)
+    cases = {name: Case(backend, unit) for name, unit in [
+        ("discovery", "discovery"), ("suite_load", "suite"),
+        ("run_single_test", "test"), ("analyze_test_result", "analysis")]}
+
+    try:
+        for _ in range(rounds):
+            with cases["discovery"].round(1):
+                hosts_data = manager.refresh_hosts()
+            hosts_map = hosts_map_of(hosts_data)
+
+            with cases["suite_load"].round(repeat):
+                for _ in range(repeat):
+                    specs = load_suite(suite_path, hosts_map)
+            if not specs:
+                raise SystemExit(f"No test of {suite_path} has its source host in the recorded lab.")
+            set_policy(backend, specs)
+
+            results = []
+            manager.port_inventory.invalidate()
+            with cases["run_single_test"].round(len(specs)):
+                for spec in specs:
+                    _, result = runner.run_single_test(spec["container_id"], spec["destination_ip"], spec["protocol"],
+                                                       spec["dst_port"], spec["container_id_destination"])
+                    results.append((spec["expected"], result))
+            runner.end_run()
+
+            with cases["analyze_test_result"].round(len(results) * repeat):
+                for _ in range(repeat):
+                    for expected, result in results:
+                        runner.analyze_test_result(expected, result)
+    finally:
+        runner.close()
+    return {name: case.summary() for name, case in cases.items()}, len(specs)
+
+
+def compare(summary, baseline, tolerance):
+    """
+    Compares the throughput of each case with a baseline.
+
+    Returns:
+        list: The cases slower than the baseline allows.
+    """
+    regressions = []
+    print(f"\n{'case':<22}{'baseline/s':>14}{'now/s':>14}{'change':>10}")
+    for case, values in summary.items():
+        reference = baseline.get("cases", {}).get(case, {}).get("per_s")
+        if reference is None:
+            print(f"{case:<22}{'-':>14}{values['per_s']:>14.1f}{'-':>10}")
+            continue
+        change = (values["per_s"] / reference - 1) * 100 if reference else 0.0
+        flag = ""
+        if values["per_s"] < reference * (1 - tolerance):
+            regressions.append(case)
+            flag = "  REGRESSION"
+        print(f"{case:<22}{reference:>14.1f}{values['per_s']:>14.1f}{change:>9.1f}%{flag}")
+    return regressions
+
+
+def main():
+    """
+        Main method.
+    """
+    parser = argparse.ArgumentParser(description="Overhead benchmark of the test runner with a replayed docker backend")
+    parser.add_argument("--hosts", type=int, default=12, help="Tester containers of the synthetic lab")
+    parser.add_argument("--tests", type=int, default=300, help="Rows of the generated suite")
+    parser.add_argument("--suite", metavar="FILE", help="Use a saved test suite instead of a generated one")
+    parser.add_argument("--recording", metavar="FILE", help="Replay a lab recorded with --record")
+    parser.add_argument("--record", metavar="FILE", help="Record the running containers and exit (needs Docker)")
+    parser.add_argument("--backend", choices=["cli", "api"], default="cli", help="Backend used by --record")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Latency of every replayed docker call")
+    parser.add_argument("--rounds", type=int, default=5, help="Repetitions of each case")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="Passes of suite loading and analysis in each round")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Write the results as a baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="Allowed loss of throughput of each case over the baseline (default: 0.3)")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.backend)
+        return
+
+    if args.recording:
+        with open(args.recording, encoding="utf-8") as f:
+            recording = json.load(f)
+    else:
+        recording = synthetic_recording(args.hosts)
+    backend = ReplayBackend(recording, args.latency_ms)
+
+    suite_path = args.suite
+    workdir = None
+    if suite_path is None:
+        workdir = tempfile.mkdtemp(prefix="firewall_tester_runner_")
+        suite_path = os.path.join(workdir, "suite.json")
+        with contextlib.redirect_stdout(io.StringIO()):
+            hosts_data = ContainerManager(docker_image_name=IMAGE, backend=ReplayBackend(recording, 0)).get_all_containers_data()
+        if not hosts_data:
+            raise SystemExit("The recording holds no tester container.")
+        generate_suite(suite_path, hosts_data, args.tests)
+
+    try:
+        summary, tests = run_cases(backend, suite_path, args.rounds, args.repeat)
+    finally:
+        if workdir:
+            os.unlink(suite_path)
+            os.rmdir(workdir)
+
+    settings = {"containers": len(recording["ip"]), "tests": tests, "latency_ms": args.latency_ms}
+    print(f"Python {sys.version.split()[0]}, {settings['containers']} containers, {tests} tests, "
+          f"{args.latency_ms:g} ms per docker call, {args.rounds} rounds")
+    print(f"{'case':<22}{'per second':>14}{'overhead (ms)':>16}")
+    for case, values in summary.items():
+        print(f"{case:<22}{values['per_s']:>14.1f}{values['overhead_ms']:>16.4f}  per {values['unit']}")
+    calls = backend.timing_summary()
+    print("docker calls: " + ", ".join(f"{operation} {values['count']}" for operation, values in sorted(calls.items())))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"settings": settings, "cases": summary}, f, indent=4)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != settings:
+            print(f"\nWarning: the baseline was taken with {baseline.get('settings')}; throughput is not comparable.")
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            print(f"\nThroughput regression in: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
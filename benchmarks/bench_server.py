@@ -0,0 +1,396 @@
+"""
+Load benchmark of server.py.
+
+Starts server.py on 127.0.0.1, in a temporary directory, with a generated
+conf/ports.conf of --tcp-ports TCP and --udp-ports UDP ports, then keeps it
+busy for --duration seconds: --connections TCP clients, each sending
+--exchanges probes per connection before opening the next one, and
+--udp-senders UDP clients, each waiting for the answer to its datagram
+before sending the next one. Probes are frames in client.py's format (see
+core/wire.py) and every client moves to the next port after each connection
+or datagram. The clients run in --processes processes, so the load generator
+is not held back by one interpreter.
+
+Reported: sustained answers per second (total and per protocol), the time
+the server spent on each probe (server_sent_ns - server_received_ns of the
+responses, p50/p99), the round trip seen by the clients, unanswered probes,
+and the peak thread count and resident memory of the server processes
+(sampled from /proc, workers included).
+
+The answers per second can be saved as a baseline and later compared with
+it; the comparison exits with status 1 when the server lost more throughput
+than the tolerance.
+
+Usage (from the repository root, no Docker needed; Linux):
+    python3 benchmarks/bench_server.py [--duration 10] [--connections 64] [--udp-senders 16]
+    python3 benchmarks/bench_server.py --workers 4 --tcp-ports 200 --save-baseline server.json
+    python3 benchmarks/bench_server.py --baseline server.json [--tolerance 0.15]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from core import wire  # noqa: E402
+
+SERVER = os.path.join(REPO_DIR, "core", "server.py")
+HOST = "127.0.0.1"
+SAMPLE_INTERVAL = 0.5  # seconds between /proc samples of the server
+
+
+def free_ports(count, kind):
+    """Returns `count` distinct ports that are free on 127.0.0.1 for a socket type."""
+    sockets = []
+    try:
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, kind)
+            sock.bind((HOST, 0))
+            sockets.append(sock)
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def start_server(workdir, tcp_ports, workers, timeout=30.0):
+    """
+    Starts server.py and waits until all its TCP ports accept connections.
+
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    command = [sys.executable, SERVER]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    proc = subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    pending = list(tcp_ports)
+    while pending and time.monotonic() < deadline:
+        try:
+            with socket.create_connection((HOST, pending[-1]), timeout=0.1):
+                pending.pop()
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.01)
+    if pending:
+        stop_server(proc)
+        raise RuntimeError("server.py did not open its ports; see the server's output by running it by hand")
+    return proc
+
+
+def stop_server(proc):
+    """Stops server.py and its workers."""
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def server_pids(pid):
+    """Returns the server's PID and those of its child processes (workers)."""
+    pids = [pid]
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The PPID follows the command name, which may hold spaces.
+                if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    pids.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return pids
+
+
+def process_usage(pids):
+    """
+    Returns:
+        tuple: (threads, resident memory in bytes) summed over the processes.
+    """
+    threads = rss = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("Threads:"):
+                        threads += int(line.split()[1])
+                    elif line.startswith("VmRSS:"):
+                        rss += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return threads, rss
+
+
+class UsageSampler(threading.Thread):
+    """Samples the thread count and memory of the server processes until stopped."""
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak_threads = 0
+        self.peak_rss = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            threads, rss = process_usage(server_pids(self.pid))
+            self.peak_threads = max(self.peak_threads, threads)
+            self.peak_rss = max(self.peak_rss, rss)
+            self.stopped.wait(SAMPLE_INTERVAL)
+
+
+def probe_frame(protocol, port, sequence, payload):
+    """Builds a probe frame like the ones client.py sends."""
+    metadata = {
+        "id": sequence,
+        "timestamp_teste": "bench",
+        "timestamp_send": "",
+        "timestamp_recv": "",
+        "client_host": "bench",
+        "client_ip": HOST,
+        "client_port": 0,
+        "server_ip": HOST,
+        "server_port": port,
+        "protocol": protocol,
+        "server_response": False,
+        "status": "0",
+        "status_msg": "ok",
+        "message": "Load benchmark",
+        "sent_ns": time.time_ns(),
+    }
+    return wire.encode_frame(wire.PROBE, metadata, payload)
+
+
+class ClientStats:
+    """What the clients of one load process saw."""
+    def __init__(self):
+        self.sent = {"tcp": 0, "udp": 0}
+        self.answered = {"tcp": 0, "udp": 0}
+        self.handling_ns = []
+        self.rtt_ns = []
+        self.lock = threading.Lock()
+
+    def add(self, protocol, answered, handling_ns=None, rtt_ns=None):
+        """Records one probe."""
+        with self.lock:
+            self.sent[protocol] += 1
+            if answered:
+                self.answered[protocol] += 1
+                if handling_ns is not None:
+                    self.handling_ns.append(handling_ns)
+                self.rtt_ns.append(rtt_ns)
+
+
+def _answer(metadata, started):
+    handling = metadata.get("server_sent_ns", 0) - metadata.get("server_received_ns", 0)
+    return (handling if "server_sent_ns" in metadata else None), time.monotonic_ns() - started
+
+
+def tcp_client(index, ports, exchanges, payload, end, stats):
+    """Opens connections until `end`, sending `exchanges` probes over each one."""
+    sequence = index * 10_000_000
+    while time.monotonic() < end:
+        port = ports[sequence % len(ports)]
+        try:
+            with socket.create_connection((HOST, port), timeout=5) as sock:
+                for _ in range(exchanges):
+                    sequence += 1
+                    started = time.monotonic_ns()
+                    sock.sendall(probe_frame("tcp", port, sequence, payload))
+                    frame_type, metadata, _ = wire.read_frame(sock)
+                    stats.add("tcp", frame_type == wire.RESPONSE, *_answer(metadata, started))
+        except (OSError, wire.WireError):
+            sequence += 1
+            stats.add("tcp", False)
+
+
+def udp_client(index, ports, payload, end, stats):
+    """Sends datagrams until `end`, each after the answer to the previous one (or its timeout)."""
+    sequence = index * 10_000_000
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(1.0)
+        while time.monotonic() < end:
+            sequence += 1
+            port = ports[sequence % len(ports)]
+            started = time.monotonic_ns()
+            try:
+                sock.sendto(probe_frame("udp", port, sequence, payload), (HOST, port))
+                while True:
+                    data, (_, source_port) = sock.recvfrom(65535)
+                    if source_port == port:
+                        break  # a late answer to an earlier datagram is skipped
+                frame = wire.decode_frame(data)
+                stats.add("udp", frame is not None and frame[0] == wire.RESPONSE, *_answer(frame[1], started))
+            except (OSError, wire.WireError, TypeError):
+                stats.add("udp", False)
+
+
+def run_load_process(job):
+    """
+    Runs the clients of one load process; called in a child process.
+
+    Returns:
+        dict: sent/answered per protocol and the handling and RTT samples (ns).
+    """
+    index, tcp_ports, udp_ports, tcp_clients, udp_clients, exchanges, payload_size, start, duration = job
+    payload = bytes(payload_size)
+    stats = ClientStats()
+    # Every process starts at the same moment, so they all load the server together.
+    time.sleep(max(0.0, start - time.time()))
+    end = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=tcp_client, args=(index * 1000 + n, tcp_ports, exchanges, payload, end, stats))
+        for n in range(tcp_clients)
+    ] + [
+        threading.Thread(target=udp_client, args=(index * 1000 + n, udp_ports, payload, end, stats))
+        for n in range(udp_clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"sent": stats.sent, "answered": stats.answered, "handling_ns": stats.handling_ns, "rtt_ns": stats.rtt_ns}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    return values[min(len(values) - 1, max(0, int(len(values) * fraction + 0.5) - 1))]
+
+
+def split(total, parts):
+    """Splits `total` into `parts` integers that differ by at most one."""
+    return [total // parts + (1 if n < total % parts else 0) for n in range(parts)]
+
+
+def run_load(args, tcp_ports, udp_ports):
+    """Runs the load processes and merges their results into the report."""
+    processes = max(1, min(args.processes, max(args.connections, args.udp_senders)))
+    start = time.time() + 1.0
+    jobs = [
+        (index, tcp_ports, udp_ports, tcp_clients, udp_clients, args.exchanges, args.payload_size,
+         start, args.duration)
+        for index, (tcp_clients, udp_clients) in enumerate(
+            zip(split(args.connections if tcp_ports else 0, processes),
+                split(args.udp_senders if udp_ports else 0, processes)))
+    ]
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(run_load_process, jobs)
+
+    sent = {protocol: sum(result["sent"][protocol] for result in results) for protocol in ("tcp", "udp")}
+    answered = {protocol: sum(result["answered"][protocol] for result in results) for protocol in ("tcp", "udp")}
+    handling = sorted(ns for result in results for ns in result["handling_ns"])
+    rtts = sorted(ns for result in results for ns in result["rtt_ns"])
+
+    def latency(values):
+        if not values:
+            return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+        return {"p50_ms": round(percentile(values, 0.50) / 1e6, 4),
+                "p99_ms": round(percentile(values, 0.99) / 1e6, 4),
+                "max_ms": round(values[-1] / 1e6, 4)}
+
+    return {
+        "msgs_per_s": round(sum(answered.values()) / args.duration, 1),
+        "tcp_msgs_per_s": round(answered["tcp"] / args.duration, 1),
+        "udp_msgs_per_s": round(answered["udp"] / args.duration, 1),
+        "sent": sum(sent.values()),
+        "unanswered": sum(sent.values()) - sum(answered.values()),
+        "handling": latency(handling),
+        "rtt": latency(rtts),
+    }
+
+
+def main():
+    """
+        Main method.
+    """
+    parser = argparse.ArgumentParser(description="Load benchmark of server.py")
+    parser.add_argument("--tcp-ports", type=int, default=10, help="TCP ports in the generated ports.conf")
+    parser.add_argument("--udp-ports", type=int, default=10, help="UDP ports in the generated ports.conf")
+    parser.add_argument("--connections", type=int, default=64, help="Concurrent TCP clients")
+    parser.add_argument("--exchanges", type=int, default=1,
+                        help="Probes sent over each TCP connection (client.py --exchanges)")
+    parser.add_argument("--udp-senders", type=int, default=16, help="Concurrent UDP clients")
+    parser.add_argument("--payload-size", type=int, default=0, help="Payload bytes of each probe")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    parser.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Processes running the clients")
+    parser.add_argument("--workers", type=int, default=1, help="server.py --workers")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Write the results as a baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed loss of msgs/sec over the baseline (default: 0.15)")
+    args = parser.parse_args()
+
+    tcp_ports = free_ports(args.tcp_ports, socket.SOCK_STREAM)
+    udp_ports = free_ports(args.udp_ports, socket.SOCK_DGRAM)
+    workdir = tempfile.mkdtemp(prefix="firewall_tester_load_")
+    os.makedirs(os.path.join(workdir, "conf"))
+    with open(os.path.join(workdir, "conf", "ports.conf"), "w") as f:
+        f.writelines([f"{port}/tcp\n" for port in tcp_ports] + [f"{port}/udp\n" for port in udp_ports])
+
+    try:
+        proc = start_server(workdir, tcp_ports, args.workers)
+        idle_threads, idle_rss = process_usage(server_pids(proc.pid))
+        sampler = UsageSampler(proc.pid)
+        sampler.start()
+        try:
+            report = run_load(args, tcp_ports, udp_ports)
+        finally:
+            sampler.stopped.set()
+            sampler.join()
+            stop_server(proc)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report["threads"] = {"idle": idle_threads, "peak": sampler.peak_threads}
+    report["rss_mb"] = {"idle": round(idle_rss / 2**20, 1), "peak": round(sampler.peak_rss / 2**20, 1)}
+    settings = {key: getattr(args, key) for key in (
+        "tcp_ports", "udp_ports", "connections", "exchanges", "udp_senders", "payload_size", "duration", "workers")}
+
+    print(f"Python {sys.version.split()[0]}, {args.duration:g} s, " + ", ".join(f"{k} {v}" for k, v in settings.items()
+                                                                         if k != "duration"))
+    print(f"{'answered/s':<22}{report['msgs_per_s']:>12.1f}  (TCP {report['tcp_msgs_per_s']:.1f}, "
+          f"UDP {report['udp_msgs_per_s']:.1f})")
+    print(f"{'sent / unanswered':<22}{report['sent']:>12}  / {report['unanswered']}")
+    for name, label in (("handling", "handling (ms)"), ("rtt", "client RTT (ms)")):
+        values = report[name]
+        if values["p50_ms"] is None:
+            print(f"{label:<22}{'-':>12}")
+            continue
+        print(f"{label:<22}{'p50':>6} {values['p50_ms']:.4f}  p99 {values['p99_ms']:.4f}  max {values['max_ms']:.4f}")
+    print(f"{'server threads':<22}{report['threads']['peak']:>12}  (idle {report['threads']['idle']})")
+    print(f"{'server RSS (MB)':<22}{report['rss_mb']['peak']:>12.1f}  (idle {report['rss_mb']['idle']:.1f})")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"settings": settings, "report": report}, f, indent=4)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != settings:
+            print(f"\nWarning: the baseline was taken with {baseline.get('settings')}; throughput is not comparable.")
+        reference = baseline["report"]["msgs_per_s"]
+        change = (report["msgs_per_s"] / reference - 1) * 100 if reference else 0.0
+        print(f"\nanswered/s: baseline {reference:.1f}, now {report['msgs_per_s']:.1f} ({change:+.1f}%)")
+        if report["msgs_per_s"] < reference * (1 - args.tolerance):
+            print("Throughput regression of server.py")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
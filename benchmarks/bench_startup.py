@@ -0,0 +1,196 @@
+"""
+Start-up benchmark of the container-side programs of the Firewall Tester.
+
+Every test that does not go through a probe agent pays a cold start of
+client.py, and every host pays one of server.py, so their start-up time is
+measured on its own: the bare interpreter, client.py for one TCP, UDP and
+ICMP probe against a local server.py, and server.py until its first port
+accepts connections. Everything runs on 127.0.0.1, in a temporary directory
+that receives the logs.
+
+The median of each case can be saved as a baseline and later compared with
+it; the comparison exits with status 1 when a case got slower than the
+baseline by more than the tolerance, so it can guard against regressions.
+
+Usage (from the repository root, no Docker needed):
+    python3 benchmarks/bench_startup.py [--runs 20] [--save-baseline startup.json]
+    python3 benchmarks/bench_startup.py --baseline startup.json [--tolerance 0.25]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+CLIENT = os.path.join(CORE_DIR, "client.py")
+SERVER = os.path.join(CORE_DIR, "server.py")
+
+# A case is a regression when its median exceeds baseline x (1 + tolerance)
+# plus this many milliseconds, which absorbs the noise of very short cases.
+ABSOLUTE_SLACK_MS = 5.0
+
+
+def free_port():
+    """Returns a TCP port that is free on 127.0.0.1 (also used for UDP)."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def timed_run(command, workdir):
+    """Runs a command to completion and returns its wall time in milliseconds."""
+    started = time.perf_counter()
+    subprocess.run(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def start_server(workdir, port, timeout=10.0):
+    """
+    Starts server.py and waits until its TCP port accepts connections.
+
+    Returns:
+        tuple: (process, milliseconds until the port accepted a connection)
+    """
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, SERVER], cwd=workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return proc, (time.perf_counter() - started) * 1000
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.002)
+    stop_server(proc)
+    raise RuntimeError("server.py did not open its port; see the server's output by running it by hand")
+
+
+def stop_server(proc):
+    """Stops a server.py started by start_server."""
+    proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def run_cases(runs, workdir, port):
+    """
+    Runs every case `runs` times.
+
+    Returns:
+        dict: {case: [milliseconds, ...]}
+    """
+    client_cases = {
+        "client_tcp": [sys.executable, CLIENT, "127.0.0.1", "tcp", str(port), "1", "bench", "0", "--timeout", "1"],
+        "client_udp": [sys.executable, CLIENT, "127.0.0.1", "udp", str(port), "2", "bench", "0", "--timeout", "1"],
+        "client_icmp": [sys.executable, CLIENT, "127.0.0.1", "icmp", "1", "3", "bench", "0", "--timeout", "1"],
+    }
+    samples = {"python": [], "server": [], **{case: [] for case in client_cases}}
+
+    for _ in range(runs):
+        samples["python"].append(timed_run([sys.executable, "-c", "pass"], workdir))
+        proc, elapsed = start_server(workdir, port)
+        samples["server"].append(elapsed)
+        stop_server(proc)
+
+    proc, _ = start_server(workdir, port)
+    try:
+        for _ in range(runs):
+            for case, command in client_cases.items():
+                samples[case].append(timed_run(command, workdir))
+    finally:
+        stop_server(proc)
+    return samples
+
+
+def summarize(samples):
+    """Returns {case: {"median_ms", "p95_ms", "min_ms"}} for the samples of each case."""
+    summary = {}
+    for case, values in samples.items():
+        ordered = sorted(values)
+        summary[case] = {
+            "median_ms": round(statistics.median(ordered), 2),
+            "p95_ms": round(ordered[max(0, int(len(ordered) * 0.95 + 0.5) - 1)], 2),
+            "min_ms": round(ordered[0], 2),
+        }
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    """
+    Compares the medians with a baseline.
+
+    Returns:
+        list: The cases slower than the baseline allows.
+    """
+    regressions = []
+    print(f"\n{'case':<14}{'baseline':>12}{'now':>12}{'change':>10}")
+    for case, values in summary.items():
+        reference = baseline.get(case, {}).get("median_ms")
+        if reference is None:
+            print(f"{case:<14}{'-':>12}{values['median_ms']:>12.2f}{'-':>10}")
+            continue
+        change = (values["median_ms"] / reference - 1) * 100 if reference else 0.0
+        flag = ""
+        if values["median_ms"] > reference * (1 + tolerance) + ABSOLUTE_SLACK_MS:
+            regressions.append(case)
+            flag = "  REGRESSION"
+        print(f"{case:<14}{reference:>12.2f}{values['median_ms']:>12.2f}{change:>9.1f}%{flag}")
+    return regressions
+
+
+def main():
+    """
+        Main method.
+    """
+    parser = argparse.ArgumentParser(description="Start-up benchmark of client.py and server.py")
+    parser.add_argument("--runs", type=int, default=20, help="Repetitions of each case")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Write the results as a baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown of each median over the baseline (default: 0.25)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="firewall_tester_startup_")
+    port = free_port()
+    os.makedirs(os.path.join(workdir, "conf"))
+    with open(os.path.join(workdir, "conf", "ports.conf"), "w") as f:
+        f.write(f"{port}/tcp\n{port}/udp\n")
+
+    try:
+        summary = summarize(run_cases(args.runs, workdir, port))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Python {sys.version.split()[0]}, {args.runs} runs per case")
+    print(f"{'case':<14}{'median (ms)':>12}{'p95 (ms)':>12}{'min (ms)':>12}")
+    for case, values in summary.items():
+        print(f"{case:<14}{values['median_ms']:>12.2f}{values['p95_ms']:>12.2f}{values['min_ms']:>12.2f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=4)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            print(f"\nStart-up regression in: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/local/bin/python
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""
+    Program Name: Firewall Tester - Probe Agent
+    Description: Long-lived process that runs inside each tester container and
+    executes client probes on request, so the interface does not need to start
+    a new docker exec and Python interpreter for every test.
+
+    Protocol: one JSON object per line on stdin, for example
+        {"request_id": "7", "server_host": "10.0.0.2", "protocol": "tcp",
+         "server_port": 80, "test_id": "1234", "timestamp": "2025", "timeout": 0.2}
+    or, to calibrate timeouts, {"request_id": "8", "op": "rtt", "server_host": "10.0.0.2",
+    "server_port": 80, "samples": 5}; and one JSON object per line on stdout, in completion order:
+        {"request_id": "7", "result": {...same JSON printed by client.py...}}
+    or, if the probe could not run:
+        {"request_id": "7", "error": "..."}
+    The agent exits when stdin is closed, after finishing pending probes.
+    It is the batch mode of client.py (--batch) with an input that stays open.
+
+    License: GNU General Public License v3.0
+    Version: 1.0
+"""
+
+import os
+import sys
+
+import client
+
+MAX_CONCURRENT_PROBES = 16
+
+def main():
+    """
+        Main method.
+    """
+    client.write_line({"request_id": None, "ready": True, "pid": os.getpid()})
+    # The agent is a batch whose input stays open for the whole session.
+    client.run_batch(sys.stdin, MAX_CONCURRENT_PROBES)
+
+if __name__ == "__main__":
+    main()
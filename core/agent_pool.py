@@ -0,0 +1,163 @@
+"""
+This module defines the AgentPool class, which keeps one long-lived probe
+agent (agent.py) running inside each tester container and exchanges probe
+requests with it over the stdin/stdout of a single persistent exec, opened
+through the selected docker backend (docker CLI or Engine API).
+"""
+
+import itertools
+import json
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+
+AGENT_WORKDIR = "/firewallTester/src"
+AGENT_COMMAND = ["python3", "-u", f"{AGENT_WORKDIR}/agent.py"]
+
+
+class AgentUnavailableError(Exception):
+    """Raised when the probe agent of a container cannot be used."""
+
+
+class _AgentConnection:
+    """A running agent process and the requests still waiting for an answer."""
+    def __init__(self, backend, container_id):
+        self.container_id = container_id
+        self.ready = threading.Event()
+        self.alive = True
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        try:
+            self.proc = backend.exec_interactive(container_id, AGENT_COMMAND, workdir=AGENT_WORKDIR)
+        except OSError as e:
+            self.alive = False
+            raise AgentUnavailableError(str(e)) from e
+
+        self._reader = threading.Thread(
+            target=self._read_loop, daemon=True, name=f"agent-{container_id[:12]}"
+        )
+        self._reader.start()
+
+    def submit(self, request):
+        """Sends a request to the agent and returns a Future for its result."""
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                raise AgentUnavailableError(f"Agent in {self.container_id} is not running.")
+            request_id = str(next(self._ids))
+            self._pending[request_id] = future
+
+        line = json.dumps(dict(request, request_id=request_id))
+        try:
+            with self._write_lock:
+                self.proc.stdin.write(line + "\n")
+                self.proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            self._fail_pending(f"Could not write to agent: {e}")
+            raise AgentUnavailableError(str(e)) from e
+        return future
+
+    def close(self):
+        """Closes stdin so the agent finishes pending probes and exits."""
+        with self._lock:
+            self.alive = False
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=2)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self.proc.kill()
+
+    def _read_loop(self):
+        for raw in self.proc.stdout:
+            try:
+                response = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+
+            if response.get("ready"):
+                self.ready.set()
+                continue
+
+            with self._lock:
+                future = self._pending.pop(str(response.get("request_id")), None)
+            if future is None:
+                continue
+            if "error" in response:
+                future.set_exception(RuntimeError(response["error"]))
+            else:
+                future.set_result(response.get("result", {}))
+
+        self._fail_pending("Agent exited.")
+
+    def _fail_pending(self, reason):
+        with self._lock:
+            self.alive = False
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(AgentUnavailableError(reason))
+
+
+class AgentPool:
+    """Starts agents on demand and keeps one connection per container."""
+    def __init__(self, backend):
+        self.backend = backend
+        self._agents = {}
+        self._broken = set()
+        self._lock = threading.Lock()
+
+    def start(self, container_id):
+        """
+        Starts the agent of a container if it is not running yet.
+
+        Args:
+            container_id (str): The ID of the container.
+
+        Returns:
+            _AgentConnection: The connection to the container's agent.
+        """
+        with self._lock:
+            if container_id in self._broken:
+                raise AgentUnavailableError(f"Agent in {container_id} failed to start.")
+
+            connection = self._agents.get(container_id)
+            if connection is not None and connection.alive:
+                return connection
+            # An agent that died before ever becoming ready is not retried, so
+            # a container where it cannot run (e.g. its scripts could not be
+            # installed) goes straight to the exec fallback.
+            if connection is not None and not connection.ready.is_set():
+                self._broken.add(container_id)
+                raise AgentUnavailableError(f"Agent in {container_id} failed to start.")
+
+            connection = _AgentConnection(self.backend, container_id)
+            self._agents[container_id] = connection
+            return connection
+
+    def submit(self, container_id, request):
+        """
+        Sends a probe request to the agent of a container.
+
+        Args:
+            container_id (str): The ID of the source container.
+            request (dict): The probe request (see agent.py).
+
+        Returns:
+            Future: Resolves to the result dictionary of the probe.
+        """
+        return self.start(container_id).submit(request)
+
+    def close(self):
+        """Stops every agent started by this pool."""
+        with self._lock:
+            agents, self._agents = list(self._agents.values()), {}
+            self._broken.clear()
+        for connection in agents:
+            try:
+                connection.close()
+            except Exception as e:
+                print(f"Error stopping agent in {connection.container_id}: {e}", file=sys.stderr)
@@ -0,0 +1,232 @@
+"""
+This module defines the ArrivalMonitor class, which follows the arrival
+events published by server.py in each destination container (one
+'tail -F' stream per container per run), so the TestRunner learns that a
+packet arrived as soon as the server logs it instead of polling log files.
+"""
+
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+EVENTS_LOG_PATH = "/firewallTester/src/log/events.jsonl"
+
+# Starts following the events file from its current end, so only events of
+# this run are seen, and prints a marker once the offset has been taken.
+SUBSCRIBE_COMMAND = (
+    f"n=$(( $(stat -c %s {EVENTS_LOG_PATH} 2>/dev/null || echo 0) + 1 )); "
+    "echo '{\"ready\": true}'; "
+    f"exec tail -c +$n -F {EVENTS_LOG_PATH} 2>/dev/null"
+)
+
+
+def packet_entry_matches(entry, test_id, protocol, server_ip=None, server_port=None):
+    """Checks whether a server log entry is the arrival of a given test packet."""
+    if str(entry.get("id", "")) != str(test_id):
+        return False
+    if str(entry.get("protocol", "")).upper() != str(protocol).upper():
+        return False
+    if server_ip and str(entry.get("server_ip", "")) and str(entry.get("server_ip")) != str(server_ip):
+        return False
+    if server_port is not None and entry.get("server_port") is not None and int(entry.get("server_port")) != int(server_port):
+        return False
+    return True
+
+
+def syn_entry_matches(entry, server_ip=None, server_port=None, client_ip=None, client_port=None):
+    """Checks whether a SYN log entry belongs to a given client connection attempt."""
+    if server_port is not None and entry.get("server_port") is not None and int(entry.get("server_port")) != int(server_port):
+        return False
+    if client_ip is not None and entry.get("client_ip") is not None and str(entry.get("client_ip") )!= str(client_ip):
+        return False
+    if server_ip and entry.get("server_ip", "") and str(entry.get("server_ip")) != str(server_ip):
+        return False
+    if client_port is not None and str(entry.get("client_port")) is not None and str(entry.get("client_port")) != str(client_port):
+        return False
+    return True
+
+
+class _Subscription:
+    """Arrival events received so far from one destination container."""
+    def __init__(self, container_id):
+        self.container_id = container_id
+        self.ready = threading.Event()
+        self.stop = threading.Event()
+        self.closed = False
+        self.packets = {}
+        self.syns = []
+        self.watchers = {}
+        self.condition = threading.Condition()
+
+    def resolve_watchers(self, test_id, entry):
+        """Resolves the watchers of a test whose packet is the given entry;
+        called with the condition held."""
+        pending = []
+        for future, protocol, server_ip, server_port in self.watchers.pop(test_id, []):
+            if packet_entry_matches(entry, test_id, protocol, server_ip, server_port):
+                future.set_result(entry)
+            else:
+                pending.append((future, protocol, server_ip, server_port))
+        if pending:
+            self.watchers[test_id] = pending
+
+    def close(self):
+        """Marks the stream as ended; pending watchers resolve to None.
+        Called with the condition held."""
+        self.closed = True
+        for watchers in self.watchers.values():
+            for future, *_ in watchers:
+                future.set_result(None)
+        self.watchers = {}
+        self.condition.notify_all()
+
+
+class ArrivalMonitor:
+    """Subscribes to the arrival events of destination containers."""
+    def __init__(self, backend):
+        self.backend = backend
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, container_id, ready_timeout=5):
+        """
+        Starts following the arrival events of a container, once per run.
+
+        Args:
+            container_id (str): The ID of the destination container.
+            ready_timeout (float): Seconds to wait for the stream to start.
+
+        Returns:
+            bool: True if the container's events are being followed.
+        """
+        with self._lock:
+            subscription = self._subscriptions.get(container_id)
+            if subscription is None:
+                subscription = _Subscription(container_id)
+                self._subscriptions[container_id] = subscription
+                threading.Thread(
+                    target=self._follow, args=(subscription,), daemon=True,
+                    name=f"arrivals-{container_id[:12]}"
+                ).start()
+        return subscription.ready.wait(ready_timeout)
+
+    def is_subscribed(self, container_id):
+        """Checks whether the events of a container are being followed."""
+        with self._lock:
+            subscription = self._subscriptions.get(container_id)
+        return subscription is not None and subscription.ready.is_set() and not subscription.closed
+
+    def watch(self, container_id, test_id, protocol, server_ip=None, server_port=None):
+        """
+        Returns a Future resolved with the arrival event of a test packet as
+        soon as the destination logs it, so the confirmation can race the probe.
+
+        Args:
+            container_id (str): The ID of the destination container.
+            test_id (str): The unique identifier of the test packet.
+            protocol (str): The protocol to check (TCP, UDP, ICMP).
+            server_ip (str, optional): The server IP address to filter by.
+            server_port (int, optional): The server port to filter by.
+
+        Returns:
+            Future: Resolves to the event, or to None if the events stop
+                    first; None itself if the container is not followed.
+        """
+        with self._lock:
+            subscription = self._subscriptions.get(container_id)
+        if subscription is None:
+            return None
+
+        future = Future()
+        with subscription.condition:
+            for entry in subscription.packets.get(str(test_id), []):
+                if packet_entry_matches(entry, test_id, protocol, server_ip, server_port):
+                    future.set_result(entry)
+                    return future
+            if subscription.closed:
+                future.set_result(None)
+                return future
+            subscription.watchers.setdefault(str(test_id), []).append((future, protocol, server_ip, server_port))
+        return future
+
+    def wait_for_arrival(self, container_id, test_id, protocol, server_ip=None, server_port=None,
+                         client_ip=None, client_port=None, wait_seconds=1):
+        """
+        Waits for the arrival event of a test packet.
+
+        Args:
+            container_id (str): The ID of the destination container.
+            test_id (str): The unique identifier of the test packet.
+            protocol (str): The protocol to check (TCP, UDP, ICMP).
+            server_ip (str, optional): The server IP address to filter by.
+            server_port (int, optional): The server port to filter by.
+            client_ip (str, optional): The client IP address to filter SYNs by.
+            client_port (str, optional): The client port to filter SYNs by.
+            wait_seconds (float): Maximum time to wait for the packet.
+
+        Returns:
+            tuple: (bool, str) like TestRunner._server_log_confirms_packet_in_container.
+        """
+        with self._lock:
+            subscription = self._subscriptions.get(container_id)
+        if subscription is None:
+            return (False, "")
+
+        deadline = time.monotonic() + wait_seconds
+        with subscription.condition:
+            while True:
+                for entry in subscription.packets.get(str(test_id), []):
+                    if packet_entry_matches(entry, test_id, protocol, server_ip, server_port):
+                        return (True, "Received by the server")
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or subscription.closed:
+                    break
+                subscription.condition.wait(remaining)
+
+            if str(protocol).lower() == "tcp":
+                for entry in subscription.syns:
+                    if syn_entry_matches(entry, server_ip, server_port, client_ip, client_port):
+                        return (True, "TCP SYN recieved on server")
+
+        return (False, "")
+
+    def close(self):
+        """Stops following every container; called at the end of a run."""
+        with self._lock:
+            subscriptions, self._subscriptions = list(self._subscriptions.values()), {}
+        for subscription in subscriptions:
+            subscription.stop.set()
+            with subscription.condition:
+                subscription.close()
+
+    def _follow(self, subscription):
+        try:
+            stream = self.backend.exec_stream(
+                subscription.container_id, ["sh", "-c", SUBSCRIBE_COMMAND], timeout=None, stop=subscription.stop
+            )
+            for raw in stream:
+                try:
+                    event = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+
+                if event.get("ready"):
+                    subscription.ready.set()
+                    continue
+
+                with subscription.condition:
+                    if event.get("event") == "syn":
+                        subscription.syns.append(event)
+                    else:
+                        test_id = str(event.get("id", ""))
+                        subscription.packets.setdefault(test_id, []).append(event)
+                        subscription.resolve_watchers(test_id, event)
+                    subscription.condition.notify_all()
+        except Exception as e:
+            print(f"Error following arrivals of {subscription.container_id}: {e}", file=sys.stderr)
+        finally:
+            with subscription.condition:
+                subscription.close()
@@ -0,0 +1,82 @@
+"""
+This module derives the timeouts of a test run from the round-trip times
+measured between each source host and destination at the start of the run,
+instead of using the same fixed constants for every lab.
+"""
+
+import math
+
+# Used for pairs that could not be calibrated (and when calibration is off).
+DEFAULT_PROBE_TIMEOUT = 2.0     # seconds client.py waits for a reply
+DEFAULT_ARRIVAL_WAIT = 1.0      # seconds the runner waits for the server's confirmation
+
+RTT_MULTIPLIER = 4              # timeouts cover this many times the p95 RTT...
+MARGIN_SECONDS = 0.05           # ...plus this fixed margin (scheduling, logging)
+MIN_PROBE_TIMEOUT = 0.1
+MIN_ARRIVAL_WAIT = 0.2
+
+# docker exec / probe agent round trip, added to the probe timeout on the host side.
+EXEC_MARGIN = 8.0
+
+CALIBRATION_SAMPLES = 5
+CALIBRATION_TIMEOUT = 1.0       # per sample; a pair that does not answer keeps the defaults
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a list of numbers.
+
+    Args:
+        values (list): The samples.
+        fraction (float): The percentile as a fraction, e.g. 0.95.
+
+    Returns:
+        float: The percentile, or None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def default_timeouts():
+    """Returns the timeouts used for a pair without RTT measurements."""
+    return {
+        "calibrated": False,
+        "probe_timeout_s": DEFAULT_PROBE_TIMEOUT,
+        "arrival_wait_s": DEFAULT_ARRIVAL_WAIT,
+    }
+
+
+def derive_timeouts(rtts_ms, multiplier=RTT_MULTIPLIER, margin=MARGIN_SECONDS):
+    """
+    Derives the timeouts of a host pair from its measured RTTs.
+
+    A dropped probe is declared after multiplier x p95 RTT + margin, and the
+    server's confirmation is awaited for as long again after the client gives
+    up. Neither exceeds the fixed defaults.
+
+    Args:
+        rtts_ms (list): Round-trip times in milliseconds.
+        multiplier (float): Safety factor applied to the p95 RTT.
+        margin (float): Fixed margin in seconds.
+
+    Returns:
+        dict: The timeouts and the RTT percentiles they come from.
+    """
+    if not rtts_ms:
+        return default_timeouts()
+
+    p95_s = percentile(rtts_ms, 0.95) / 1000
+    probe_timeout = min(DEFAULT_PROBE_TIMEOUT, max(MIN_PROBE_TIMEOUT, multiplier * p95_s + margin))
+    arrival_wait = min(DEFAULT_ARRIVAL_WAIT, max(MIN_ARRIVAL_WAIT, multiplier * p95_s + margin))
+    return {
+        "calibrated": True,
+        "samples": len(rtts_ms),
+        "rtt_p50_ms": round(percentile(rtts_ms, 0.5), 3),
+        "rtt_p95_ms": round(percentile(rtts_ms, 0.95), 3),
+        "rtt_max_ms": round(max(rtts_ms), 3),
+        "probe_timeout_s": round(probe_timeout, 3),
+        "arrival_wait_s": round(arrival_wait, 3),
+    }
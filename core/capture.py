@@ -0,0 +1,305 @@
+"""
+    Program Name: Firewall Tester - Packet capture
+    Description: In-process packet capture used by server.py: an AF_PACKET socket
+    with a classic BPF filter attached in the kernel, header decoding with struct,
+    and a background writer that logs captured packets in batches.
+    License: GNU General Public License v3.0
+    Version: 1.0
+"""
+
+import ctypes
+import queue
+import socket
+import struct
+import threading
+from datetime import datetime
+
+import jsonl_log
+
+ETH_P_IP = 0x0800
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+SO_ATTACH_FILTER = 26
+PACKET_OUTGOING = 4
+
+# Classic BPF program run by the kernel on each IPv4 packet (the socket is
+# SOCK_DGRAM, so offsets start at the IP header). Accepts unfragmented TCP
+# segments with SYN set and ACK clear (tcp[13] & 0x12 == 0x02), like the
+# tcpdump filter it replaces, and keeps only the first 128 bytes (headers).
+# Each instruction is (code, jt, jf, k).
+SYN_FILTER = [
+    (0x30, 0, 0, 9),        # ldb [9]                 ; IP protocol
+    (0x15, 0, 7, 6),        # jeq #6 (TCP), else drop
+    (0x28, 0, 0, 6),        # ldh [6]                 ; flags + fragment offset
+    (0x45, 5, 0, 0x1fff),   # jset #0x1fff (fragment) -> drop
+    (0xb1, 0, 0, 0),        # ldxb 4*([0]&0xf)        ; X = IP header length
+    (0x50, 0, 0, 13),       # ldb [x+13]              ; TCP flags
+    (0x54, 0, 0, 0x12),     # and #0x12               ; SYN|ACK
+    (0x15, 0, 1, 0x02),     # jeq #0x02 (SYN only), else drop
+    (0x06, 0, 0, 128),      # ret #128                ; accept, 128 bytes
+    (0x06, 0, 0, 0),        # ret #0                  ; drop
+]
+
+# Accepts every unfragmented TCP and UDP packet and
+# keeps enough bytes for a probe payload; used by the capture arrival mode.
+ARRIVAL_SNAPLEN = 2048
+ARRIVAL_FILTER = [
+    (0x30, 0, 0, 9),                # ldb [9]              ; IP protocol
+    (0x15, 1, 0, 6),                # jeq #6 (TCP) -> fragment check
+    (0x15, 0, 3, 17),               # jeq #17 (UDP), else drop
+    (0x28, 0, 0, 6),                # ldh [6]              ; flags + fragment offset
+    (0x45, 1, 0, 0x1fff),           # jset #0x1fff (fragment) -> drop
+    (0x06, 0, 0, ARRIVAL_SNAPLEN),  # ret #ARRIVAL_SNAPLEN ; accept
+    (0x06, 0, 0, 0),                # ret #0               ; drop
+]
+
+
+def attach_filter(sock, program):
+    """
+    Attaches a classic BPF program to a socket (SO_ATTACH_FILTER).
+
+    Args:
+        sock: The socket.
+        program: List of (code, jt, jf, k) instructions.
+    """
+    instructions = b"".join(struct.pack("HBBI", *instruction) for instruction in program)
+    buffer = ctypes.create_string_buffer(instructions)
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    fprog = struct.pack("HL", len(program), ctypes.addressof(buffer))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def decode_ipv4(packet):
+    """
+    Decodes an IPv4 header.
+
+    Args:
+        packet: Bytes starting at the IP header.
+
+    Returns:
+        tuple: (source_ip, destination_ip, protocol, header_length) or None if invalid.
+    """
+    if len(packet) < 20 or packet[0] >> 4 != 4:
+        return None
+    header_length = (packet[0] & 0x0F) * 4
+    if header_length < 20 or len(packet) < header_length:
+        return None
+    return (
+        socket.inet_ntoa(packet[12:16]),
+        socket.inet_ntoa(packet[16:20]),
+        packet[9],
+        header_length,
+    )
+
+
+def decode_tcp_syn(packet):
+    """
+    Decodes a captured TCP SYN into a syn_log entry.
+
+    Args:
+        packet: Bytes starting at the IP header.
+
+    Returns:
+        dict: The log entry, or None if the packet is not a TCP SYN.
+    """
+    ip = decode_ipv4(packet)
+    if ip is None:
+        return None
+    source_ip, destination_ip, protocol, header_length = ip
+    if protocol != socket.IPPROTO_TCP or len(packet) < header_length + 14:
+        return None
+
+    source_port, destination_port = struct.unpack_from("!HH", packet, header_length)
+    flags = packet[header_length + 13]
+    if flags & 0x12 != 0x02:
+        return None
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "client_ip": source_ip,
+        "client_port": source_port,
+        "server_ip": destination_ip,
+        "server_port": destination_port,
+        "protocol": "TCP",
+        "note": "SYN seen (handshake incomplete or in-progress)"
+    }
+
+
+def decode_transport(packet):
+    """
+    Decodes the IP and TCP/UDP headers of a captured packet.
+
+    Args:
+        packet: Bytes starting at the IP header.
+
+    Returns:
+        dict: {"protocol", "source_ip", "source_port", "destination_ip",
+               "destination_port", "flags", "payload"}, or None if the packet
+               is not a valid TCP or UDP packet. flags is None for UDP.
+    """
+    ip = decode_ipv4(packet)
+    if ip is None:
+        return None
+    source_ip, destination_ip, protocol, header_length = ip
+
+    if protocol == socket.IPPROTO_TCP and len(packet) >= header_length + 20:
+        source_port, destination_port = struct.unpack_from("!HH", packet, header_length)
+        data_offset = (packet[header_length + 12] >> 4) * 4
+        flags = packet[header_length + 13]
+        payload = packet[header_length + data_offset:]
+        name = "TCP"
+    elif protocol == socket.IPPROTO_UDP and len(packet) >= header_length + 8:
+        source_port, destination_port = struct.unpack_from("!HH", packet, header_length)
+        flags = None
+        payload = packet[header_length + 8:]
+        name = "UDP"
+    else:
+        return None
+
+    return {
+        "protocol": name,
+        "source_ip": source_ip,
+        "source_port": source_port,
+        "destination_ip": destination_ip,
+        "destination_port": destination_port,
+        "flags": flags,
+        "payload": payload,
+    }
+
+
+class BatchedLogWriter:
+    """
+    Writes entries to a JSON Lines log from a background thread, several per
+    write. When the queue is full new entries are dropped and counted, so the
+    capture loop never blocks on disk.
+    """
+    def __init__(self, path, on_batch=None, max_queue=10000, batch_size=256):
+        self.path = path
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"log-writer-{path}")
+        self._thread.start()
+
+    def put(self, entry):
+        """
+        Queues an entry for writing.
+
+        Returns:
+            bool: False if the entry was dropped because the queue is full.
+        """
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            # Whatever queued up while the previous batch was written goes in
+            # the next one: no added latency when idle, large writes under load.
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                jsonl_log.append_entries(self.path, batch)
+                self.written += len(batch)
+                if self.on_batch is not None:
+                    self.on_batch(batch)
+            except OSError as e:
+                print(f"[LOG-ERROR] Failed to append to {self.path}: {e}")
+
+
+class PacketCapture:
+    """
+    Receives the IPv4 packets accepted by a BPF program on every interface,
+    skipping the ones sent by this host, and hands them to a callback.
+    """
+    def __init__(self, program, handler, buffer_size=4 * 1024 * 1024):
+        self.program = program
+        self.handler = handler
+        self.buffer_size = buffer_size
+        self.captured = 0
+        self.kernel_drops = 0
+        self._kernel_packets = 0
+        self._sock = None
+
+    def open(self):
+        """
+        Opens the capture socket.
+
+        Packets queued before the filter was attached are drained, so no
+        unfiltered packet reaches the handler.
+
+        Raises:
+            OSError: If AF_PACKET is unavailable or CAP_NET_RAW is missing.
+        """
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(ETH_P_IP))
+        try:
+            attach_filter(sock, self.program)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.buffer_size)
+            while True:
+                sock.recv(65535, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            pass
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+
+    def run(self):
+        """Capture loop; runs until the socket is closed."""
+        while True:
+            try:
+                packet, address = self._sock.recvfrom(65535)
+            except OSError:
+                return
+            if address[2] == PACKET_OUTGOING:
+                continue
+            self.captured += 1
+            try:
+                self.handler(packet)
+            except Exception as e:
+                print(f"[CAPTURE] Error handling packet: {e}")
+
+    def start(self, name="packet-capture"):
+        """Opens the socket and runs the capture loop in a daemon thread."""
+        self.open()
+        thread = threading.Thread(target=self.run, daemon=True, name=name)
+        thread.start()
+        return thread
+
+    def stats(self):
+        """
+        Returns the capture counters.
+
+        PACKET_STATISTICS is reset by the kernel on every read, so its values
+        are accumulated here.
+
+        Returns:
+            dict: {"captured", "kernel_packets", "kernel_drops"}
+        """
+        if self._sock is not None:
+            try:
+                packets, drops = struct.unpack("II", self._sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+                self._kernel_packets += packets
+                self.kernel_drops += drops
+            except OSError:
+                pass
+        return {
+            "captured": self.captured,
+            "kernel_packets": self._kernel_packets,
+            "kernel_drops": self.kernel_drops,
+        }
+
+    def close(self):
+        """Closes the capture socket, ending the capture loop."""
+        if self._sock is not None:
+            self._sock.close()
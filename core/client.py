@@ -11,70 +11,173 @@
 """
 
 import socket
-import argparse
+import errno
+import functools
 import json
+import math
 import os
+import struct
 import time
 import sys
-import uuid
+import threading
 from datetime import datetime
 
-from scapy.all import IP, ICMP, sr1
+import jsonl_log
+import wire
 
-def validate_host(host):
-    """Checks if a hostname can be resolved."""
-    try:
-        socket.gethostbyname(host)  # Try to resolve the hostname.
-        return True  # Valid Host
-    except socket.gaierror:
-        return False  # Invalid Host
+# argparse, uuid, concurrent.futures and icmp_echo are imported where they are
+# used: most runs are a single TCP/UDP probe and the interpreter's start-up is
+# part of every test's latency (see benchmarks/bench_startup.py).
+
+# Serializes result lines written to stdout in batch mode.
+_output_lock = threading.Lock()
+
+# Seconds to wait for a reply; the interface passes a value derived from the
+# measured RTT (see --timeout and the "timeout" field of batch requests).
+DEFAULT_TIMEOUT = 2.0
+
+# Probes of a flood test in flight at the same time (see run_flood).
+MAX_FLOOD_IN_FLIGHT = 256
+
+def ping(host, count=1, verbose=0, timeout=1):
+    """
+    Sends ICMP Echo Request packets through the process-wide ICMP socket
+    (see icmp_echo.py) and waits for the replies, returning as soon as all
+    of them arrived.
+
+    :return: Dictionary with the echo statistics (transmitted, received, loss,
+             rtts_ms, rtt_min/avg/max_ms, unreachable), or None if the host
+             cannot be resolved.
+    :raises OSError: If the requests cannot be sent.
+    """
+    import icmp_echo
 
-def ping(host, count):
-    """It sends ICMP Echo Request packets and checks for the response."""
-    received = 0
-    # The count is ignored; only one ping is sent per test run.
-    count = 1
     if verbose > 0:
         print(f"\nPING {host}:")
-    for seq in range(1, count + 1):
-        if not validate_host(host):
-            return -1 
+    try:
+        stats = icmp_echo.echo(host, count, timeout)
+    except socket.gaierror:
+        return None
 
-        packet = IP(dst=host) / ICMP()
-        start_time = time.time()
+    if verbose > 0:
+        for seq, rtt in enumerate(stats["rtts_ms"], start=1):
+            print(f"\033[32m\t+ Response from {host}: Time = {rtt:.2f} ms - {seq}/{stats['transmitted']}\033[0m")
+        if stats["received"] < stats["transmitted"]:
+            print(f"\033[31m\t- No response from {host} - {stats['transmitted'] - stats['received']}/{stats['transmitted']} lost\033[0m")
+    return stats
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(fraction * len(ordered))) - 1]
+
+def rtt_summary(rtts_ms):
+    """
+    Summarizes the round-trip times of a probe, measured with time.monotonic_ns()
+    (the ISO timestamps of the result are for the logs, not for timing).
+
+    Args:
+        rtts_ms: Round-trip times in milliseconds.
+
+    :return: Dictionary {samples, min_ms, p50_ms, p95_ms, max_ms}, or None without samples.
+    """
+    if not rtts_ms:
+        return None
+    return {
+        "samples": len(rtts_ms),
+        "min_ms": round(min(rtts_ms), 4),
+        "p50_ms": round(_percentile(rtts_ms, 0.50), 4),
+        "p95_ms": round(_percentile(rtts_ms, 0.95), 4),
+        "max_ms": round(max(rtts_ms), 4),
+    }
+
+# ICMP errors queued on a socket with IP_RECVERR (linux/errqueue.h, linux/icmp.h).
+IP_RECVERR = getattr(socket, "IP_RECVERR", 11)
+SO_EE_ORIGIN_ICMP = 2
+ICMP_DEST_UNREACH = 3
+ICMP_UNREACH_NAMES = {
+    0: "net unreachable",
+    1: "host unreachable",
+    2: "protocol unreachable",
+    3: "port unreachable",
+    9: "net administratively prohibited",
+    10: "host administratively prohibited",
+    13: "communication administratively prohibited",
+}
+ICMP_ADMIN_PROHIBITED = {9, 10, 13}
+
+def enable_icmp_errors(sock):
+    """
+    Enables IP_RECVERR so ICMP errors (unreachable, admin-prohibited) abort
+    connect/recv at once instead of being retried until the timeout, and can
+    be read back with read_icmp_error.
+    """
+    try:
+        sock.setsockopt(socket.SOL_IP, IP_RECVERR, 1)
+    except (OSError, AttributeError):
+        pass
 
-        reply = sr1(packet, timeout=1, verbose=False)  # Send the package and wait for a response.
+def read_icmp_error(sock):
+    """
+    Reads the ICMP error queued on a socket, if any.
 
-        if reply:
-            elapsed_time = (time.time() - start_time) * 1000
-            if verbose > 0:
-                print(f"\033[32m\t+ Response from {host}: Time = {elapsed_time:.2f} ms - {seq}/{count}\033[0m")
-            received += 1
-        else:
-            if verbose > 0:
-                print(f"\033[31m\t- No response from {host} - {seq}/{count}\033[0m")
-
-        time.sleep(1)
-    return received
-
-def calculate_difference_timestamp(timestamp_send, timestamp_received):
-    """Calculates the difference between two timestamps in ISO 8601 format in milliseconds."""
-    t1 = datetime.fromisoformat(timestamp_send)
-    t2 = datetime.fromisoformat(timestamp_received)
-    diferenca = (t2 - t1).total_seconds() * 1000  # Convert to milliseconds
-    return diferenca
-
-# Configuring command-line arguments
-parser = argparse.ArgumentParser(description="Firewall Tester Client (UDP/TCP/ICMP)")
-parser.add_argument("server_host", type=str, help="Server IP address")
-parser.add_argument("protocol", type=str.lower, help="Protocol used: TCP/UDP/ICMP")
-parser.add_argument("server_port", type=int, help="Server Port")
-parser.add_argument("testId", type=int, help="Test ID")
-parser.add_argument("timestamp", type=str, help="Timestamp of Test")
-parser.add_argument("verbose", type=int, help="Level of verbosity (0, 1, 2)")
-
-args = parser.parse_args()
-verbose = args.verbose
+    :return: Dictionary with type, code and offender (the IP that sent the
+             ICMP message), or None.
+    """
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        _, ancdata, _, _ = sock.recvmsg(1, 512, socket.MSG_ERRQUEUE)
+    except (OSError, AttributeError):
+        return None
+    finally:
+        sock.settimeout(timeout)
+
+    for level, kind, data in ancdata:
+        if level != socket.SOL_IP or kind != IP_RECVERR or len(data) < 16:
+            continue
+        # struct sock_extended_err, followed by the offender's sockaddr_in.
+        _, origin, icmp_type, icmp_code = struct.unpack_from("=IBBB", data)
+        if origin != SO_EE_ORIGIN_ICMP:
+            continue
+        offender = socket.inet_ntoa(data[20:24]) if len(data) >= 24 else None
+        return {"type": icmp_type, "code": icmp_code, "offender": offender}
+    return None
+
+def classify_failure(error, icmp, server_host):
+    """
+    Turns a failed probe into an outcome.
+
+    Args:
+        error: The exception raised by connect/send/recv.
+        icmp: The ICMP error read with read_icmp_error, or None.
+        server_host: Destination IP of the probe.
+
+    :return: Tuple (outcome, status_msg). outcome is 'refused' (TCP RST or ICMP
+             port unreachable from the destination: a REJECT rule or no
+             listener, decided by the interface), 'rejected-by-firewall',
+             'unreachable', 'timeout' or 'error'.
+    """
+    if icmp and icmp["type"] == ICMP_DEST_UNREACH:
+        name = ICMP_UNREACH_NAMES.get(icmp["code"], f"code {icmp['code']}")
+        description = f"ICMP {name} from {icmp['offender']}"
+        if icmp["code"] in ICMP_ADMIN_PROHIBITED:
+            return "rejected-by-firewall", description
+        if icmp["code"] == 3:
+            if icmp["offender"] == server_host:
+                return "refused", description
+            return "rejected-by-firewall", description
+        return "unreachable", description
+    if icmp:
+        return "unreachable", f"ICMP type {icmp['type']} code {icmp['code']} from {icmp['offender']}"
+
+    if isinstance(error, ConnectionRefusedError):
+        return "refused", "Connection refused (TCP RST)"
+    if isinstance(error, socket.timeout):
+        return "timeout", "Firewall Drop or Network Error"
+    if isinstance(error, OSError) and error.errno in (errno.EHOSTUNREACH, errno.ENETUNREACH):
+        return "unreachable", error.strerror
+    return "error", "Firewall Drop or Network Error"
 
 # Normalize/validate testId: accept integer strings or UUID4
 def _normalize_test_id(tid):
@@ -85,6 +188,7 @@ def _normalize_test_id(tid):
     except Exception:
         pass
 
+    import uuid
     try:
         u = uuid.UUID(tid)
         if u.version == 4:
@@ -95,169 +199,549 @@ def _normalize_test_id(tid):
     # if not int or uuid4, keep as-is
     return str(tid)
 
-args.testId = _normalize_test_id(args.testId)
-
-# Initializing socket according to protocol.
-client_sock = None
-client_port = -1
-icmp_status = 0
-
-if args.protocol.lower() == "udp" or args.protocol.lower() == "UDP":
-    if verbose > 0: print("Protocol: UDP")
-    client_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    client_sock.bind(("", 0))
-    client_sock.settimeout(2)
-    # client_ip = client_sock.getsockname()[0]
-    client_port = client_sock.getsockname()[1]
-
-elif args.protocol.lower() == "tcp" or args.protocol.lower() == "TCP":
-    if verbose > 0: print("Protocol: TCP")
-    client_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    client_sock.bind(("", 0))
-    client_sock.settimeout(2)
-    # client_ip = client_sock.getsockname()[0]
-    client_port = client_sock.getsockname()[1]
-
-
-elif args.protocol.lower() == "icmp" or args.protocol.lower() == "ICMP":
-    if verbose > 0: print("Protocol: ICMP")
-    icmp_status = ping(args.server_host, args.server_port)
-    client_port = 0  # ICMP does not use conventional ports.
-else:
-    if verbose > 0: print("Choose a valid protocol (TCP, UDP ou ICMP).")
-    sys.exit(1)
-
-# Obtaining customer information
-client_host = socket.gethostname()
-try:
-    client_ip = socket.gethostbyname(client_host)
-except socket.gaierror:
-    client_ip = "0.0.0.0" # Could not resolve hostname
-timestamp = datetime.now().isoformat()
-
-# Creating the directory and naming the JSON file
-filename_timestamp = args.timestamp
-dir_name = f"log/{filename_timestamp}"
-filename = f"{dir_name}/test.json"
-os.makedirs(dir_name, exist_ok=True)
-
-# Loading existing JSON or creating a new one.
-try:
-    with open(filename, 'r', encoding="utf-8") as file:
-        dados = json.load(file)
-except (FileNotFoundError, json.JSONDecodeError):
-    dados = {"tests": []}
-
-# Creating JSON Structure
-# status - this is for cases where something happens, such as the packet not being able to be sent because the client host has no route!
-
-# message - can be used to simulate, for example, sending a malicious message in the application layer, such as using inappropriate words (porn, hacker, etc.) or suspicious terms ("/etc/shadow")
-message = {
-    "id": args.testId,
-    "timestamp_teste": filename_timestamp,
-    "timestamp_send": timestamp,
-    "timestamp_recv": timestamp,
-    "client_host": client_host,
-    #aqui tava comentado a linha abaixo
-    "client_ip": client_ip,
-    "client_port": client_port,
-    "server_ip": args.server_host,
-    "server_port": args.server_port,
-    "protocol": args.protocol,
-    "server_response": False,
-    "status" : '0',
-    "status_msg": 'ok',
-    "message" : 'Test successfully completed'
-}
-# If the status is zero, everything went well; otherwise, an error occurred, such as:
-# 1 - Network error
-
-# Treatment for ICMP
-if args.protocol == "icmp":
-    if icmp_status < 0:
-        message["status"] = "0"
-        message["status_msg"] = "Firewall Drop or Host unknown"
-    else:
-        message["server_response"] = icmp_status > 0
-        message["server_port"] = 8  # ICMP echo reply
-
-    dados["tests"].append(message)
-    with open(filename, "w", encoding="utf-8") as file:
-        json.dump(dados, file, indent=4)
-    if verbose > 0:
-        print(f"Writing to file: {json.dumps(message, indent=4)}")
+@functools.lru_cache(maxsize=None)
+def local_identity():
+    """
+    Returns this host's name and the IP address it resolves to ("0.0.0.0" if
+    it does not resolve), looked up once per process.
+    """
+    client_host = socket.gethostname()
+    try:
+        return client_host, socket.gethostbyname(client_host)
+    except socket.gaierror:
+        return client_host, "0.0.0.0" # Could not resolve hostname
 
-    print(json.dumps(message, indent=4))
-    sys.exit(0)
+def process_age_ms():
+    """
+    Returns the milliseconds elapsed since this process was started (Linux,
+    10 ms resolution), used to report the interpreter's start-up time.
 
-# Data transmission (UDP and TCP)
-json_message = json.dumps(message, indent=4)
-server_address = (args.server_host, args.server_port)
+    :return: Milliseconds, or None if /proc is not available.
+    """
+    try:
+        with open("/proc/self/stat") as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")  # field 22: starttime
+        return max(0.0, (time.clock_gettime(time.CLOCK_BOOTTIME) - started) * 1000)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _append_test_log(filename, message):
+    """Appends a probe result to the test.jsonl log of this test session."""
+    try:
+        jsonl_log.append_entry(filename, message)
+    except OSError as e:
+        print(f"Error writing test log {filename}: {e}", file=sys.stderr)
+
+def measure_rtt(server_host, server_port=None, samples=5, timeout=1.0):
+    """
+    Measures the round-trip time to a host with TCP handshakes: connect()
+    returns after one RTT whether the port answers with SYN/ACK or RST.
+    Stops at the first sample without an answer (the path drops it).
+    Without a port, ICMP echo requests are used instead.
+
+    Args:
+        server_host: Destination IP address.
+        server_port: Destination TCP port, or None for ICMP echo.
+        samples: Number of handshakes (or echo requests).
+        timeout: Seconds to wait for each answer.
+
+    :return: Dictionary {"rtts_ms": [...], "lost": int}.
+    """
+    if server_port is None:
+        try:
+            stats = ping(server_host, samples, timeout=timeout)
+        except OSError:
+            stats = None
+        rtts_ms = stats["rtts_ms"] if stats else []
+        return {"rtts_ms": rtts_ms, "lost": samples - len(rtts_ms)}
+
+    rtts_ms = []
+    for _ in range(samples):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        enable_icmp_errors(sock)
+        sock.settimeout(timeout)
+        started = time.monotonic_ns()
+        try:
+            sock.connect((server_host, int(server_port)))
+            rtts_ms.append((time.monotonic_ns() - started) / 1e6)
+        except ConnectionRefusedError:
+            rtts_ms.append((time.monotonic_ns() - started) / 1e6)
+        except OSError:
+            break
+        finally:
+            sock.close()
+    return {"rtts_ms": rtts_ms, "lost": samples - len(rtts_ms)}
+
+def run_probe(server_host, protocol, server_port, test_id, test_timestamp, verbose=0, timeout=DEFAULT_TIMEOUT,
+              count=1, payload_size=0, exchanges=1):
+    """
+    Sends one probe to the firewall tester server and returns the result.
+
+    Args:
+        server_host: Server IP address.
+        protocol: Protocol used: TCP/UDP/ICMP.
+        server_port: Server port.
+        test_id: Test ID.
+        test_timestamp: Timestamp of the test, used as the log directory.
+        verbose: Level of verbosity (0, 1, 2).
+        timeout: Seconds to wait for the server's reply.
+        count: Number of echo requests of an ICMP probe (RTT samples).
+        payload_size: Bytes of payload sent after the probe's metadata (TCP/UDP).
+        exchanges: Number of probe/response exchanges over the same connection
+                   (TCP/UDP RTT samples).
+
+    :return: Dictionary with the result of the test (the same JSON printed by this program).
+    """
+    protocol = protocol.lower()
+    server_port = int(server_port)
+    test_id = _normalize_test_id(test_id)
+
+    # Initializing socket according to protocol.
+    client_sock = None
+    client_port = -1
+    icmp_stats = None
+    icmp_error = None
+
+    if protocol == "udp":
+        if verbose > 0: print("Protocol: UDP")
+        client_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        enable_icmp_errors(client_sock)
+        client_sock.bind(("", 0))
+        client_sock.settimeout(timeout)
+        # client_ip = client_sock.getsockname()[0]
+        client_port = client_sock.getsockname()[1]
+
+    elif protocol == "tcp":
+        if verbose > 0: print("Protocol: TCP")
+        client_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        enable_icmp_errors(client_sock)
+        client_sock.bind(("", 0))
+        client_sock.settimeout(timeout)
+        # client_ip = client_sock.getsockname()[0]
+        client_port = client_sock.getsockname()[1]
+
+
+    elif protocol == "icmp":
+        if verbose > 0: print("Protocol: ICMP")
+        try:
+            icmp_stats = ping(server_host, count, verbose, timeout=min(timeout, 1))
+        except OSError as e:
+            icmp_error = e
+        client_port = 0  # ICMP does not use conventional ports.
+    else:
+        raise ValueError("Choose a valid protocol (TCP, UDP ou ICMP).")
+
+    # Obtaining customer information
+    client_host, client_ip = local_identity()
+    timestamp = datetime.now().isoformat()
+
+    # Creating the directory and naming the JSON file
+    filename_timestamp = test_timestamp
+    dir_name = f"log/{filename_timestamp}"
+    filename = f"{dir_name}/test.jsonl"
+
+    # Creating JSON Structure
+    # status - this is for cases where something happens, such as the packet not being able to be sent because the client host has no route!
+
+    # message - can be used to simulate, for example, sending a malicious message in the application layer, such as using inappropriate words (porn, hacker, etc.) or suspicious terms ("/etc/shadow")
+    message = {
+        "id": test_id,
+        "timestamp_teste": filename_timestamp,
+        "timestamp_send": timestamp,
+        "timestamp_recv": timestamp,
+        "client_host": client_host,
+        #aqui tava comentado a linha abaixo
+        "client_ip": client_ip,
+        "client_port": client_port,
+        "server_ip": server_host,
+        "server_port": server_port,
+        "protocol": protocol,
+        "server_response": False,
+        "status" : '0',
+        "status_msg": 'ok',
+        "message" : 'Test successfully completed'
+    }
+    # If the status is zero, everything went well; otherwise, an error occurred, such as:
+    # 1 - Network error
+
+    # Treatment for ICMP
+    if protocol == "icmp":
+        message["server_port"] = 8  # ICMP echo reply
+        if icmp_error is not None:
+            message["outcome"], message["status_msg"] = classify_failure(icmp_error, None, server_host)
+        elif icmp_stats is None:
+            message["status"] = "0"
+            message["status_msg"] = "Firewall Drop or Host unknown"
+            message["outcome"] = "error"
+        else:
+            message["icmp_stats"] = icmp_stats
+            message["server_response"] = icmp_stats["received"] > 0
+            message["rtt"] = rtt_summary(icmp_stats["rtts_ms"])
+            if icmp_stats["received"]:
+                message["outcome"] = "received"
+            elif icmp_stats["unreachable"]:
+                message["icmp"] = icmp_stats["unreachable"]
+                message["outcome"], message["status_msg"] = classify_failure(None, icmp_stats["unreachable"], server_host)
+            else:
+                message["outcome"] = "timeout"
+
+        _append_test_log(filename, message)
+        if verbose > 0:
+            print(f"Writing to file: {json.dumps(message, indent=4)}")
+
+        return message
+
+    # Data transmission (UDP and TCP): one frame per probe, see wire.py.
+    server_address = (server_host, server_port)
+    payload = bytes(payload_size)
 
-try:
-    if verbose > 0: print(f"-> Sending message to: {args.server_host}:{args.server_port}/{args.protocol.upper()}.")
-    if verbose > 0:
-        print(f"Sending: {json_message}")
+    try:
+        if verbose > 0: print(f"-> Sending message to: {server_host}:{server_port}/{protocol.upper()}.")
 
-    if args.server_host == "0.0.0.0":
-        message["status_msg"] = "Error by using destination IP 0.0.0.0"
-    else:
-        if args.protocol == "udp":
-            client_sock.connect(server_address)
-            client_ip = client_sock.getsockname()[0]  # getting IP used to do the request 
-            message["client_ip"] = client_ip
-            json_message = json.dumps(message, indent=4) # updating message to be send to server
-            client_sock.sendto(json_message.encode(), server_address)
-        else:  # TCP
+        if server_host == "0.0.0.0":
+            message["status_msg"] = "Error by using destination IP 0.0.0.0"
+        else:
             client_sock.connect(server_address)
-            client_ip = client_sock.getsockname()[0] # getting IP used to do the request
+            client_ip = client_sock.getsockname()[0]  # IP address actually used to reach the server
             message["client_ip"] = client_ip
-            json_message = json.dumps(message, indent=4) # updating message to be send to server
-            client_sock.send(json_message.encode())
-            # retrieves the IP address of the client that was actually used in the transmission.
-        
-        try:
-            response, _ = client_sock.recvfrom(1024) if args.protocol == "udp" else (client_sock.recv(1024), None)
-            timestamp_response = datetime.now().isoformat()
-            if verbose > 0:
-                print(f"\033[32m\t+ Response received from {args.server_host}:{args.server_port} -> {client_ip}:{client_port}.\033[0m")
+            if payload_size:
+                message["payload_size"] = payload_size
             if verbose > 0:
-                try:
-                    rtt = calculate_difference_timestamp(message["timestamp_send"], timestamp_response)
-                    print(f"Round-trip time of the message: {rtt} ms")
-                except Exception as e:
-                    print(f"Could not calculate round-trip time: {e}")
-            response_data = response.decode()
-            if verbose > 2: print(f"+ Server response: {response_data}")
-            message = json.loads(response_data)
-            message["timestamp_recv"] = timestamp_response
-            message["server_response"] = True
-            message["client_ip"] = client_ip
-
-        except socket.timeout:
-            if verbose > 0:
-                print(f"\033[31m\t- No response from {args.server_host}:{args.server_port}/{args.protocol.upper()}.\033[0m")
-
-    dados["tests"].append(message)
-    with open(filename, "w", encoding="utf-8") as file:
-        json.dump(dados, file, indent=4)
+                print(f"Sending: {json.dumps(message, indent=4)}")
+
+            response = None
+            sent = 0
+            rtts_ms = []
+            # [client sent, server received, server sent, client received] of each
+            # exchange, in time.time_ns(): the clock shared by every container.
+            clock_ns = []
+            try:
+                # Several exchanges share the connection (TCP) or the socket (UDP).
+                for exchange in range(max(1, exchanges)):
+                    probe = dict(message, exchange=exchange) if exchanges > 1 else dict(message)
+                    probe["sent_ns"] = time.time_ns()
+                    started = time.monotonic_ns()
+                    client_sock.sendall(wire.encode_frame(wire.PROBE, probe, payload))
+                    sent += 1
+                    if protocol == "udp":
+                        frame = wire.decode_frame(client_sock.recv(65535))
+                        if frame is None:
+                            raise wire.WireError("truncated response")
+                        frame_type, metadata = frame[0], frame[1]
+                    else:
+                        frame_type, metadata, _ = wire.read_frame(client_sock)
+                    rtts_ms.append((time.monotonic_ns() - started) / 1e6)
+                    received_ns = time.time_ns()
+                    if frame_type == wire.ERROR:
+                        raise wire.WireError(metadata.get("error", "error frame"))
+                    if "server_received_ns" in metadata:
+                        clock_ns.append([probe["sent_ns"], metadata["server_received_ns"],
+                                         metadata["server_sent_ns"], received_ns])
+                    if response is None:
+                        response = metadata
+            except socket.timeout:
+                if response is None:
+                    message["outcome"] = "timeout"
+                    if verbose > 0:
+                        print(f"\033[31m\t- No response from {server_host}:{server_port}/{protocol.upper()}.\033[0m")
+
+            if response is not None:
+                timestamp_response = datetime.now().isoformat()
+                if verbose > 0:
+                    print(f"\033[32m\t+ Response received from {server_host}:{server_port} -> {client_ip}:{client_port}.\033[0m")
+                    print(f"Round-trip time of the message: {rtts_ms[0]:.3f} ms")
+                if verbose > 2: print(f"+ Server response: {json.dumps(response)}")
+                message = response
+                message["timestamp_recv"] = timestamp_response
+                message["server_response"] = True
+                message["client_ip"] = client_ip
+                message["outcome"] = "received"
+                message["rtt"] = rtt_summary(rtts_ms)
+                if clock_ns:
+                    message["clock_ns"] = clock_ns
+                if exchanges > 1:
+                    message["exchanges"] = {
+                        "sent": sent,
+                        "answered": len(rtts_ms),
+                        "rtts_ms": [round(rtt, 4) for rtt in rtts_ms],
+                    }
+
+        _append_test_log(filename, message)
+
+        if verbose > 0:
+            print(f"Writing to file: {json.dumps(message, indent=4)}")
+
+    except wire.WireError as e:
+        if verbose > 0: print(f"Invalid response: {e}")
+        message["status"] = '0'
+        message["outcome"], message["status_msg"] = "error", f"Invalid response from the server: {e}"
+        _append_test_log(filename, message)
+
+    except (socket.gaierror, socket.herror, socket.timeout, ConnectionResetError, OSError) as e:
+        if verbose > 0: print(f"Communication error: {e}")
+        icmp = read_icmp_error(client_sock)
+        message["status"] = '0'
+        message["outcome"], message["status_msg"] = classify_failure(e, icmp, server_host)
+        if icmp:
+            message["icmp"] = icmp
+        _append_test_log(filename, message)
+        if verbose > 0:
+            print(f"Writing to file: {json.dumps(message, indent=4)}")
+
+    finally:
+        if client_sock:
+            client_sock.close()
+
+    return message
+
+def run_flood(server_host, protocol, server_port, test_id, test_timestamp, count, rate,
+              timeout=DEFAULT_TIMEOUT, payload_size=0):
+    """
+    Sends `count` TCP connections or UDP datagrams to the server at `rate` per
+    second, each one a probe like run_probe's, and measures how the path holds
+    up: the rate actually achieved, the loss and the latency percentiles of the
+    answered probes.
+
+    Args:
+        server_host: Server IP address.
+        protocol: 'tcp' or 'udp'.
+        server_port: Server port.
+        test_id: Test ID, shared by every probe of the flood.
+        test_timestamp: Timestamp of the test, used as the log directory.
+        count: Number of probes.
+        rate: Target probes per second (0 sends them as fast as possible).
+        timeout: Seconds each probe waits for the server's reply.
+        payload_size: Bytes of payload sent with each probe.
+
+    :return: Dictionary with the result of the first answered probe (or of the
+             first probe if none was answered) and a "flood" summary.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    protocol = protocol.lower()
+    if protocol not in ("tcp", "udp"):
+        raise ValueError("Flood tests use TCP or UDP.")
+    count = max(1, int(count))
+    send_times = []
+
+    def probe():
+        started = time.perf_counter()
+        send_times.append(started)
+        result = run_probe(server_host, protocol, server_port, test_id, test_timestamp,
+                           timeout=timeout, payload_size=payload_size)
+        return result, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=min(count, MAX_FLOOD_IN_FLIGHT)) as pool:
+        for index in range(count):
+            if rate:
+                # Paced against the start, so a late probe does not delay the next ones.
+                delay = started + index / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(probe))
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    answered = [(result, latency) for result, latency in results if result.get("server_response")]
+    latencies = [latency for _, latency in answered]
+    outcomes = {}
+    for result, _ in results:
+        outcome = result.get("outcome", "received" if result.get("server_response") else "error")
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    send_span = max(send_times) - min(send_times) if len(send_times) > 1 else 0.0
+
+    message = dict(answered[0][0] if answered else results[0][0])
+    if not answered:
+        message["outcome"] = max(outcomes, key=outcomes.get)
+    message["rtt"] = rtt_summary(latencies)
+    message["flood"] = {
+        "sent": count,
+        "received": len(answered),
+        "loss": round(1 - len(answered) / count, 4),
+        "target_rate": rate,
+        "achieved_rate": round((count - 1) / send_span, 1) if send_span else None,
+        "duration_s": round(elapsed, 3),
+        "latency_p50_ms": round(_percentile(latencies, 0.50), 3) if latencies else None,
+        "latency_p95_ms": round(_percentile(latencies, 0.95), 3) if latencies else None,
+        "latency_p99_ms": round(_percentile(latencies, 0.99), 3) if latencies else None,
+        "latency_max_ms": round(max(latencies), 3) if latencies else None,
+        "outcomes": outcomes,
+    }
+    return message
+
+def write_line(obj, stream=None):
+    """Writes one compact JSON line; safe to call from several threads."""
+    stream = stream or sys.stdout
+    line = json.dumps(obj, separators=(",", ":"))
+    with _output_lock:
+        stream.write(line + "\n")
+        stream.flush()
+
+def run_batch_request(request, default_timestamp="2025", stream=None):
+    """
+    Runs one probe of a batch and writes its result line.
+
+    Args:
+        request: Parsed JSON request, for example
+            {"request_id": "7", "server_host": "10.0.0.2", "protocol": "tcp",
+             "server_port": 80, "test_id": "1234", "timestamp": "2025", "timeout": 0.2}
+            ("count" sets the number of echo requests of an ICMP probe, "payload_size"
+            the bytes sent after the metadata and "exchanges" the number of
+            probe/response exchanges of a TCP/UDP probe)
+            ("flood": {"count": 100, "rate": 50} turns a TCP/UDP probe into a
+            flood test, see run_flood)
+            or an RTT calibration request
+            {"request_id": "8", "op": "rtt", "server_host": "10.0.0.2",
+             "server_port": 80, "samples": 5, "timeout": 1.0}
+            (without "server_port" the RTT is measured with ICMP echo)
+        default_timestamp: Timestamp used when the request does not carry one.
+        stream: Output stream (defaults to stdout).
+    """
+    request_id = request.get("request_id")
+    try:
+        if request.get("op") == "rtt":
+            result = measure_rtt(
+                request["server_host"],
+                request.get("server_port"),
+                request.get("samples", 5),
+                request.get("timeout", 1.0),
+            )
+            write_line({"request_id": request_id, "result": result}, stream)
+            return
+
+        started = time.perf_counter()
+        if request.get("flood"):
+            result = run_flood(
+                request["server_host"],
+                request["protocol"],
+                request.get("server_port", 0),
+                request.get("test_id", 0),
+                request.get("timestamp", default_timestamp),
+                request["flood"].get("count", 100),
+                request["flood"].get("rate", 0),
+                timeout=request.get("timeout", DEFAULT_TIMEOUT),
+                payload_size=request.get("payload_size", 0),
+            )
+            result["client_timing"] = {"probe_ms": round((time.perf_counter() - started) * 1000, 3)}
+            write_line({"request_id": request_id, "result": result}, stream)
+            return
+
+        result = run_probe(
+            request["server_host"],
+            request["protocol"],
+            request.get("server_port", 0),
+            request.get("test_id", 0),
+            request.get("timestamp", default_timestamp),
+            timeout=request.get("timeout", DEFAULT_TIMEOUT),
+            count=request.get("count", 1),
+            payload_size=request.get("payload_size", 0),
+            exchanges=request.get("exchanges", 1),
+        )
+        result["client_timing"] = {"probe_ms": round((time.perf_counter() - started) * 1000, 3)}
+        write_line({"request_id": request_id, "result": result}, stream)
+    except Exception as e:
+        write_line({"request_id": request_id, "error": str(e)}, stream)
+
+def run_batch(input_stream, concurrency=16, default_timestamp="2025", stream=None):
+    """
+    Reads probe requests as NDJSON (one JSON object per line) and runs them
+    concurrently, writing one result line per probe as soon as it finishes:
+        {"request_id": "7", "result": {...same JSON printed for a single probe...}}
+    or {"request_id": "7", "error": "..."} if the probe could not run.
+    Returns when the input is exhausted and every probe has finished.
+
+    Args:
+        input_stream: Iterable of request lines (e.g. sys.stdin).
+        concurrency: Maximum number of probes running at the same time.
+        default_timestamp: Timestamp used by requests that do not carry one.
+        stream: Output stream (defaults to stdout).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for raw in input_stream:
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                write_line({"request_id": None, "error": f"Invalid request: {e}"}, stream)
+                continue
+            pool.submit(run_batch_request, request, default_timestamp, stream)
+
+def main():
+    """
+        Main method.
+    """
+    startup_ms = process_age_ms()
+    import argparse
+
+    # Configuring command-line arguments
+    parser = argparse.ArgumentParser(description="Firewall Tester Client (UDP/TCP/ICMP)")
+    parser.add_argument("server_host", type=str, nargs="?", help="Server IP address")
+    parser.add_argument("protocol", type=str.lower, nargs="?", help="Protocol used: TCP/UDP/ICMP")
+    parser.add_argument("server_port", type=int, nargs="?", help="Server Port")
+    parser.add_argument("testId", type=int, nargs="?", help="Test ID")
+    parser.add_argument("timestamp", type=str, nargs="?", default="2025", help="Timestamp of Test")
+    parser.add_argument("verbose", type=int, nargs="?", default=0, help="Level of verbosity (0, 1, 2)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Read probes as NDJSON from stdin and print one result line per probe")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Maximum number of concurrent probes in batch mode")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Seconds to wait for the server's reply")
+    parser.add_argument("--count", type=int, default=1,
+                        help="Number of ICMP echo requests of an ICMP probe")
+    parser.add_argument("--payload-size", type=int, default=0,
+                        help="Bytes of payload sent with a TCP/UDP probe, besides its metadata")
+    parser.add_argument("--exchanges", type=int, default=1,
+                        help="Probe/response exchanges over the same TCP connection or UDP socket")
+    parser.add_argument("--flood", type=int, metavar="COUNT",
+                        help="Flood test: send COUNT TCP connections or UDP datagrams (see --rate)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Target probes per second of a flood test (default: as fast as possible)")
+    parser.add_argument("--rtt", type=int, metavar="SAMPLES",
+                        help="Measure the RTT to server_host:server_port with SAMPLES TCP handshakes "
+                             "(ICMP echo requests without a port)")
+
+    args = parser.parse_args()
+
+    if args.batch:
+        run_batch(sys.stdin, args.concurrency, args.timestamp)
+        sys.exit(0)
+
+    if args.rtt:
+        if args.server_host is None:
+            parser.error("server_host is required with --rtt")
+        print(json.dumps(measure_rtt(args.server_host, args.server_port, args.rtt, args.timeout)))
+        sys.exit(0)
+
+    if args.server_host is None or args.protocol is None or args.server_port is None or args.testId is None:
+        parser.error("server_host, protocol, server_port and testId are required unless --batch is used")
 
-    if verbose > 0:
-        print(f"Writing to file: {json.dumps(message, indent=4)}")
-
-except (socket.gaierror, socket.herror, socket.timeout, ConnectionResetError, OSError) as e:
-    if verbose > 0: print(f"Communication error: {e}")
-    message["status"] = '0'
-    message["status_msg"] = "Firewall Drop or Network Error"
-    dados["tests"].append(message)
-    with open(filename, "w", encoding="utf-8") as file:
-        json.dump(dados, file, indent=4)
-    if verbose > 0:
-        print(f"Writing to file: {json.dumps(message, indent=4)}")
+    try:
+        started = time.perf_counter()
+        if args.flood:
+            message = run_flood(args.server_host, args.protocol, args.server_port, args.testId,
+                                args.timestamp, args.flood, args.rate, args.timeout, args.payload_size)
+        else:
+            message = run_probe(args.server_host, args.protocol, args.server_port,
+                                args.testId, args.timestamp, args.verbose, args.timeout, args.count,
+                                args.payload_size, args.exchanges)
+    except ValueError as e:
+        if args.verbose > 0: print(e)
+        sys.exit(1)
+    message["client_timing"] = {
+        "startup_ms": round(startup_ms, 3) if startup_ms is not None else None,
+        "probe_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
 
-finally:
-    if client_sock:
-        client_sock.close()
+    print(json.dumps(message, indent=4))
+    sys.exit(0)
 
-print(json.dumps(message, indent=4))
-sys.exit(0)
+if __name__ == "__main__":
+    main()
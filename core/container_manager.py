@@ -1,67 +1,89 @@
 """Manages interactions with Docker containers for the Firewall Tester."""
 
+import hashlib
+import os
 import subprocess
 import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from .docker_host import DockerHost
+from .docker_backend import DEFAULT_TIMEOUT, get_backend
+from .port_inventory import PortInventory
+
+# Containers whose interfaces are read at once during discovery.
+DISCOVERY_WORKERS = 16
+
+# Programs run inside the containers, copied over the ones shipped in the image
+# so the host and the containers always speak the same protocol and options.
+CONTAINER_SRC_DIR = "/firewallTester/src"
+CONTAINER_SCRIPTS = ["wire.py", "jsonl_log.py", "metrics.py", "capture.py", "icmp_echo.py",
+                     "client.py", "server.py", "agent.py"]
+SCRIPTS_VERSION_FILE = f"{CONTAINER_SRC_DIR}/.scripts_version"
+
+
+def scripts_version():
+    """Returns a short hash of the local container scripts, used to tell whether a container has them."""
+    digest = hashlib.sha256()
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    for script in CONTAINER_SCRIPTS:
+        with open(os.path.join(local_dir, script), "rb") as f:
+            digest.update(script.encode("utf-8") + b"\0" + f.read())
+    return digest.hexdigest()[:16]
 
 class ContainerManager:
     """
     A class to abstract Docker commands for managing and interacting with
     the test containers.
     """
-    def __init__(self, docker_image_name="firewall_tester"):
+    def __init__(self, docker_image_name="firewall_tester", backend=None, arrival_mode="listeners", server_workers=1):
         self.docker_image_name = docker_image_name
-
-    def _run_command(self, command_list, check=False):
-        """
-
-        Private helper method for executing commands safely.
-
-        Accepts a 'check' argument to throw an exception in case of error.
-
-        """
-        try:
-            # The received 'check' is now passed to subprocess.run.
-            return subprocess.run(command_list, capture_output=True, text=True, encoding='utf-8', check=check)
-        except (subprocess.CalledProcessError, FileNotFoundError) as e:
-            # If 'check=True' fails, the exception is caught here.
-            print(f"Error executing command. {' '.join(command_list)}: {e}")
-            # Returns a process object with the consistency error.
-            return subprocess.CompletedProcess(command_list, 1, stderr=str(e), stdout="")
+        # 'listeners' (one socket per line of ports.conf) or 'capture' (server.py
+        # records packets to any port without listening on them).
+        self.arrival_mode = arrival_mode
+        # Number of server.py processes sharing each port (SO_REUSEPORT).
+        self.server_workers = server_workers
+        # Docker backend (docker CLI or Engine API) shared with the TestRunner.
+        self.backend = backend or get_backend("cli")
+        # Listening-socket snapshots, shared with the TestRunner.
+        self.port_inventory = PortInventory(self.backend)
+        # Hosts found by the last discovery, shared by every tab (see refresh_hosts).
+        self._hosts = None
     
     def _get_container_info_by_image_filter(self):
         """
-        Searches for IDs of running containers and inspects them to filter by image.
+        Searches for the running containers of the tester image: one filtered
+        ps and a single inspect of the matching IDs.
 
         Adapted from get_container_info_by_filter in the original code.
 
         """
-        ps_cmd = ["docker", "ps", "-q"]
-        result = self._run_command(ps_cmd, check=True)
-        container_ids = result.stdout.strip().splitlines()
+        container_ids = [cid for cid in self.backend.list_container_ids(self.docker_image_name) if cid]
         
         matched_containers = []
-        for container_id in filter(None, container_ids):
-            inspect_cmd = ["docker", "inspect", container_id]
-            inspect_result = self._run_command(inspect_cmd)
-            if inspect_result.returncode == 0:
-                container_data = json.loads(inspect_result.stdout)[0]
-                image = container_data["Config"]["Image"]
-                
-                if self.docker_image_name in image:
-                    matched_containers.append({
-                        "id": container_id,
-                        "hostname": container_data["Config"]["Hostname"],
-                        "name": container_data["Name"].strip("/"),
-                    })
+        for container_data in self.backend.inspect(container_ids):
+            image = container_data["Config"]["Image"]
+            
+            if self.docker_image_name in image:
+                matched_containers.append({
+                    "id": next((cid for cid in container_ids if container_data["Id"].startswith(cid)),
+                               container_data["Id"][:12]),
+                    "hostname": container_data["Config"]["Hostname"],
+                    "name": container_data["Name"].strip("/"),
+                })
         return matched_containers
 
     def _get_ip_info_from_docker(self, container_id):
 
-        cmd = ["docker", "exec", container_id, "ip", "-4", "-json", "a"]
-        result = self._run_command(cmd, check=True)
+        result = self.backend.exec(container_id, ["ip", "-4", "-json", "a"], timeout=DEFAULT_TIMEOUT)
         return json.loads(result.stdout)
 
+    def _get_ip_info_or_error(self, container_id):
+        """Returns the interfaces of a container, or the exception raised while reading them."""
+        try:
+            return self._get_ip_info_from_docker(container_id)
+        except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
+            return e
+
     def _process_ip_info(self, interfaces_json, host_obj):
         for interface in interfaces_json:
             if interface.get("ifname") == "lo":
@@ -73,25 +95,45 @@ class ContainerManager:
         return host_obj
 
     def get_all_containers_data(self):
+        """
+        Returns the hosts of the last discovery (see refresh_hosts), discovering
+        them on the first call. Every tab shares this snapshot.
+        """
+        if self._hosts is None:
+            self.refresh_hosts()
+        return self._hosts
+
+    def refresh_hosts(self):
+        """
+        Discovers the tester containers and replaces the shared host snapshot:
+        one filtered ps, one inspect and the interfaces of every container
+        read in parallel.
+
+        Returns:
+            list: One dictionary per host (id, nome, hostname, interfaces, ip), sorted by hostname.
+        """
         print(f"\nSearching for containers with the image containing: '{self.docker_image_name}'")
         
         matching_containers_info = self._get_container_info_by_image_filter()
         if not matching_containers_info:
-            return []
+            self._hosts = []
+            return self._hosts
+
+        with ThreadPoolExecutor(max_workers=min(DISCOVERY_WORKERS, len(matching_containers_info))) as pool:
+            interfaces = list(pool.map(self._get_ip_info_or_error, [info['id'] for info in matching_containers_info]))
 
         detailed_hosts = []
-        for container_info in matching_containers_info:
+        for container_info, interfaces_json in zip(matching_containers_info, interfaces):
             host = DockerHost(
                 container_id=container_info['id'],
                 nome=container_info['name'],
                 hostname=container_info['hostname']
             )
             
-            try:
-                interfaces_json = self._get_ip_info_from_docker(container_info['id'])
+            if isinstance(interfaces_json, Exception):
+                print(f"Warning: Could not obtain IP addresses for the host. {host.hostname}: {interfaces_json}")
+            else:
                 host = self._process_ip_info(interfaces_json, host)
-            except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
-                print(f"Warning: Could not obtain IP addresses for the host. {host.hostname}: {e}")
 
             host_dict = host.to_dict()
             
@@ -110,7 +152,8 @@ class ContainerManager:
             host_dict['ip'] = ip_found
             detailed_hosts.append(host_dict)
         
-        return sorted(detailed_hosts, key=lambda x: x["hostname"])
+        self._hosts = sorted(detailed_hosts, key=lambda x: x["hostname"])
+        return self._hosts
     
     def toggle_server(self, host_id):
         success_check, current_status = self.check_server_status(host_id)
@@ -127,7 +170,7 @@ class ContainerManager:
     def get_hosts_for_combobox(self):
         """
         Gets a simplified list of hosts (hostname, id) suitable for use in
-        a combobox widget.
+        a combobox widget, from the shared host snapshot.
         """
         all_hosts = self.get_all_containers_data()
         formatted_list = []
@@ -154,8 +197,7 @@ class ContainerManager:
 
     def check_server_status(self, host_id):
         """Checks if the server.py script is running inside a container."""
-        cmd = ["docker", "exec", host_id, "pgrep", "-f", "server.py"]
-        result = self._run_command(cmd)
+        result = self.backend.exec(host_id, ["pgrep", "-f", "server.py"], timeout=DEFAULT_TIMEOUT)
         status = "on" if result.returncode == 0 and result.stdout.strip() else "off"
         return (True, status)
 
@@ -167,18 +209,82 @@ class ContainerManager:
     #         return (False, result.stderr)
     #     return (True, "Server started.")
     
+    def install_scripts(self, host_id):
+        """
+        Copies the container scripts (client.py, server.py, agent.py and their
+        modules) into a container unless it already has this version of them.
+
+        Returns:
+            tuple: (success, changed); changed is True when the scripts were
+                   copied, so a server already running there is the old one.
+        """
+        version = scripts_version()
+        installed = self.backend.exec(host_id, ["cat", SCRIPTS_VERSION_FILE], timeout=DEFAULT_TIMEOUT)
+        if installed.returncode == 0 and installed.stdout.strip() == version:
+            return (True, False)
+
+        local_dir = os.path.dirname(os.path.abspath(__file__))
+        for script in CONTAINER_SCRIPTS:
+            result = self.backend.copy_to(host_id, os.path.join(local_dir, script), f"{CONTAINER_SRC_DIR}/{script}")
+            if result.returncode != 0:
+                print(f"Error copying {script} to {host_id}: {result.stderr}")
+                return (False, True)
+
+        # Compiled where the probes import them, so no test pays for it.
+        result = self.backend.exec(host_id, ["python3", "-m", "compileall", "-q", CONTAINER_SRC_DIR])
+        if result.returncode != 0:
+            print(f"Error compiling the scripts in {host_id}: {result.stderr}")
+
+        # Written last, so an interrupted copy is retried on the next start.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            version_path = os.path.join(tmp_dir, os.path.basename(SCRIPTS_VERSION_FILE))
+            with open(version_path, "w", encoding="utf-8") as f:
+                f.write(version + "\n")
+            self.backend.copy_to(host_id, version_path, SCRIPTS_VERSION_FILE)
+        return (True, True)
+
     def start_server(self, host_id):
         """Starts the server.py script inside a container."""
-        cmd = ["docker", "exec", "-d", "-w", "/firewallTester/src", host_id, "python3", "server.py"]
-        result = self._run_command(cmd)
+        command = ["python3", "server.py"]
+        if self.arrival_mode == "capture":
+            command.extend(["--arrival-mode", "capture"])
+        if self.server_workers > 1:
+            command.extend(["--workers", str(self.server_workers)])
+        result = self.backend.exec(host_id, command, detach=True, workdir=CONTAINER_SRC_DIR)
+        self.port_inventory.invalidate(host_id)
         if result.returncode != 0:
             return (False, result.stderr)
         return (True, "Server started.")
 
+    def prepare_hosts(self, host_ids, start_stopped=True):
+        """
+        Installs the current scripts in every host and makes its server run
+        them, for all hosts in parallel: a running server whose scripts
+        changed is restarted and, with start_stopped, a stopped one is started.
+
+        Returns:
+            int: The number of servers started (or restarted).
+        """
+        def prepare(host_id):
+            _, scripts_changed = self.install_scripts(host_id)
+            _, status = self.check_server_status(host_id)
+            # A running server from before the install is the old version.
+            restart = status == 'on' and scripts_changed
+            if restart:
+                self.stop_server(host_id)
+            if restart or (status == 'off' and start_stopped):
+                return self.start_server(host_id)[0]
+            return False
+
+        if not host_ids:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(DISCOVERY_WORKERS, len(host_ids))) as pool:
+            return sum(pool.map(prepare, host_ids))
+
     def stop_server(self, host_id):
         """Stops the server.py script inside a container."""
-        cmd = ["docker", "exec", host_id, "pkill", "-f", "server.py"]
-        result = self._run_command(cmd)
+        result = self.backend.exec(host_id, ["pkill", "-f", "server.py"])
+        self.port_inventory.invalidate(host_id)
         if result.returncode > 1:
             return (False, result.stderr)
         return (True, "Server stopped.")
@@ -191,8 +297,7 @@ class ContainerManager:
         for table, should_check in tables_to_check.items():
             if not should_check:
                 continue
-            cmd = ["docker", "exec", host_id, "iptables", "-t", table, "-L", "-n", "-v"]
-            result = self._run_command(cmd)
+            result = self.backend.exec(host_id, ["iptables", "-t", table, "-L", "-n", "-v"])
             if result.returncode != 0:
                 return (False, result.stderr)
             rules[table] = result.stdout
@@ -200,12 +305,18 @@ class ContainerManager:
 
     def get_rules_from_file(self, host_id, container_file_path):
         """Reads the content of a file from within a container."""
-        cmd = ["docker", "exec", host_id, "cat", container_file_path]
-        result = self._run_command(cmd)
+        result = self.backend.exec(host_id, ["cat", container_file_path])
         if result.returncode != 0:
             return (False, result.stderr or "File not found in container.")
         return (True, result.stdout)
 
+    def get_server_metrics(self, host_id):
+        """Reads the metrics snapshot (Prometheus text format) written by server.py."""
+        result = self.backend.exec(host_id, ["cat", "/firewallTester/src/log/metrics.prom"], timeout=DEFAULT_TIMEOUT)
+        if result.returncode != 0:
+            return (False, result.stderr or "No metrics yet: server.py is not running or has not written them.")
+        return (True, result.stdout)
+
     def save_rules_to_local_file(self, rules_string, local_path):
         """Saves a string of rules to a local file."""
         try:
@@ -243,9 +354,7 @@ class ContainerManager:
                 commands_to_run.append(clean_line)
 
         for cmd_str in commands_to_run:
-            cmd_list = ["docker", "exec", host_id, "sh", "-c", cmd_str]
-            
-            result = self._run_command(cmd_list)
+            result = self.backend.exec(host_id, ["sh", "-c", cmd_str])
             
             if result.returncode != 0:
                 error_message = (f"Failed to execute the command:\n'{cmd_str}'\n\n"
@@ -255,11 +364,11 @@ class ContainerManager:
         return (True, f"Rules successfully applied to the host. {hostname}.")
 
     def _copy_and_execute_script(self, host_id, local_path, container_path):
-        result_copy = self._run_command(["docker", "cp", local_path, f"{host_id}:{container_path}"])
+        result_copy = self.backend.copy_to(host_id, local_path, container_path)
         if result_copy.returncode != 0:
             return (False, result_copy.stderr)
 
-        result_exec = self._run_command(["docker", "exec", host_id, "sh", container_path])
+        result_exec = self.backend.exec(host_id, ["sh", container_path])
         if result_exec.returncode != 0:
             return (False, result_exec.stderr)
 
@@ -268,8 +377,7 @@ class ContainerManager:
     def get_host_ports(self, host_id):
         #Aqui era diferente o path
         container_path = "/firewallTester/src/conf/ports.conf"
-        cmd = ["docker", "exec", host_id, "cat", container_path]
-        result = self._run_command(cmd)
+        result = self.backend.exec(host_id, ["cat", container_path])
         if result.returncode != 0:
             return [] 
 
@@ -294,43 +402,31 @@ class ContainerManager:
 
         #diferente aqui dnv o path
         container_path = "/firewallTester/src/conf/ports.conf"
-        copy_result = self._run_command(["docker", "cp", local_ports_file_path, f"{host_id}:{container_path}"])
+        copy_result = self.backend.copy_to(host_id, local_ports_file_path, container_path)
         if copy_result.returncode != 0:
             return (False, f"Failed to copy port file:\n{copy_result.stderr}")
 
+        if self.arrival_mode == "capture":
+            # Capture mode sees every port; no listener to (re)open.
+            return (True, "Ports updated.")
+
         print(f"Restarting server in {host_id} to install new doors...")
         self.stop_server(host_id)
         start_success, msg = self.start_server(host_id)
+        self.port_inventory.invalidate(host_id)
         if not start_success:
             return (False, f"Server restart failed:\n{msg}")
         
         return (True, "Ports updated and server restarted.")
     
     def _get_port_from_container(self, container_id):
-            """
-            Get open ports from a container.
-    
-            Args:
-                container_id: ID from container.
-            """
-            print(f"Get ports from container - {container_id}")
-    
-            net_command = (
-                " netstat -atuln | awk '$1 ~ /^(tcp|udp)$/ {split($4, a, \":\"); "
-                "print $1 \"/\" a[2]}' | sort -t '/' -k 2n"
-            )
-            command = "docker exec "+container_id+net_command
-            
-            result = subprocess.run(command, shell=True, capture_output=True, text=True, check=False)
-    
-            if result.returncode == 0:
-                # Processes output to get protocol and port
-                ports = []
-                for linha in result.stdout.splitlines():
-                    if '/' in linha:
-                        protocol, port = linha.split('/')
-                        ports.append((protocol.upper(), int(port)))  # Add to list as tuple
-                return ports
+        """
+        Get open ports from a container, from the current listening-socket snapshot.
+
+        Args:
+            container_id: ID from container.
+        """
+        return sorted(self.port_inventory.get_ports(container_id), key=lambda p: p[1])
     
     def check_port_open(self, container_id: str, dst_port:str, protocol: str):
         """
@@ -341,14 +437,4 @@ class ContainerManager:
             dst_port (int): The destination port to check.
             protocol (str): The protocol to use (TCP, UDP).
         """
-        print("start check_port_open")
-
-        ports_from_container = self._get_port_from_container(container_id)
-
-        port_protocol = (protocol.upper(),int(dst_port))
-        print ("ports_from_container")
-        print (ports_from_container)
-
-        print(f"port_protocol: {port_protocol}")
-        print("finish check_port_open")
-        return port_protocol in ports_from_container
\ No newline at end of file
+        return self.port_inventory.is_open(container_id, protocol, dst_port)
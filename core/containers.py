@@ -25,6 +25,7 @@
 import subprocess
 import json
 from core.docker_host import DockerHost
+from core.docker_backend import DEFAULT_TIMEOUT, get_backend
 
 def get_ip_info_from_docker(container_id):
     """
@@ -36,13 +37,13 @@ def get_ip_info_from_docker(container_id):
     :return:
         A list of containers informations.
     """
+    result = get_backend().exec(container_id, ["ip", "-4", "-json", "a"], timeout=DEFAULT_TIMEOUT)
+    if result.returncode != 0:
+        print("Error executing Docker command:", result.stderr)
+        return []
     try:
-        result = subprocess.run(
-            ["docker", "exec", container_id, "ip", "-4", "-json", "a"],
-            capture_output=True, text=True, check=True
-        )
         return json.loads(result.stdout)
-    except subprocess.CalledProcessError as e:
+    except json.JSONDecodeError as e:
         print("Error executing Docker command:", e)
         return []
 
@@ -54,23 +55,18 @@ def start_server(container_id):
         container_id: container ID - container that will start the server.
     """
     print(f"Start server in container {container_id}")
-    try:
-        result = subprocess.run(
-            # docker exec -d 9a0a52c42ea8 ./server.py
-            ["docker", "exec", "-d", container_id, "/firewallTester/src/server.py"],
-            capture_output=True, text=True, check=True
-        )
-        try:
-            return json.loads(result.stdout)
-        except json.JSONDecodeError:
-            # The command's success output is empty, so a JSON error is expected.
-            print("Servers turned on...")
-            print("Output received:", result.stdout)
-            return None  # Or some default value
-
-    except subprocess.CalledProcessError as e:
-        print("Error executing Docker command:", e)
+    # docker exec -d 9a0a52c42ea8 ./server.py
+    result = get_backend().exec(container_id, ["/firewallTester/src/server.py"], detach=True)
+    if result.returncode != 0:
+        print("Error executing Docker command:", result.stderr)
         return []
+    try:
+        return json.loads(result.stdout)
+    except json.JSONDecodeError:
+        # The command's success output is empty, so a JSON error is expected.
+        print("Servers turned on...")
+        print("Output received:", result.stdout)
+        return None  # Or some default value
 
 def stop_server(container_id):
     """
@@ -80,8 +76,7 @@ def stop_server(container_id):
         container_id: container ID - container that will stop the server.
     """
     print(f"Stop server in container {container_id}")
-    command = 'docker exec '+ container_id +' pkill server.py'
-    run_command_shell(command)
+    get_backend().exec(container_id, ["pkill", "server.py"])
 
 def run_command(command):
     """
@@ -126,9 +121,7 @@ def get_port_from_container(container_id):
         " netstat -atuln | awk '$1 ~ /^(tcp|udp)$/ {split($4, a, \":\"); "
         "print $1 \"/\" a[2]}' | sort -t '/' -k 2n"
     )
-    command = "docker exec "+container_id+net_command
-    
-    result = subprocess.run(command, shell=True, capture_output=True, text=True, check=False)
+    result = get_backend().exec(container_id, ["sh", "-c", net_command])
 
     if result.returncode == 0:
         # Processes output to get protocol and port
@@ -153,15 +146,13 @@ def copy_host2container(container_id, source_file, destination_file):
 
     """
     print(f"Copy file ({source_file}) to container {container_id}")
-    command = "docker cp "+source_file+" "+ container_id+":"+destination_file
-    try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
-        print(result.stdout)
-        print("Copy successfully completed!")
-        return 0
-    except subprocess.CalledProcessError as e:
-        print("Error executing Docker copy: ", e)
+    result = get_backend().copy_to(container_id, source_file, destination_file)
+    if result.returncode != 0:
+        print("Error executing Docker copy: ", result.stderr)
         return 1
+    print(result.stdout)
+    print("Copy successfully completed!")
+    return 0
 
 def copy_ports2server(container_id, source_file):
     """
@@ -189,19 +180,17 @@ def run_client_test(container_id, dst_ip, protocol, dst_port, teste_id, timestam
     """
     # The 'timestamp' and 'verbose' arguments are kept for signature consistency
     # but are hardcoded in the command below for now.
-    try:
-        result = subprocess.run(
-            ["docker", "exec", container_id, "/firewallTester/src/client.py",
-             dst_ip, protocol, str(dst_port), str(test_id), "2025", "0"],
-            capture_output=True, text=True, check=True
-        )
-        #return json.loads(result.stdout)
-        print(f"Returned code {result.returncode}")
-        print(result.stdout)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print("Error executing Docker command:", e)
+    result = get_backend().exec(
+        container_id,
+        ["/firewallTester/src/client.py", dst_ip, protocol, str(dst_port), str(test_id), "2025", "0"]
+    )
+    if result.returncode != 0:
+        print("Error executing Docker command:", result.stderr)
         return []
+    #return json.loads(result.stdout)
+    print(f"Returned code {result.returncode}")
+    print(result.stdout)
+    return result.stdout
 
 def process_ip_info(interfaces, host):
     """
@@ -349,54 +338,38 @@ def get_container_info_by_filter(filter_string):
     :return: List of containers that match with the filter.
     """
     print(f"\nGetting container information: \n\tAll containers must have names containing the word: {filter_string}.")
+    backend = get_backend()
     try:
-        # Get all running containers
-        # Using check=True as we expect this to succeed.
-        result = subprocess.run(
-            ["docker", "ps", "-q"], capture_output=True, text=True, check=True
-        )
-        container_ids = result.stdout.strip().split("\n")
+        # Get the running containers of the image and inspect them with one call
+        container_ids = [cid for cid in backend.list_container_ids(filter_string) if cid]
 
         matched_containers = []
 
-        for container_id in container_ids:
-            if not container_id:
-                continue
-
-            # Get container details
-            inspect_cmd = [
-                "docker", "inspect", container_id
-            ]
-            inspect_result = subprocess.run(
-                inspect_cmd, capture_output=True, text=True, check=False
-            )
-
-            if inspect_result.returncode == 0:
-                container_data = json.loads(inspect_result.stdout)[0]
-                hostname = container_data["Config"]["Hostname"]
-                name = container_data["Name"].strip("/")
-                networks = container_data["NetworkSettings"]["Networks"]
-                image = container_data["Config"]["Image"]
-
-                interfaces = {}
-                for net_name, net_data in networks.items():
-                    interfaces[net_name] = {
-                        "IPAddress": net_data["IPAddress"],
-                        "MacAddress": net_data["MacAddress"]
-                    }
-
-                if filter_string in image:
-                    matched_containers.append({
-                        "id": container_id,
-                        "hostname": hostname,
-                        "name": name,
-                        "interfaces": interfaces
-                    })
+        for container_data in backend.inspect(container_ids):
+            hostname = container_data["Config"]["Hostname"]
+            name = container_data["Name"].strip("/")
+            networks = container_data["NetworkSettings"]["Networks"]
+            image = container_data["Config"]["Image"]
+
+            interfaces = {}
+            for net_name, net_data in networks.items():
+                interfaces[net_name] = {
+                    "IPAddress": net_data["IPAddress"],
+                    "MacAddress": net_data["MacAddress"]
+                }
+
+            if filter_string in image:
+                matched_containers.append({
+                    "id": container_data["Id"][:12],
+                    "hostname": hostname,
+                    "name": name,
+                    "interfaces": interfaces
+                })
 
         return matched_containers
 
-    except subprocess.CalledProcessError as e:
-        print("Error executing Docker command:", e)
+    except (KeyError, TypeError) as e:
+        print("Error reading Docker inspect data:", e)
         return []
 
 def get_containers_by_image_name():
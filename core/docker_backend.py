@@ -0,0 +1,504 @@
+"""
+This module defines the backends used to talk to Docker: CliBackend, which
+runs the docker command line for every operation, and ApiBackend, which talks
+to the Docker Engine API through one shared, reused client connection.
+
+Both return subprocess.CompletedProcess objects so callers can keep checking
+returncode/stdout/stderr regardless of the backend in use.
+"""
+
+import io
+import json
+import os
+import queue
+import socket
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+import uuid
+
+# Deadline of the short discovery calls (addresses, listening ports, pgrep);
+# commands such as firewall scripts run without one, as they may take long.
+DEFAULT_TIMEOUT = 10
+
+
+class _TimingMixin:
+    """Keeps the count and total duration of each operation."""
+    def _init_timings(self):
+        self._timings = {}
+        self._timings_lock = threading.Lock()
+
+    def _record(self, operation, started):
+        elapsed = time.perf_counter() - started
+        with self._timings_lock:
+            count, total = self._timings.get(operation, (0, 0.0))
+            self._timings[operation] = (count + 1, total + elapsed)
+
+    def timing_summary(self):
+        """
+        Returns the timings recorded so far.
+
+        Returns:
+            dict: {operation: {"count": int, "total_ms": float, "mean_ms": float}}
+        """
+        with self._timings_lock:
+            return {
+                operation: {
+                    "count": count,
+                    "total_ms": total * 1000,
+                    "mean_ms": (total / count) * 1000 if count else 0.0,
+                }
+                for operation, (count, total) in self._timings.items()
+            }
+
+
+class CliBackend(_TimingMixin):
+    """Runs every operation through the docker command line."""
+    name = "cli"
+
+    def __init__(self):
+        self._init_timings()
+
+    def run(self, args, timeout=None, operation="run"):
+        """
+        Runs 'docker <args>' and returns the completed process.
+
+        Args:
+            args (list): Arguments after 'docker'.
+            timeout (float, optional): Deadline in seconds.
+            operation (str): Name used for the timing statistics.
+        """
+        command = ["docker", *args]
+        started = time.perf_counter()
+        try:
+            return subprocess.run(command, capture_output=True, text=True, encoding='utf-8', timeout=timeout)
+        except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+            print(f"Error executing command. {' '.join(command)}: {e}")
+            return subprocess.CompletedProcess(command, 1, stderr=str(e), stdout="")
+        finally:
+            self._record(operation, started)
+
+    def list_container_ids(self, image=None):
+        """
+        Returns the IDs of the running containers.
+
+        Args:
+            image (str, optional): Only the containers whose image name contains this text.
+        """
+        if image is None:
+            result = self.run(["ps", "-q"], operation="ps")
+            if result.returncode != 0:
+                return []
+            return [line for line in result.stdout.strip().splitlines() if line]
+
+        result = self.run(["ps", "--format", "{{.ID}} {{.Image}}"], operation="ps")
+        if result.returncode != 0:
+            return []
+        return [
+            container_id for container_id, _, container_image in
+            (line.partition(" ") for line in result.stdout.strip().splitlines())
+            if container_id and image in container_image
+        ]
+
+    def inspect(self, container_ids):
+        """
+        Inspects one or more containers with a single call.
+
+        Returns:
+            list: The inspect dictionaries of the containers that exist.
+        """
+        if not container_ids:
+            return []
+        result = self.run(["inspect", *container_ids], operation="inspect")
+        try:
+            return json.loads(result.stdout) if result.stdout.strip() else []
+        except json.JSONDecodeError:
+            return []
+
+    def exec(self, container_id, cmd, timeout=None, detach=False, workdir=None):
+        """
+        Runs a command inside a container.
+
+        Args:
+            container_id (str): The ID of the container.
+            cmd (list): The command and its arguments.
+            timeout (float, optional): Deadline in seconds; None waits forever.
+            detach (bool): Start the command in the background and return at once.
+            workdir (str, optional): Working directory inside the container.
+        """
+        args = ["exec"]
+        if detach:
+            args.append("-d")
+        if workdir:
+            args.extend(["-w", workdir])
+        return self.run([*args, container_id, *cmd], timeout=timeout, operation="exec")
+
+    def exec_stream(self, container_id, cmd, timeout=DEFAULT_TIMEOUT, stop=None):
+        """
+        Runs a command inside a container and yields its output lines as they
+        are produced, until the command exits, the deadline passes or the
+        optional `stop` threading.Event is set.
+        """
+        tracked, pid_file = _tracked_command(cmd)
+        command = ["docker", "exec", container_id, *tracked]
+        started = time.perf_counter()
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                text=True, encoding='utf-8')
+        try:
+            yield from _items_until(proc.stdout, started + timeout if timeout else None, stop)
+        finally:
+            proc.kill()
+            proc.wait()
+            proc.stdout.close()
+            # Killing the docker client leaves the command running in the container.
+            self.exec(container_id, _stop_command(pid_file), timeout=5)
+            self._record("exec_stream", started)
+
+    def exec_interactive(self, container_id, cmd, workdir=None):
+        """
+        Starts a long-lived command inside a container whose stdin and stdout
+        stay open for a line-based conversation.
+
+        Returns:
+            subprocess.Popen: The 'docker exec -i' process (text mode).
+        """
+        args = ["docker", "exec", "-i"]
+        if workdir:
+            args.extend(["-w", workdir])
+        return subprocess.Popen([*args, container_id, *cmd], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True, encoding="utf-8", bufsize=1)
+
+    def copy_to(self, container_id, local_path, container_path):
+        """Copies a local file into a container."""
+        return self.run(["cp", local_path, f"{container_id}:{container_path}"], operation="copy")
+
+
+class ApiBackend(_TimingMixin):
+    """
+    Talks to the Docker Engine API through the docker SDK. One client, and so
+    one HTTP connection pool, is shared by every ApiBackend in the process.
+    """
+    name = "api"
+
+    _shared_client = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._init_timings()
+        self.client = self._get_shared_client()
+
+    @classmethod
+    def _get_shared_client(cls):
+        with cls._shared_lock:
+            if cls._shared_client is None:
+                import docker  # optional: only needed by this backend
+
+                client = docker.from_env(max_pool_size=32)
+                client.ping()
+                cls._shared_client = client
+            return cls._shared_client
+
+    def list_container_ids(self, image=None):
+        """
+        Returns the IDs of the running containers.
+
+        Args:
+            image (str, optional): Only the containers whose image name contains this text.
+        """
+        started = time.perf_counter()
+        try:
+            if image is None:
+                return [c["Id"][:12] for c in self.client.api.containers(quiet=True)]
+            return [c["Id"][:12] for c in self.client.api.containers() if image in c.get("Image", "")]
+        except Exception as e:
+            print(f"Error listing containers: {e}")
+            return []
+        finally:
+            self._record("ps", started)
+
+    def inspect(self, container_ids):
+        """
+        Inspects one or more containers over the shared connection.
+
+        Returns:
+            list: The inspect dictionaries of the containers that exist.
+        """
+        started = time.perf_counter()
+        inspected = []
+        try:
+            for container_id in container_ids:
+                try:
+                    inspected.append(self.client.api.inspect_container(container_id))
+                except Exception as e:
+                    print(f"Error inspecting container {container_id}: {e}")
+            return inspected
+        finally:
+            self._record("inspect", started)
+
+    def exec(self, container_id, cmd, timeout=None, detach=False, workdir=None):
+        """
+        Runs a command inside a container.
+
+        Args:
+            container_id (str): The ID of the container.
+            cmd (list): The command and its arguments.
+            timeout (float, optional): Deadline in seconds; None waits forever.
+            detach (bool): Start the command in the background and return at once.
+            workdir (str, optional): Working directory inside the container.
+        """
+        args = ["exec", container_id, *cmd]
+        started = time.perf_counter()
+        try:
+            exec_id = self.client.api.exec_create(container_id, cmd, workdir=workdir)["Id"]
+            if detach:
+                self.client.api.exec_start(exec_id, detach=True)
+                return subprocess.CompletedProcess(args, 0, stdout="", stderr="")
+
+            chunks = self.client.api.exec_start(exec_id, stream=True, demux=True)
+            stdout, stderr = [], []
+            deadline = started + timeout if timeout else None
+            for out, err in _items_until(chunks, deadline):
+                if out:
+                    stdout.append(out)
+                if err:
+                    stderr.append(err)
+
+            if deadline is not None and time.perf_counter() >= deadline:
+                raise subprocess.TimeoutExpired(args, timeout)
+
+            exit_code = self.client.api.exec_inspect(exec_id).get("ExitCode") or 0
+            return subprocess.CompletedProcess(
+                args, exit_code,
+                stdout=b"".join(stdout).decode("utf-8", errors="replace"),
+                stderr=b"".join(stderr).decode("utf-8", errors="replace"),
+            )
+        except subprocess.TimeoutExpired as e:
+            print(f"Error executing command. docker {' '.join(args)}: {e}")
+            return subprocess.CompletedProcess(args, 1, stderr=str(e), stdout="")
+        except Exception as e:
+            print(f"Error executing command. docker {' '.join(args)}: {e}")
+            return subprocess.CompletedProcess(args, 1, stderr=str(e), stdout="")
+        finally:
+            self._record("exec", started)
+
+    def exec_stream(self, container_id, cmd, timeout=DEFAULT_TIMEOUT, stop=None):
+        """
+        Runs a command inside a container and yields its output lines as they
+        are produced, until the command exits, the deadline passes or the
+        optional `stop` threading.Event is set.
+        """
+        tracked, pid_file = _tracked_command(cmd)
+        started = time.perf_counter()
+        chunks = None
+        try:
+            exec_id = self.client.api.exec_create(container_id, tracked, stderr=False)["Id"]
+            chunks = self.client.api.exec_start(exec_id, stream=True)
+            pending = ""
+            for chunk in _items_until(chunks, started + timeout if timeout else None, stop):
+                pending += chunk.decode("utf-8", errors="replace")
+                *lines, pending = pending.split("\n")
+                for line in lines:
+                    yield line + "\n"
+            if pending:
+                yield pending
+        finally:
+            if chunks is not None:
+                # Closes the response and its socket, which ends the pump thread
+                # of _items_until; the command itself is stopped below.
+                chunks.close()
+                self.exec(container_id, _stop_command(pid_file), timeout=5)
+            self._record("exec_stream", started)
+
+    def exec_interactive(self, container_id, cmd, workdir=None):
+        """
+        Starts a long-lived command inside a container whose stdin and stdout
+        stay open for a line-based conversation, over an upgraded API connection.
+
+        Returns:
+            _ApiExecProcess: An object with the stdin/stdout/wait/kill of a text-mode Popen.
+        """
+        try:
+            exec_id = self.client.api.exec_create(container_id, cmd, stdin=True, stderr=False, workdir=workdir)["Id"]
+            sock = self.client.api.exec_start(exec_id, socket=True)
+        except Exception as e:
+            raise OSError(f"docker exec {container_id}: {e}") from e
+        return _ApiExecProcess(self.client.api, exec_id, sock)
+
+    def copy_to(self, container_id, local_path, container_path):
+        """Copies a local file into a container."""
+        args = ["cp", local_path, f"{container_id}:{container_path}"]
+        started = time.perf_counter()
+        try:
+            archive = io.BytesIO()
+            with tarfile.open(fileobj=archive, mode="w") as tar:
+                tar.add(local_path, arcname=os.path.basename(container_path))
+            ok = self.client.api.put_archive(container_id, os.path.dirname(container_path), archive.getvalue())
+            if not ok:
+                return subprocess.CompletedProcess(args, 1, stderr="put_archive failed", stdout="")
+            return subprocess.CompletedProcess(args, 0, stderr="", stdout="")
+        except Exception as e:
+            print(f"Error executing command. docker {' '.join(args)}: {e}")
+            return subprocess.CompletedProcess(args, 1, stderr=str(e), stdout="")
+        finally:
+            self._record("copy", started)
+
+
+def _tracked_command(cmd):
+    """
+    Wraps a streaming command so its PID inside the container is written to a
+    file: closing the stream does not stop the command (docker keeps an exec
+    running after its client goes away), so it is killed through that file.
+
+    Returns:
+        tuple: (wrapped command, PID file path)
+    """
+    pid_file = f"/tmp/.firewall_tester_stream_{uuid.uuid4().hex}.pid"
+    return ["sh", "-c", f'echo $$ > {pid_file}; exec "$@"', "sh", *cmd], pid_file
+
+
+def _stop_command(pid_file):
+    """Returns the command that kills a command started by _tracked_command."""
+    return ["sh", "-c", f"kill $(cat {pid_file}) 2>/dev/null; rm -f {pid_file}"]
+
+
+class _ApiExecStdin:
+    """Text-mode writer to the stdin of an API exec; closing it half-closes the connection."""
+    def __init__(self, sock):
+        self._sock = getattr(sock, "_sock", sock)  # SocketIO over a unix socket, or the socket itself
+
+    def write(self, text):
+        self._sock.sendall(text.encode("utf-8"))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+class _ApiExecProcess:
+    """The part of subprocess.Popen used for a conversation with an API exec."""
+    def __init__(self, api, exec_id, sock):
+        self._api = api
+        self._exec_id = exec_id
+        self._sock = sock
+        self.stdin = _ApiExecStdin(sock)
+        self.stdout = self._lines()
+        self.returncode = None
+
+    def _lines(self):
+        from docker.utils.socket import STDOUT, frames_iter
+
+        pending = ""
+        try:
+            for stream, data in frames_iter(self._sock, tty=False):
+                if stream != STDOUT:
+                    continue
+                pending += data.decode("utf-8", errors="replace")
+                *lines, pending = pending.split("\n")
+                for line in lines:
+                    yield line + "\n"
+        except OSError:
+            pass
+        if pending:
+            yield pending
+
+    def poll(self):
+        """Returns the exit code, or None while the command runs."""
+        if self.returncode is None:
+            try:
+                info = self._api.exec_inspect(self._exec_id)
+            except Exception:
+                return None
+            if not info.get("Running"):
+                self.returncode = info.get("ExitCode") or 0
+        return self.returncode
+
+    def wait(self, timeout=None):
+        """Waits for the command to exit."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(["docker", "exec", self._exec_id], timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def kill(self):
+        """Closes the connection, which closes the command's stdin and stdout."""
+        raw = getattr(self._sock, "_sock", self._sock)
+        for close in (lambda: raw.shutdown(socket.SHUT_RDWR), self._sock.close, raw.close):
+            try:
+                close()
+            except OSError:
+                pass
+
+
+def _items_until(iterable, deadline, stop=None):
+    """Yields items of a blocking iterable from a helper thread until it ends,
+    the deadline (a perf_counter value, or None) passes or `stop` is set."""
+    items = queue.Queue()
+    done = object()
+
+    def pump():
+        try:
+            for item in iterable:
+                items.put(item)
+        except Exception:
+            pass
+        finally:
+            items.put(done)
+
+    threading.Thread(target=pump, daemon=True).start()
+    while True:
+        remaining = None if deadline is None else deadline - time.perf_counter()
+        if remaining is not None and remaining <= 0:
+            return
+        if stop is not None:
+            if stop.is_set():
+                return
+            remaining = 0.2 if remaining is None else min(remaining, 0.2)
+        try:
+            item = items.get(timeout=remaining)
+        except queue.Empty:
+            if stop is not None:
+                continue
+            return
+        if item is done:
+            return
+        yield item
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name="cli"):
+    """
+    Returns the process-wide backend with the given name, creating it on first
+    use. If the API backend cannot be used (docker SDK missing or daemon not
+    reachable), the CLI backend is returned instead.
+
+    Args:
+        name (str): 'cli' or 'api'.
+    """
+    name = (name or "cli").lower()
+    with _backends_lock:
+        if name in _backends:
+            return _backends[name]
+
+        backend = None
+        if name == "api":
+            try:
+                backend = ApiBackend()
+            except Exception as e:
+                print(f"Docker API backend unavailable ({e}); falling back to the docker CLI.", file=sys.stderr)
+        if backend is None:
+            backend = _backends.get("cli") or CliBackend()
+            _backends["cli"] = backend
+
+        _backends[name] = backend
+        return backend
@@ -0,0 +1,251 @@
+"""
+    Program Name: Firewall Tester - ICMP echo
+    Description: ICMP echo (ping) engine used by client.py. One persistent ICMP
+    socket per process, an unprivileged datagram socket when the kernel allows it
+    (net.ipv4.ping_group_range) and a raw socket otherwise, shared by every probe:
+    replies are matched by identifier and sequence, and destination unreachable
+    errors are reported instead of being counted as replies.
+    License: GNU General Public License v3.0
+    Version: 1.0
+"""
+
+import itertools
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACH = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+
+IP_RECVERR = getattr(socket, "IP_RECVERR", 11)
+SO_EE_ORIGIN_ICMP = 2
+
+# Bytes after the ICMP header: enough for a send timestamp, like ping's default.
+PAYLOAD_SIZE = 56
+
+
+def checksum(data):
+    """Computes the Internet checksum (RFC 1071) of a byte string."""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier, sequence, payload):
+    """Builds an ICMP echo request (header and payload)."""
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum(header + payload), identifier, sequence) + payload
+
+
+class _Echo:
+    """One echo request waiting for its reply."""
+    def __init__(self, host):
+        self.host = host
+        self.sent_at = None
+        self.rtt_ms = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class IcmpEchoSocket:
+    """
+    A persistent ICMP socket. A background thread reads every reply and error
+    and hands it to the echo request it answers, so any number of threads can
+    ping through the same socket at the same time.
+    """
+    def __init__(self):
+        try:
+            # Unprivileged ICMP socket: the kernel sets the identifier and only
+            # delivers the replies (and errors) of this socket, without IP header.
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.kind = "dgram"
+            self._sock.setsockopt(socket.SOL_IP, IP_RECVERR, 1)
+            self.identifier = None  # assigned by the kernel (the socket's "port")
+        except (PermissionError, OSError):
+            # Raw socket (CAP_NET_RAW): receives every ICMP message of the host,
+            # with its IP header, so the identifier tells ours apart.
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.kind = "raw"
+            self.identifier = os.getpid() & 0xFFFF
+        self._sequence = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._receive_loop, daemon=True, name="icmp-echo")
+        self._reader.start()
+
+    def echo(self, host, count=1, timeout=1.0, interval=0.0):
+        """
+        Sends `count` echo requests to a host and waits for their replies.
+
+        Args:
+            host: Destination IP address or hostname.
+            count: Number of echo requests.
+            timeout: Seconds to wait for the replies after the last request.
+            interval: Seconds between requests; 0 sends them back to back.
+
+        :return: Dictionary with transmitted, received, loss (fraction),
+                 rtts_ms, rtt_min_ms/rtt_avg_ms/rtt_max_ms (None without
+                 replies) and unreachable ({type, code, offender} of the
+                 first ICMP error received, or None).
+        :raises socket.gaierror: If the host cannot be resolved.
+        :raises OSError: If a request cannot be sent (e.g. no route to the host).
+        """
+        address = socket.gethostbyname(host)
+        echoes = []
+        try:
+            for index in range(max(1, int(count))):
+                if index and interval:
+                    time.sleep(interval)
+                echoes.append(self._send(address))
+
+            deadline = time.monotonic() + timeout
+            for echo in echoes:
+                if not echo.done.wait(max(0.0, deadline - time.monotonic())):
+                    break
+        finally:
+            with self._lock:
+                for echo in echoes:
+                    self._pending.pop(echo.key, None)
+
+        rtts_ms = [echo.rtt_ms for echo in echoes if echo.rtt_ms is not None]
+        unreachable = next((echo.error for echo in echoes if echo.error is not None), None)
+        return {
+            "transmitted": len(echoes),
+            "received": len(rtts_ms),
+            "loss": round(1 - len(rtts_ms) / len(echoes), 3),
+            "rtts_ms": [round(rtt, 4) for rtt in rtts_ms],
+            "rtt_min_ms": round(min(rtts_ms), 3) if rtts_ms else None,
+            "rtt_avg_ms": round(sum(rtts_ms) / len(rtts_ms), 3) if rtts_ms else None,
+            "rtt_max_ms": round(max(rtts_ms), 3) if rtts_ms else None,
+            "unreachable": unreachable,
+        }
+
+    def _send(self, address):
+        echo = _Echo(address)
+        with self._lock:
+            sequence = next(self._sequence) & 0xFFFF
+            echo.key = sequence
+            self._pending[sequence] = echo
+        # The datagram socket rewrites the identifier with its own.
+        packet = build_echo_request(self.identifier or 0, sequence, bytes(PAYLOAD_SIZE))
+        with self._send_lock:
+            echo.sent_at = time.monotonic_ns()
+            try:
+                self._sock.sendto(packet, (address, 0))
+            except OSError:
+                with self._lock:
+                    self._pending.pop(sequence, None)
+                raise
+        if self.identifier is None:
+            self.identifier = self._sock.getsockname()[1]
+        return echo
+
+    def _receive_loop(self):
+        poller = select.poll()
+        poller.register(self._sock, select.POLLIN | select.POLLERR)
+        while True:
+            try:
+                events = poller.poll()
+            except OSError:
+                return
+            for _, mask in events:
+                if mask & select.POLLERR:
+                    self._read_error()
+                if mask & select.POLLIN:
+                    try:
+                        data, source = self._sock.recvfrom(65535, socket.MSG_DONTWAIT)
+                    except BlockingIOError:
+                        continue
+                    except OSError:
+                        self._read_error()
+                        continue
+                    received_at = time.monotonic_ns()
+                    self._handle_packet(data, source[0], received_at)
+
+    def _handle_packet(self, data, source, received_at):
+        if self.kind == "raw":
+            if len(data) < 20:
+                return
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            return
+
+        icmp_type, icmp_code, _, identifier, sequence = struct.unpack_from("!BBHHH", data)
+        if icmp_type == ICMP_ECHO_REPLY:
+            if self.kind == "raw" and identifier != self.identifier:
+                return
+            echo = self._take(sequence, source)
+            if echo is not None:
+                echo.rtt_ms = (received_at - echo.sent_at) / 1e6
+                echo.done.set()
+        elif icmp_type in (ICMP_DEST_UNREACH, ICMP_TIME_EXCEEDED) and self.kind == "raw":
+            # The error quotes the IP header and first 8 bytes of our request.
+            quoted = data[8:]
+            if len(quoted) < 28 or quoted[9] != socket.IPPROTO_ICMP:
+                return
+            original = quoted[(quoted[0] & 0x0F) * 4:]
+            original_type, _, _, identifier, sequence = struct.unpack_from("!BBHHH", original)
+            destination = socket.inet_ntoa(quoted[16:20])
+            if original_type != ICMP_ECHO_REQUEST or identifier != self.identifier:
+                return
+            echo = self._take(sequence, destination)
+            if echo is not None:
+                echo.error = {"type": icmp_type, "code": icmp_code, "offender": source}
+                echo.done.set()
+
+    def _read_error(self):
+        """Reads the errors queued on the datagram socket (IP_RECVERR): the
+        data is the request that caused it, the ancillary data the ICMP error."""
+        while True:
+            try:
+                data, ancdata, _, destination = self._sock.recvmsg(512, 512, socket.MSG_ERRQUEUE | socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if len(data) < 8:
+                continue
+            sequence = struct.unpack_from("!H", data, 6)[0]
+            for level, kind, error in ancdata:
+                if level != socket.SOL_IP or kind != IP_RECVERR or len(error) < 16:
+                    continue
+                _, origin, icmp_type, icmp_code = struct.unpack_from("=IBBB", error)
+                if origin != SO_EE_ORIGIN_ICMP:
+                    continue
+                echo = self._take(sequence, destination[0] if destination else None)
+                if echo is not None:
+                    offender = socket.inet_ntoa(error[20:24]) if len(error) >= 24 else None
+                    echo.error = {"type": icmp_type, "code": icmp_code, "offender": offender}
+                    echo.done.set()
+
+    def _take(self, sequence, host):
+        with self._lock:
+            echo = self._pending.get(sequence)
+            if echo is None or (host is not None and echo.host != host):
+                return None
+            return self._pending.pop(sequence)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Returns the process-wide IcmpEchoSocket, opening it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = IcmpEchoSocket()
+        return _engine
+
+def echo(host, count=1, timeout=1.0, interval=0.0):
+    """Pings a host through the process-wide socket (see IcmpEchoSocket.echo)."""
+    return get_engine().echo(host, count, timeout, interval)
@@ -0,0 +1,210 @@
+"""
+    Program Name: Firewall Tester - JSON Lines logs
+    Description: Append-only JSON Lines logs with size-based rotation, used by
+    server.py and client.py inside the test containers, and the cursor used by
+    the Firewall Tester interface to read only the lines added since its last read.
+    License: GNU General Public License v3.0
+    Version: 1.0
+"""
+
+import fcntl
+import json
+import os
+import threading
+
+# A log is rotated to <path>.1 when the next line would make it larger than
+# MAX_LOG_BYTES; <path>.1 .. <path>.LOG_BACKUPS are kept.
+MAX_LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+
+
+class JsonlLog:
+    """An append-only JSON Lines file, shared by the threads of a process."""
+    def __init__(self, path, max_bytes=MAX_LOG_BYTES, backups=LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def append(self, entry):
+        """
+        Appends one entry as a compact JSON line.
+
+        Each line is written with a single unbuffered write to a file opened
+        with O_APPEND, so lines of several processes never interleave.
+
+        Args:
+            entry (dict): The entry to log.
+        """
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """
+        Appends several entries with a single write.
+
+        Args:
+            entries (list): The entries to log, in order.
+        """
+        if not entries:
+            return
+        lines = b"".join((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8") for entry in entries)
+        with self._lock:
+            handle = self._open()
+            size = os.fstat(handle.fileno()).st_size
+            if size and size + len(lines) > self.max_bytes:
+                self._rotate(handle)
+                handle = self._open()
+            handle.write(lines)
+
+    def close(self):
+        """Closes the underlying file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        """Returns the open file, reopening it if it was rotated by any process."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+
+        if self._file is None or inode != self._inode:
+            if self._file is not None:
+                self._file.close()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "ab", buffering=0)
+            self._inode = os.fstat(self._file.fileno()).st_ino
+        return self._file
+
+    def _rotate(self, handle):
+        """Shifts <path> to <path>.1, <path>.1 to <path>.2 and so on."""
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.stat(self.path).st_ino != self._inode:
+                return  # already rotated by another process
+            for index in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{index}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            pass
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+def _reset_after_fork():
+    """Gives a forked child its own logs, as a lock held by another thread of
+    the parent at fork time would never be released in the child."""
+    global _logs, _logs_lock
+    _logs = {}
+    _logs_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_log(path):
+    """Returns (or creates) the process-wide JsonlLog of a path."""
+    with _logs_lock:
+        if path not in _logs:
+            _logs[path] = JsonlLog(path)
+        return _logs[path]
+
+def append_entry(path, entry):
+    """Appends an entry to the JSON Lines log at path."""
+    get_log(path).append(entry)
+
+def append_entries(path, entries):
+    """Appends several entries to the JSON Lines log at path with one write."""
+    get_log(path).append_many(entries)
+
+
+class JsonlCursor:
+    """
+    Remembers how far a JSON Lines log has been read (inode and byte offset),
+    so each read parses only the lines appended since the previous one.
+    """
+    def __init__(self):
+        self.inode = None
+        self.offset = 0
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def feed(self, data):
+        """
+        Parses the bytes read from the current offset.
+
+        Only complete lines are consumed; a trailing partial line is read
+        again, whole, on the next call.
+
+        Args:
+            data (bytes): File content starting at self.offset.
+
+        Returns:
+            list: The new entries, also appended to self.entries.
+        """
+        complete = data[:data.rfind(b"\n") + 1]
+        self.offset += len(complete)
+
+        new_entries = []
+        for line in complete.splitlines():
+            if not line.strip():
+                continue
+            try:
+                new_entries.append(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+        self.entries.extend(new_entries)
+        return new_entries
+
+    def rotated(self, inode):
+        """
+        Records the inode of the file now at the log path.
+
+        Returns:
+            bool: True if the file was replaced (rotated) since the last read;
+                  the offset then restarts at 0.
+        """
+        was_rotated = self.inode is not None and inode != self.inode
+        self.inode = inode
+        if was_rotated:
+            self.offset = 0
+        return was_rotated
+
+    def read_local(self, path):
+        """
+        Reads the new lines of a local log file.
+
+        Returns:
+            list: The new entries.
+        """
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            return []
+
+        new_entries = []
+        previous_offset = self.offset
+        if self.rotated(inode):
+            new_entries.extend(self._read_local_from(f"{path}.1", previous_offset))
+            self.offset = 0
+        new_entries.extend(self._read_local_from(path, self.offset))
+        return new_entries
+
+    def _read_local_from(self, path, offset):
+        try:
+            with open(path, "rb") as handle:
+                handle.seek(offset)
+                data = handle.read()
+        except FileNotFoundError:
+            return []
+        self.offset = offset
+        return self.feed(data)
@@ -0,0 +1,222 @@
+"""
+    Program Name: Firewall Tester - Server metrics
+    Description: Counters kept by server.py per protocol and port (packets, bytes,
+    DNAT detections, decode errors, SYN observations) and a histogram of the time
+    spent handling each probe, exported as a Prometheus text snapshot written to
+    a file every few seconds, so the host reads them with a single `cat` instead
+    of the server printing on every packet.
+    License: GNU General Public License v3.0
+    Version: 1.0
+"""
+
+import os
+import threading
+import time
+
+PREFIX = "firewall_tester"
+
+# Upper bounds (seconds) of the handler latency histogram buckets.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+WRITE_INTERVAL = 5  # seconds between snapshots (only written when something changed)
+
+# (name, help) of the counters kept per (protocol, port).
+COUNTERS = (
+    ("packets_total", "Probes (TCP messages or UDP datagrams) received."),
+    ("received_bytes_total", "Bytes received in probes."),
+    ("dnat_total", "Probes addressed to another IP (DNAT detected)."),
+    ("decode_errors_total", "Messages that were not a valid probe."),
+)
+
+
+class Histogram:
+    """A cumulative histogram with fixed buckets."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Records one observation."""
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def samples(self):
+        """
+        Returns:
+            list: (le, cumulative count) pairs, ending with ("+Inf", count).
+        """
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            samples.append((repr(bound), cumulative))
+        samples.append(("+Inf", self.count))
+        return samples
+
+
+class ServerMetrics:
+    """
+    The metrics of one server process. Updated from the event loop and the
+    capture threads and rendered from the writer thread, hence the lock; an
+    uncontended lock costs far less than the print it replaces.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {name: {} for name, _ in COUNTERS}
+        self._latency = {}
+        self._syn = {}
+        self.version = 0  # changes whenever a metric does
+
+    def observe(self, protocol, port, size, seconds=None):
+        """
+        Records one probe.
+
+        Args:
+            protocol: 'tcp' or 'udp'.
+            port: Server port that received it.
+            size: Bytes received.
+            seconds: Time spent handling it (None when it was only observed,
+                     as in the capture arrival mode).
+        """
+        key = (protocol, port)
+        with self._lock:
+            self._add("packets_total", key, 1)
+            self._add("received_bytes_total", key, size)
+            if seconds is not None:
+                histogram = self._latency.get(key)
+                if histogram is None:
+                    histogram = self._latency[key] = Histogram()
+                histogram.observe(seconds)
+            self.version += 1
+
+    def count(self, name, protocol, port):
+        """Increments a per-port counter ('dnat_total' or 'decode_errors_total')."""
+        with self._lock:
+            self._add(name, (protocol, port), 1)
+            self.version += 1
+
+    def syn(self, port):
+        """Records a TCP SYN seen by the SYN monitor."""
+        with self._lock:
+            self._syn[port] = self._syn.get(port, 0) + 1
+            self.version += 1
+
+    def _add(self, name, key, value):
+        counter = self._counters[name]
+        counter[key] = counter.get(key, 0) + value
+
+    def render(self, gauges=None):
+        """
+        Renders the metrics in the Prometheus text exposition format.
+
+        Args:
+            gauges: Optional {name: (help, value)} of extra process-wide values.
+
+        :return: The snapshot text.
+        """
+        lines = []
+        with self._lock:
+            for name, help_text in COUNTERS:
+                lines += [f"# HELP {PREFIX}_{name} {help_text}", f"# TYPE {PREFIX}_{name} counter"]
+                for (protocol, port), value in sorted(self._counters[name].items()):
+                    lines.append(f'{PREFIX}_{name}{{protocol="{protocol}",port="{port}"}} {value}')
+
+            name = f"{PREFIX}_syn_observed_total"
+            lines += [f"# HELP {name} TCP SYNs seen by the SYN monitor, answered or not.", f"# TYPE {name} counter"]
+            for port, value in sorted(self._syn.items()):
+                lines.append(f'{name}{{port="{port}"}} {value}')
+
+            name = f"{PREFIX}_handler_seconds"
+            lines += [f"# HELP {name} Time spent handling a probe.", f"# TYPE {name} histogram"]
+            for (protocol, port), histogram in sorted(self._latency.items()):
+                labels = f'protocol="{protocol}",port="{port}"'
+                for bound, cumulative in histogram.samples():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        for gauge, (help_text, value) in (gauges or {}).items():
+            lines += [f"# HELP {PREFIX}_{gauge} {help_text}", f"# TYPE {PREFIX}_{gauge} gauge",
+                      f"{PREFIX}_{gauge} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def merge_snapshots(texts):
+    """
+    Merges snapshots of several processes serving the same ports (SO_REUSEPORT
+    workers) by adding up the samples of identical series.
+
+    Args:
+        texts: Snapshot texts.
+
+    :return: One snapshot text.
+    """
+    families = {}  # name: (comment lines, {series: value}), in order of appearance
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith("#"):
+                parts = line.split(" ", 3)
+                if len(parts) < 3:
+                    continue
+                family = families.setdefault(parts[2], ([], {}))
+                if not any(comment.split(" ", 2)[1] == parts[1] for comment in family[0]):
+                    family[0].append(line)
+                continue
+            series, _, value = line.rpartition(" ")
+            if not series or family is None:
+                continue
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+            family[1][series] = family[1].get(series, 0.0) + value
+
+    lines = []
+    for comments, samples in families.values():
+        lines += comments
+        for series, value in samples.items():
+            lines.append(f"{series} {int(value) if value.is_integer() else round(value, 6)}")
+    return "\n".join(lines) + "\n"
+
+
+def write_snapshot(path, text):
+    """Writes a snapshot atomically, so a reader never sees half of it."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(f"{path}.tmp", path)
+
+
+def start_writer(path, render, changed, interval=WRITE_INTERVAL):
+    """
+    Starts a daemon thread that writes render() to `path` every `interval`
+    seconds, when changed() returns something new.
+
+    Args:
+        path: Snapshot file.
+        render: Callable returning the snapshot text.
+        changed: Callable returning a value that changes with the metrics.
+        interval: Seconds between checks.
+    """
+    def run():
+        last = None
+        while True:
+            current = changed()
+            if current != last:
+                try:
+                    write_snapshot(path, render())
+                    last = current
+                except OSError as e:
+                    print(f"[METRICS] Failed to write {path}: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=run, daemon=True, name="metrics-writer").start()
@@ -0,0 +1,111 @@
+"""
+This module defines the PortInventory class, a cache of the listening sockets
+of each container. One snapshot is taken per container and reused by every
+port check until it is invalidated (at the start of a run, or when the ports
+of a host change).
+"""
+
+import threading
+
+from .docker_backend import DEFAULT_TIMEOUT
+
+# ss is preferred; older images without 'ss -H' fall back to netstat.
+LISTENING_SOCKETS_COMMAND = "ss -Htuln 2>/dev/null || netstat -tuln"
+
+
+def parse_listening_sockets(output):
+    """
+    Parses the output of 'ss -Htuln' or 'netstat -tuln' into exact keys.
+
+    Args:
+        output (str): Command output.
+
+    Returns:
+        set: A set of (protocol, port) tuples, e.g. {("TCP", 80), ("UDP", 53)}.
+    """
+    sockets = set()
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 4:
+            continue
+
+        protocol = fields[0].lower().rstrip("6")
+        if protocol not in ("tcp", "udp"):
+            continue
+
+        # netstat: Proto Recv-Q Send-Q Local ...; ss: Netid State Recv-Q Send-Q Local ...
+        local_address = fields[3] if fields[1].isdigit() else fields[4] if len(fields) > 4 else ""
+        _, _, port = local_address.rpartition(":")
+        if port.isdigit():
+            sockets.add((protocol.upper(), int(port)))
+    return sockets
+
+
+class PortInventory:
+    """Caches one listening-socket snapshot per container."""
+    def __init__(self, backend):
+        self.backend = backend
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._container_locks = {}
+
+    def get_ports(self, container_id):
+        """
+        Returns the listening sockets of a container, taking a snapshot on the
+        first call after an invalidation.
+
+        Args:
+            container_id (str): The ID of the container.
+
+        Returns:
+            set: A set of (protocol, port) tuples.
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(container_id)
+            if snapshot is not None:
+                return snapshot
+            container_lock = self._container_locks.setdefault(container_id, threading.Lock())
+
+        # Concurrent checks of the same container wait for a single snapshot.
+        with container_lock:
+            with self._lock:
+                snapshot = self._snapshots.get(container_id)
+            if snapshot is not None:
+                return snapshot
+
+            print(f"Get ports from container - {container_id}")
+            result = self.backend.exec(container_id, ["sh", "-c", LISTENING_SOCKETS_COMMAND], timeout=DEFAULT_TIMEOUT)
+            if result.returncode != 0:
+                print(f"Error: {result.stderr}")
+                return set()  # not cached, the next check tries again
+
+            snapshot = frozenset(parse_listening_sockets(result.stdout))
+            with self._lock:
+                self._snapshots[container_id] = snapshot
+            return snapshot
+
+    def is_open(self, container_id, protocol, port):
+        """
+        Checks if a port is listening in a container.
+
+        Args:
+            container_id (str): The ID of the container.
+            protocol (str): The protocol (TCP, UDP).
+            port (str|int): The port.
+
+        Returns:
+            bool: True if the exact (protocol, port) pair is listening.
+        """
+        try:
+            key = (protocol.upper(), int(port))
+        except (TypeError, ValueError):
+            return False
+        return key in self.get_ports(container_id)
+
+    def invalidate(self, container_id=None):
+        """Drops the snapshot of one container, or of all containers if None."""
+        with self._lock:
+            if container_id is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(container_id, None)
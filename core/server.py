@@ -24,7 +24,8 @@
 import socket
 import json
 import threading
-import psutil
+import resource
+import selectors
 import ipaddress
 import os
 import signal
@@ -33,25 +34,40 @@ from datetime import datetime
 import subprocess
 import re
 
+import capture
+import jsonl_log
+import metrics
+import wire
+
 total_udp_msgs = 0
 total_tcp_msgs = 0
 server_ips = []
 server_name = "noName"
+verbose = False
+
+# Per-port counters and handler latencies of this process (see metrics.py),
+# written to METRICS_PATH as a Prometheus text snapshot.
+server_metrics = metrics.ServerMetrics()
+METRICS_PATH = os.path.join("log", "metrics.prom")
+
+# Arrival events are appended here, one JSON object per line, and followed by
+# the Firewall Tester interface (tail -F) to confirm arrivals as they happen.
+EVENTS_LOG_PATH = "log/events.jsonl"
 
-# Lock registry per log file path to avoid concurrent write corruption
-_log_locks = {}
-_log_locks_mutex = threading.Lock()
+def publish_event(event_type, entry):
+    """
+    Publishes an arrival event to the events stream followed by the interface.
 
-def get_log_lock(filepath):
-    """Returns (or creates) a per-file lock for safe concurrent writes."""
-    with _log_locks_mutex:
-        if filepath not in _log_locks:
-            _log_locks[filepath] = threading.Lock()
-        return _log_locks[filepath]
+    Args:
+        event_type: 'packet' (a client message reached a server port) or 'syn'
+                    (a TCP SYN was seen, even without a listener or handshake).
+        entry:      Log entry describing the arrival.
+    """
+    _append_to_log_file(EVENTS_LOG_PATH, dict(entry, event=event_type))
 
-def log_received_packet(json_data, server_ip, server_port, protocol):
+def log_received_packet(json_data, server_ip, server_port, protocol, received_ns=None):
     """
-    Appends a received-packet entry to the server_log.json for this test session.
+    Appends a received-packet entry to the server_log.jsonl for this test session.
     The log directory is derived from the timestamp_teste field inside the client JSON,
     so it mirrors the client's log/  structure.
 
@@ -60,11 +76,10 @@ def log_received_packet(json_data, server_ip, server_port, protocol):
         server_ip:   The server-side IP that accepted the connection.
         server_port: The server-side port that accepted the connection.
         protocol:    'tcp' or 'udp'
+        received_ns: time.time_ns() when the probe was received.
     """
     timestamp_teste = json_data.get("timestamp_teste", "unknown")
-    dir_name = f"log/{timestamp_teste}"
-    os.makedirs(dir_name, exist_ok=True)
-    filepath = f"{dir_name}/server_log.json"
+    filepath = f"log/{timestamp_teste}/server_log.jsonl"
 
     entry = {
         "id":                 json_data.get("id", -1),
@@ -76,54 +91,96 @@ def log_received_packet(json_data, server_ip, server_port, protocol):
         "server_port":        server_port,
         "protocol":           protocol.upper(),
         "packet_arrived":     True,       # always True – this entry only exists if the packet arrived
+        "received_ns":        received_ns if received_ns is not None else time.time_ns(),
     }
 
-    lock = get_log_lock(filepath)
-    with lock:
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                log_data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            log_data = {"received": []}
+    _append_to_log_file(filepath, entry)
+    publish_event("packet", entry)
+    debug(f"[LOG] Packet logged -> {filepath}")
 
-        log_data["received"].append(entry)
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(log_data, f, indent=4)
+def _append_to_log_file(filepath, entry):
+    """Appends one line to a JSON Lines log (rotated by size, see jsonl_log.py)."""
+    try:
+        jsonl_log.append_entry(filepath, entry)
+    except OSError as e:
+        print(f"[LOG-ERROR] Failed to append to {filepath}: {e}")
 
-    print(f"[LOG] Packet logged -> {filepath}")
 
+SYN_LOG_PATH = os.path.join("log", "syn_log.jsonl")
+SYN_STATS_INTERVAL = 30  # seconds between drop-counter reports
 
-def _append_to_log_file(filepath, entry):
-    lock = get_log_lock(filepath)
-    with lock:
-        try:
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    log_data = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                log_data = {"received": []}
+# Counters of the SYN monitor in use (see syn_monitor_stats).
+_syn_capture = None
+_syn_writer = None
 
-            log_data.setdefault("received", [])
-            log_data["received"].append(entry)
+def _publish_syn_batch(entries):
+    """Publishes the arrival events of a batch of SYN log entries."""
+    _append_to_log_file_batch(EVENTS_LOG_PATH, [dict(entry, event="syn") for entry in entries])
 
-            tmp_filepath = f"{filepath}.tmp"
-            with open(tmp_filepath, 'w', encoding='utf-8') as f:
-                json.dump(log_data, f, indent=4)
-            try:
-                os.replace(tmp_filepath, filepath)
-            except Exception:
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(log_data, f, indent=4)
+def _append_to_log_file_batch(filepath, entries):
+    """Appends several lines to a JSON Lines log with one write."""
+    try:
+        jsonl_log.append_entries(filepath, entries)
+    except OSError as e:
+        print(f"[LOG-ERROR] Failed to append to {filepath}: {e}")
 
-        except Exception as e:
-            try:
-                import traceback
-                tb = traceback.format_exc()
-            except Exception:
-                tb = str(e)
-            print(f"[LOG-ERROR] Failed to append to {filepath}: {e}\n{tb}")
+def syn_monitor_stats():
+    """
+    Returns the counters of the SYN monitor.
 
+    :return: Dict with captured, kernel_drops (packets the kernel could not queue
+             to the capture socket), queue_drops (entries dropped because the log
+             writer fell behind) and written, or None if no monitor is running.
+    """
+    if _syn_writer is None:
+        return None
+    stats = {"captured": 0, "kernel_drops": 0}
+    if _syn_capture is not None:
+        capture_stats = _syn_capture.stats()
+        stats["captured"] = capture_stats["captured"]
+        stats["kernel_drops"] = capture_stats["kernel_drops"]
+    stats["queue_drops"] = _syn_writer.dropped
+    stats["written"] = _syn_writer.written
+    return stats
+
+def _report_syn_stats():
+    """Prints the SYN monitor counters periodically, when they change."""
+    last = None
+    while True:
+        time.sleep(SYN_STATS_INTERVAL)
+        stats = syn_monitor_stats()
+        if stats and stats != last:
+            print(f"[SYN-MONITOR] captured={stats['captured']} written={stats['written']} "
+                  f"kernel_drops={stats['kernel_drops']} queue_drops={stats['queue_drops']}")
+            last = stats
+
+def _start_syn_monitor():
+    """
+    Starts logging TCP SYN attempts to log/syn_log.jsonl.
+
+    SYNs are captured in-process through an AF_PACKET socket with a kernel BPF
+    filter; if that is not possible (no CAP_NET_RAW, not Linux) tcpdump is used.
+    """
+    global _syn_capture, _syn_writer
+    _syn_writer = capture.BatchedLogWriter(SYN_LOG_PATH, on_batch=_publish_syn_batch)
+
+    def handle(packet):
+        entry = capture.decode_tcp_syn(packet)
+        if entry is not None:
+            server_metrics.syn(entry["server_port"])
+            _syn_writer.put(entry)
+
+    syn_capture = capture.PacketCapture(capture.SYN_FILTER, handle)
+    try:
+        syn_capture.start(name="syn-capture")
+        _syn_capture = syn_capture
+        print("[SYN-MONITOR] in-process capture started")
+    except (OSError, AttributeError) as e:
+        print(f"[SYN-MONITOR] in-process capture unavailable ({e}); falling back to tcpdump.")
+        _start_tcpdump_monitor()
+
+    threading.Thread(target=_report_syn_stats, daemon=True, name="syn-stats").start()
 
 def _start_tcpdump_monitor():
     """Start a background thread that runs tcpdump and logs SYN attempts."""
@@ -146,10 +203,6 @@ def _start_tcpdump_monitor():
             r"Flags\s+\[(?P<flags>[^\]]+)\]"
         )
 
-        syn_log_dir = "log"
-        os.makedirs(syn_log_dir, exist_ok=True)
-        syn_log_path = os.path.join(syn_log_dir, "syn_log.json")
-
         print("[SYN-MONITOR] tcpdump monitor started")
 
         for raw in proc.stdout:
@@ -160,22 +213,17 @@ def _start_tcpdump_monitor():
             if not m:
                 continue
 
-            src = m.group('src')
-            srcp = int(m.group('srcp'))
-            dst = m.group('dst')
-            dstp = int(m.group('dstp'))
-
             entry = {
                 "timestamp": datetime.now().isoformat(),
-                "client_ip": src,
-                "client_port": srcp,
-                "server_ip": dst,
-                "server_port": dstp,
+                "client_ip": m.group('src'),
+                "client_port": int(m.group('srcp')),
+                "server_ip": m.group('dst'),
+                "server_port": int(m.group('dstp')),
                 "protocol": "TCP",
                 "note": "SYN seen (handshake incomplete or in-progress)"
             }
-            _append_to_log_file(syn_log_path, entry)
-            print(f"[SYN-MONITOR] {src}:{srcp} -> {dst}:{dstp} (SYN)")
+            server_metrics.syn(entry["server_port"])
+            _syn_writer.put(entry)
 
         try:
             proc.stdout.close()
@@ -187,12 +235,78 @@ def _start_tcpdump_monitor():
     t = threading.Thread(target=monitor, daemon=True, name="tcpdump-monitor")
     t.start()
 
+CAPTURE_LOG_PATH = os.path.join("log", "capture_log.jsonl")
+
+# Test id and session carried in the JSON payload sent by client.py.
+_payload_id_re = re.compile(rb'"id"\s*:\s*"?([\w-]+)')
+_payload_timestamp_re = re.compile(rb'"timestamp_teste"\s*:\s*"?([\w:.+-]+)')
+
+_arrival_capture = None
+_arrival_writer = None
+
+def _log_arrival_batch(entries):
+    """Copies the tagged entries of a captured batch to the session server logs
+    and publishes their arrival events."""
+    by_session = {}
+    for entry in entries:
+        if entry["id"] is not None:
+            by_session.setdefault(entry["timestamp_teste"], []).append(entry)
+    for timestamp_teste, session_entries in by_session.items():
+        _append_to_log_file_batch(f"log/{timestamp_teste}/server_log.jsonl", session_entries)
+        _append_to_log_file_batch(EVENTS_LOG_PATH, [dict(entry, event="packet") for entry in session_entries])
+
+def _handle_arrival_packet(packet):
+    """Turns a captured TCP/UDP packet into a capture_log entry."""
+    decoded = capture.decode_transport(packet)
+    if decoded is None:
+        return
+    payload = decoded["payload"]
+    server_metrics.observe(decoded["protocol"].lower(), decoded["destination_port"], len(payload))
+    test_id = _payload_id_re.search(payload) if payload else None
+    timestamp_teste = _payload_timestamp_re.search(payload) if test_id else None
+
+    _arrival_writer.put({
+        "id":                 test_id.group(1).decode() if test_id else None,
+        "timestamp_teste":    timestamp_teste.group(1).decode() if timestamp_teste else "unknown",
+        "timestamp_received": datetime.now().isoformat(),
+        "client_ip":          decoded["source_ip"],
+        "client_port":        decoded["source_port"],
+        "server_ip":          decoded["destination_ip"],
+        "server_port":        decoded["destination_port"],
+        "protocol":           decoded["protocol"],
+        "packet_arrived":     True,
+        "payload_bytes":      len(payload),
+    })
+
+def _start_arrival_capture():
+    """
+    Starts the capture arrival mode: every TCP/UDP packet reaching this host,
+    on any port, is logged to log/capture_log.jsonl; packets whose payload
+    carries a test id are also logged to the server_log.jsonl of their session,
+    as if a listener had received them.
+
+    :return: True if the capture is running.
+    """
+    global _arrival_capture, _arrival_writer
+    _arrival_writer = capture.BatchedLogWriter(CAPTURE_LOG_PATH, on_batch=_log_arrival_batch)
+    arrival_capture = capture.PacketCapture(capture.ARRIVAL_FILTER, _handle_arrival_packet)
+    try:
+        arrival_capture.start(name="arrival-capture")
+    except (OSError, AttributeError) as e:
+        print(f"[CAPTURE] capture arrival mode unavailable: {e}")
+        return False
+    _arrival_capture = arrival_capture
+    print("[CAPTURE] recording TCP/UDP packets to any port")
+    return True
+
 def get_ips():
     """
         Get IPs from the hosts who execute this code.
 
         :return: List of IPs from this host.
     """
+    import psutil  # only needed once at start-up, not by --stats
+
     for addrs in psutil.net_if_addrs().values():
         for addr in addrs:
             if addr.family in (2, 10):  # 2 = IPv4, 10 = IPv6
@@ -275,212 +389,712 @@ def read_ports_from_file(file_name):
         print(f"Error: File  '{file_name}' not found.")
         return None
 
-def get_pid_by_port(protocol, port):
+def get_pids_by_ports(tuples):
     """
-        Returns the PID of the process using the specified port.
+        Returns the PIDs of the processes (other than this one) using the given ports,
+        with a single scan of the connection table per protocol.
 
         Args:
-            protocol: Protocol (TCP/UDP)
-            port: Network port
-        
-        :return: PID - Process ID
+            tuples: List of (port, protocol) tuples.
+
+        :return: Set of PIDs.
     """
-    print(f"Get process pid on port {port}.")
-    for conn in psutil.net_connections(kind=protocol):
-        if conn.laddr.port == port:
-            return conn.pid
-    return None
+    import psutil
 
-def kill_pid_by_port(protocol, port):
+    pids = set()
+    for protocol in {protocol for _, protocol in tuples}:
+        ports = {port for port, p in tuples if p == protocol}
+        for conn in psutil.net_connections(kind=protocol):
+            if conn.laddr and conn.laddr.port in ports and conn.pid and conn.pid != os.getpid():
+                pids.add(conn.pid)
+    return pids
+
+def kill_processes_on_ports(tuples):
     """
-        Kill a process running on a port via pid
+        Kill the processes running on the ports this server is about to open.
 
         Args:
-            protocol: Protocol (TCP/UDP).
-            port: Network port.
+            tuples: List of (port, protocol) tuples.
     """
-    print(f"Kill process on port {port}.")
-    pid = get_pid_by_port(protocol, port)
-    if  pid != None:
+    for pid in get_pids_by_ports(tuples):
         try:
             os.kill(pid, signal.SIGTERM)
             print(f"Process {pid} successfully terminated.")
-
         except Exception as e:
             print(f"Error terminating process {pid}: {e}")
 
 def show_total_msgs():
     """
-        Shows the total number of messages sent by clients and processed by the server in this program.
+        Shows the total number of messages sent by clients and processed by the
+        server in this program (on exit; the live counters are in METRICS_PATH).
     """
     global total_tcp_msgs, total_udp_msgs
     print(f"Number of messages:\n\t * TCP: {total_tcp_msgs};\n\t * UDP: {total_udp_msgs};\n\t * Total: {total_tcp_msgs+total_udp_msgs};")
+    syn_stats = syn_monitor_stats()
+    if syn_stats:
+        print(f"\t * SYNs: {syn_stats['captured']} (kernel drops: {syn_stats['kernel_drops']}, queue drops: {syn_stats['queue_drops']});")
 
-def lead_with_client_TCP(client_socket):
+def debug(message):
+    """
+        Prints a message only in verbose mode (--verbose); per-packet output
+        would otherwise dominate the cost of serving a probe.
     """
-        Deals with communication with a client.
+    if verbose:
+        print(message)
 
-        Args:
-            client_socket: Client Socket.
+def answer_probe(json_data, server_ip, server_port, protocol):
     """
-    global total_tcp_msgs
-    try:
-        data = client_socket.recv(1024).decode('utf-8')
-        total_tcp_msgs += 1
-        json_data = json.loads(data)
-        print(f"Received JSON object:\n", json.dumps(json_data, indent=4))
-
-        dest_ip = json_data["server_ip"]
-
-        server_address = client_socket.getsockname()
-        server_ip, server_port = server_address
-        #server_ips.append("0.0.0.0")
-        #if (dest_ip not in server_ips) and is_not_loopback(dest_ip): ip_valido_nao_loopback_nem_zero
-         # Log the received packet immediately
-        log_received_packet(json_data, server_ip, server_port, "tcp")
-       
-        if (dest_ip not in server_ips) and check_if_validIP_not_localhost_or_zero(dest_ip):
-            #print(f"ips diferentes {dest_ip}")
-            host_name = socket.getfqdn()
-            json_data["message"] = f"Looks like DNAT was made {json_data['server_ip']}->{host_name}"
-            json_data = add_dnat_to_json(json_data, host_name, server_ip, server_port)
-            print(json.dumps(json_data, indent=4))
-
-        client_socket.send(json.dumps(json_data).encode('utf-8'))
+        Logs a probe received from a client and builds the response fields.
 
-    except (json.JSONDecodeError, UnicodeDecodeError):
-        print("Error decoding received JSON object or invalid data.")
-        client_socket.send("Error: Invalid JSON object or invalid data.".encode('utf-8'))
+        The response carries server_received_ns and server_sent_ns
+        (time.time_ns()): every container of the lab runs on the same kernel,
+        hence the same clock, so the client's own send and receive times turn
+        them into forward and return one-way delays.
 
-    finally:
-        client_socket.close()
-        print("Connection with client closed.")
-        show_total_msgs()
+        Args:
+            json_data: The probe fields sent by the client.
+            server_ip: The server-side IP that received the probe.
+            server_port: The server-side port that received the probe.
+            protocol: 'tcp' or 'udp'.
 
-def server_udp(port):
+        :return: Dictionary with the response fields.
+        :raises KeyError: If the probe has no server_ip.
     """
-        Start UDP server.
+    received_ns = time.time_ns()
+    dest_ip = json_data["server_ip"]
+    debug(f"Received JSON object:\n{json.dumps(json_data, indent=4)}")
+    # Log the received packet immediately
+    log_received_packet(json_data, server_ip, server_port, protocol, received_ns)
+
+    if (dest_ip not in server_ips) and check_if_validIP_not_localhost_or_zero(dest_ip):
+        host_name = socket.getfqdn()
+        server_metrics.count("dnat_total", protocol, server_port)
+        json_data["message"] = f"Looks like DNAT was made {json_data['server_ip']}->{host_name}"
+        json_data = add_dnat_to_json(json_data, host_name, server_ip, server_port)
+        debug(json.dumps(json_data, indent=4))
+    json_data["server_received_ns"] = received_ns
+    json_data["server_sent_ns"] = time.time_ns()
+    return json_data
+
+def process_probe(data, server_ip, server_port, protocol):
+    """
+        Logs a probe in the legacy format (one JSON object, as sent by older
+        clients) and builds the response.
 
         Args:
-            port: UDP port where the server will run. 
+            data: Bytes received from the client (a JSON object).
+            server_ip: The server-side IP that received the probe.
+            server_port: The server-side port that received the probe.
+            protocol: 'tcp' or 'udp'.
+
+        :return: Response bytes.
     """
-    global total_udp_msgs
-    host = '0.0.0.0'
-    protocol = 'udp'
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-    except OSError:
-        pass
-    sock.bind((host, port))  # Bind to local address and port
+        json_data = answer_probe(json.loads(data.decode('utf-8')), server_ip, server_port, protocol)
+    except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+        debug("Error decoding received JSON object or invalid data.")
+        server_metrics.count("decode_errors_total", protocol, server_port)
+        return "Error: Invalid JSON object or invalid data.".encode('utf-8')
 
-    while True:
-        data, addr = sock.recvfrom(1024)  # Receives 1024 bytes of data
-        total_udp_msgs += 1
-        print(f"Message received from {addr}: {data.decode()}")
-
-        # Send an optional response
-        response = f"Received: {data.decode()}"
-        message_json = data.decode('utf-8')
-        json_data = json.loads(message_json)
-        
-        dest_ip = json_data["server_ip"]
-        #if (dest_ip not in server_ips) and is_not_loopback(dest_ip):
-        server_ip = server_ips[0] if server_ips else "0.0.0.0"
-
-        # Log the received packet immediately
-        log_received_packet(json_data, server_ip, port, "udp")
-
-        if (dest_ip not in server_ips) and check_if_validIP_not_localhost_or_zero(dest_ip):
-            print(f"The IP is not in the server list and is not loopback - {dest_ip}")
-            #print("different ips")
-            host_name = socket.getfqdn()
-            server_ip = server_ips[0]
-            json_data["message"] = f"Looks like DNAT was made {json_data['server_ip']}->{host_name}"
-            json_data = add_dnat_to_json(json_data, host_name, server_ip, port)
-            print(json.dumps(json_data, indent=4))
-        
-        response = json.dumps(json_data).encode('utf-8')
-        sock.sendto(response, addr)
-        show_total_msgs()
+    return json.dumps(json_data).encode('utf-8')
 
-def start_server(host, protocol, port):
+def process_frame(frame_type, metadata, payload, server_ip, server_port, protocol):
     """
-        Starts a TCP or UDP server on a specific port.
+        Logs a probe received as a frame (see wire.py) and builds the response frame.
 
         Args:
-            host: Host;
-            protocol: protocol (TCP/UDP);
-            port: Network port.
+            frame_type: Type of the received frame.
+            metadata: Fields of the probe.
+            payload: Payload of the probe; only its size is reported back.
+            server_ip: The server-side IP that received the probe.
+            server_port: The server-side port that received the probe.
+            protocol: 'tcp' or 'udp'.
+
+        :return: Response frame bytes.
+    """
+    if frame_type != wire.PROBE:
+        server_metrics.count("decode_errors_total", protocol, server_port)
+        return wire.encode_frame(wire.ERROR, {"error": f"unexpected frame type {frame_type}"})
+    try:
+        json_data = answer_probe(metadata, server_ip, server_port, protocol)
+    except (KeyError, TypeError):
+        debug("Probe frame without the probe fields.")
+        server_metrics.count("decode_errors_total", protocol, server_port)
+        return wire.encode_frame(wire.ERROR, {"error": "invalid probe"})
+    json_data["payload_received"] = len(payload)
+    return wire.encode_frame(wire.RESPONSE, json_data)
+
+def process_datagram(data, server_ip, server_port):
+    """
+        Answers a UDP datagram, framed or in the legacy format.
+
+        :return: Response bytes.
+    """
+    if not wire.is_framed(data):
+        return process_probe(data, server_ip, server_port, "udp")
+    try:
+        frame = wire.decode_frame(data)
+    except wire.WireError as e:
+        server_metrics.count("decode_errors_total", "udp", server_port)
+        return wire.encode_frame(wire.ERROR, {"error": str(e)})
+    if frame is None:
+        server_metrics.count("decode_errors_total", "udp", server_port)
+        return wire.encode_frame(wire.ERROR, {"error": "truncated frame"})
+    frame_type, metadata, payload, _ = frame
+    return process_frame(frame_type, metadata, payload, server_ip, server_port, "udp")
+
+
+MAX_REQUEST_BYTES = 64 * 1024   # a legacy (unframed) probe larger than this is rejected
+CONNECTION_TIMEOUT = 5          # seconds a TCP client may stay idle between probes
+MAX_ACCEPTS_PER_EVENT = 64      # connections accepted per readiness event
+MAX_DATAGRAMS_PER_EVENT = 64    # UDP datagrams read per readiness event
+
+
+class TcpConnection:
+    """State of one accepted TCP client in the event loop."""
+    def __init__(self, sock, server_port):
+        self.sock = sock
+        self.server_port = server_port
+        self.received = bytearray()
+        self.response = b""
+        self.deadline = time.monotonic() + CONNECTION_TIMEOUT
+        # None until the first bytes tell whether the client sends frames
+        # (several exchanges per connection) or one legacy JSON probe.
+        self.framed = None
+        self.close_after_response = True
+
+
+class EventLoopServer:
+    """
+        Serves every configured TCP and UDP port from one selector loop: no
+        thread per port or per client, so thousands of ports and concurrent
+        probes cost file descriptors, not threads.
     """
-    if protocol == "tcp":
+    def __init__(self, backlog=1024):
+        self.backlog = backlog
+        self.selector = selectors.DefaultSelector()
+        self.connections = set()
+
+    def open_port(self, host, protocol, port):
+        """
+            Opens a listening TCP or bound UDP socket and registers it.
+
+            Args:
+                host: Host;
+                protocol: protocol (tcp/udp);
+                port: Network port.
+
+            :return: True if the port was opened.
+        """
+        kind = socket.SOCK_STREAM if protocol == "tcp" else socket.SOCK_DGRAM
+        sock = socket.socket(socket.AF_INET, kind)
         try:
-            server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             try:
-                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             except OSError:
                 pass
-            server_socket.bind((host, port))
-            server_socket.listen(1)
-            print(f"\t++ Listening on port  {protocol.upper()}/{port}")
-
+            sock.bind((host, port))
+            if protocol == "tcp":
+                sock.listen(self.backlog)
+            sock.setblocking(False)
         except OSError as e:
             print(f"Error executing server {host}-{protocol}:{port} - check if the port is not in use by another service!!!")
             print(f"\t{e}")
-            quit()
+            sock.close()
+            return False
+
+        handler = self._accept if protocol == "tcp" else self._read_udp
+        self.selector.register(sock, selectors.EVENT_READ, (handler, port))
+        print(f"\t++ Listening on port {protocol.upper()}/{port}")
+        return True
 
+    def serve_forever(self):
+        """Runs the event loop."""
         while True:
-            client_socket, addr = server_socket.accept()
-            print(f"Client connected on {port}: {addr}")
-            client_thread = threading.Thread(target=lidar_com_cliente_TCP, args=(client_socket,))
-            client_thread.start()
+            for key, mask in self.selector.select(timeout=1):
+                handler, data = key.data
+                handler(key.fileobj, data, mask)
+            self._expire_connections()
 
-    elif protocol == "udp":
-            print(f"\t++ Listening on port {protocol.upper()}/{port}")
-            client_thread = threading.Thread(target=server_udp, args=(port,))
-            client_thread.start()
+    def _accept(self, sock, port, mask):
+        for _ in range(MAX_ACCEPTS_PER_EVENT):
+            try:
+                client_socket, addr = sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"Error accepting connection on {port}: {e}")
+                return
+            debug(f"Client connected on {port}: {addr}")
+            client_socket.setblocking(False)
+            connection = TcpConnection(client_socket, port)
+            self.connections.add(connection)
+            self.selector.register(client_socket, selectors.EVENT_READ, (self._serve_tcp, connection))
+
+    def _serve_tcp(self, sock, connection, mask):
+        global total_tcp_msgs
+        if mask & selectors.EVENT_WRITE:
+            self._send_response(connection)
+            return
 
-    else:
-        print(f">>> WARNING!!! Could not start this port: {protocol}/{port}")
+        try:
+            chunk = sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(connection)
+            return
+
+        connection.received += chunk
+        if connection.framed is None and connection.received:
+            connection.framed = wire.is_framed(connection.received[:len(wire.MAGIC)]) or (
+                len(connection.received) < len(wire.MAGIC) and wire.MAGIC.startswith(connection.received))
+        if connection.framed:
+            self._serve_frames(connection, closed=not chunk)
+            return
+
+        if len(connection.received) > MAX_REQUEST_BYTES:
+            server_metrics.count("decode_errors_total", "tcp", connection.server_port)
+            connection.response = "Error: Invalid JSON object or invalid data.".encode('utf-8')
+        elif chunk and not _is_complete_json(connection.received):
+            return  # wait for the rest of the probe
+        elif not connection.received:
+            self._close(connection)
+            return
+        else:
+            total_tcp_msgs += 1
+            started = time.perf_counter()
+            server_ip = sock.getsockname()[0]
+            connection.response = process_probe(connection.received, server_ip, connection.server_port, "tcp")
+            server_metrics.observe("tcp", connection.server_port, len(connection.received),
+                                   time.perf_counter() - started)
+
+        self.selector.modify(sock, selectors.EVENT_WRITE, (self._serve_tcp, connection))
+        self._send_response(connection)
+
+    def _serve_frames(self, connection, closed):
+        """Answers every whole frame received so far on a connection; the
+        connection stays open for further exchanges until the client closes it."""
+        global total_tcp_msgs
+        responses = []
+        connection.close_after_response = closed
+        server_ip = connection.sock.getsockname()[0]
+        while connection.received:
+            try:
+                frame = wire.decode_frame(connection.received)
+            except wire.WireError as e:
+                server_metrics.count("decode_errors_total", "tcp", connection.server_port)
+                responses.append(wire.encode_frame(wire.ERROR, {"error": str(e)}))
+                connection.received.clear()
+                connection.close_after_response = True
+                break
+            if frame is None:
+                break
+            started = time.perf_counter()
+            frame_type, metadata, payload, size = frame
+            del connection.received[:size]
+            total_tcp_msgs += 1
+            responses.append(process_frame(frame_type, metadata, payload, server_ip, connection.server_port, "tcp"))
+            server_metrics.observe("tcp", connection.server_port, size, time.perf_counter() - started)
+
+        connection.deadline = time.monotonic() + CONNECTION_TIMEOUT
+        if not responses:
+            if closed:
+                self._close(connection)
+            return
+        connection.response = b"".join(responses)
+        self.selector.modify(connection.sock, selectors.EVENT_WRITE, (self._serve_tcp, connection))
+        self._send_response(connection)
+
+    def _send_response(self, connection):
+        try:
+            sent = connection.sock.send(connection.response)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(connection)
+            return
+        connection.response = connection.response[sent:]
+        if not connection.response:
+            if connection.framed and not connection.close_after_response:
+                self.selector.modify(connection.sock, selectors.EVENT_READ, (self._serve_tcp, connection))
+            else:
+                self._close(connection)
 
+    def _read_udp(self, sock, port, mask):
+        global total_udp_msgs
+        for _ in range(MAX_DATAGRAMS_PER_EVENT):
+            try:
+                data, addr = sock.recvfrom(MAX_REQUEST_BYTES)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                debug(f"Error receiving on UDP/{port}: {e}")
+                return
+            total_udp_msgs += 1
+            debug(f"Message received from {addr}: {data!r}")
+
+            started = time.perf_counter()
+            server_ip = server_ips[0] if server_ips else "0.0.0.0"
+            response = process_datagram(data, server_ip, port)
+            server_metrics.observe("udp", port, len(data), time.perf_counter() - started)
+            try:
+                sock.sendto(response, addr)
+            except OSError as e:
+                debug(f"Error answering {addr} on UDP/{port}: {e}")
+
+    def _close(self, connection):
+        self.connections.discard(connection)
+        try:
+            self.selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+        connection.sock.close()
+        debug("Connection with client closed.")
+
+    def _expire_connections(self):
+        now = time.monotonic()
+        for connection in [c for c in self.connections if c.deadline < now]:
+            self._close(connection)
+
+
+STATS_DIR = os.path.join("log", "stats")
+WORKERS_FILE = os.path.join(STATS_DIR, "server.json")
+STATS_TIMEOUT = 2  # seconds --stats waits for the workers to answer
+
+def write_worker_stats(signum=None, frame=None):
+    """
+        Writes the counters of this process to log/stats/<pid>.json.
+        Installed as the SIGUSR1 handler, so counters are collected on demand.
+    """
+    stats = {
+        "pid": os.getpid(),
+        "tcp_msgs": total_tcp_msgs,
+        "udp_msgs": total_udp_msgs,
+        "written_at": time.time(),
+    }
+    path = os.path.join(STATS_DIR, f"{os.getpid()}.json")
+    try:
+        os.makedirs(STATS_DIR, exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"Error writing stats {path}: {e}")
+
+def write_workers_file(workers):
+    """
+        Records the PIDs of the processes serving the ports, read by --stats.
+
+        Args:
+            workers: List of worker PIDs.
+    """
+    os.makedirs(STATS_DIR, exist_ok=True)
+    with open(WORKERS_FILE, "w", encoding="utf-8") as f:
+        json.dump({"parent": os.getpid(), "workers": workers}, f)
+
+def collect_stats():
+    """
+        Asks every worker of the running server for its counters (SIGUSR1) and
+        aggregates them.
+
+        :return: Dict with the totals and the counters of each worker.
+    """
+    try:
+        with open(WORKERS_FILE, "r", encoding="utf-8") as f:
+            workers = json.load(f)["workers"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return {"error": "server.py is not running (no log/stats/server.json)"}
+
+    requested_at = time.time()
+    alive = []
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGUSR1)
+            alive.append(pid)
+        except ProcessLookupError:
+            pass
+
+    per_worker = {}
+    deadline = time.monotonic() + STATS_TIMEOUT
+    while len(per_worker) < len(alive) and time.monotonic() < deadline:
+        for pid in alive:
+            if pid in per_worker:
+                continue
+            try:
+                with open(os.path.join(STATS_DIR, f"{pid}.json"), "r", encoding="utf-8") as f:
+                    stats = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            if stats.get("written_at", 0) >= requested_at:
+                per_worker[pid] = stats
+        time.sleep(0.05)
+
+    tcp_msgs = sum(stats["tcp_msgs"] for stats in per_worker.values())
+    udp_msgs = sum(stats["udp_msgs"] for stats in per_worker.values())
+    return {
+        "workers": len(alive),
+        "answered": len(per_worker),
+        "tcp_msgs": tcp_msgs,
+        "udp_msgs": udp_msgs,
+        "total_msgs": tcp_msgs + udp_msgs,
+        "per_worker": list(per_worker.values()),
+    }
+
+def metrics_gauges():
+    """
+        Returns the process-wide values added to the metrics snapshot: the
+        drop counters of the SYN monitor, when it runs in this process.
+    """
+    stats = syn_monitor_stats()
+    if not stats:
+        return {}
+    return {
+        "syn_monitor_kernel_drops": ("SYNs the kernel could not queue to the capture socket.", stats["kernel_drops"]),
+        "syn_monitor_queue_drops": ("SYN log entries dropped because the writer fell behind.", stats["queue_drops"]),
+    }
+
+def start_metrics_writer(path=METRICS_PATH):
+    """
+        Writes this process' metrics to `path` every few seconds, when they change.
+    """
+    metrics.start_writer(
+        path,
+        lambda: server_metrics.render(metrics_gauges()),
+        lambda: (server_metrics.version, syn_monitor_stats()),
+    )
+
+def start_merged_metrics_writer(workers):
+    """
+        Writes METRICS_PATH in the parent of --workers: the snapshots of every
+        worker (log/stats/<pid>.prom) added up with the parent's own (SYN monitor).
+
+        Args:
+            workers: The list of worker PIDs, kept up to date by run_workers.
+    """
+    def worker_paths():
+        return [os.path.join(STATS_DIR, f"{pid}.prom") for pid in list(workers)]
+
+    def render():
+        texts = [server_metrics.render(metrics_gauges())]
+        for path in worker_paths():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    texts.append(f.read())
+            except OSError:
+                pass
+        return metrics.merge_snapshots(texts)
+
+    def changed():
+        mtimes = []
+        for path in worker_paths():
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return server_metrics.version, syn_monitor_stats(), mtimes
+
+    metrics.start_writer(METRICS_PATH, render, changed)
+
+def serve(host, ports, backlog, metrics_path=METRICS_PATH):
+    """
+        Opens the ports and serves them in this process until interrupted.
+
+        Args:
+            host: Host;
+            ports: List of (port, protocol) tuples;
+            backlog: Listen backlog of each TCP port;
+            metrics_path: Where this process writes its metrics snapshot.
+    """
+    signal.signal(signal.SIGUSR1, write_worker_stats)
+    start_metrics_writer(metrics_path)
+    server = EventLoopServer(backlog=backlog)
+    opened = sum(server.open_port(host, protocol, port) for port, protocol in ports)
+    print(f"[{os.getpid()}] {opened}/{len(ports)} ports open.")
+    server.serve_forever()
+
+def _reset_after_fork():
+    """
+        Runs in every worker right after the fork. The parent may already run
+        the SYN monitor and the metrics writer, whose threads are not copied to
+        the child: their state (and the lock of server_metrics, which one of
+        them may have held) is dropped here, so the worker starts from empty
+        counters and the parent's SYNs are not counted twice in the merged
+        snapshot.
+    """
+    global server_metrics, total_tcp_msgs, total_udp_msgs
+    global _syn_capture, _syn_writer, _arrival_capture, _arrival_writer
+    server_metrics = metrics.ServerMetrics()
+    total_tcp_msgs = 0
+    total_udp_msgs = 0
+    for packet_capture in (_syn_capture, _arrival_capture):
+        if packet_capture is not None:
+            packet_capture.close()
+    _syn_capture = _syn_writer = None
+    _arrival_capture = _arrival_writer = None
+
+def start_worker(host, ports, backlog):
+    """
+        Forks a worker process that serves the ports (SO_REUSEPORT lets every
+        worker bind them; the kernel spreads connections and datagrams).
+
+        :return: PID of the worker.
+    """
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            serve(host, ports, backlog, os.path.join(STATS_DIR, f"{os.getpid()}.prom"))
+        finally:
+            os._exit(0)
+    return pid
+
+def run_workers(count, host, ports, backlog):
+    """
+        Runs `count` worker processes and restarts the ones that die. Restarted
+        workers are forked while the SYN monitor and metrics threads of this
+        process are running; _reset_after_fork drops the state those threads
+        share in every worker, so each one starts from empty counters.
+
+        Args:
+            count: Number of workers;
+            host: Host;
+            ports: List of (port, protocol) tuples;
+            backlog: Listen backlog of each TCP port.
+    """
+    os.register_at_fork(after_in_child=_reset_after_fork)
+    workers = [start_worker(host, ports, backlog) for _ in range(count)]
+    write_workers_file(workers)
+    start_monitors()
+    start_merged_metrics_writer(workers)
+
+    def stop_workers(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    try:
+        while True:
+            pid, status = os.wait()
+            if pid in workers:
+                print(f"Worker {pid} exited (status {status}); starting a new one.")
+                workers[workers.index(pid)] = start_worker(host, ports, backlog)
+                write_workers_file(workers)
+    except KeyboardInterrupt:
+        print("\nProgram terminated with Ctrl+C.")
+        stop_workers(None, None)
+
+def start_monitors():
+    """
+        Starts the SYN monitor (logs SYN attempts to log/syn_log.jsonl).
+    """
+    try:
+        _start_syn_monitor()
+    except Exception as e:
+        print(f"[SYN-MONITOR] failed to start: {e}")
+
+def _is_complete_json(data):
+    """
+        Checks whether the bytes received so far form a whole JSON object.
+    """
+    try:
+        json.loads(data.decode('utf-8'))
+        return True
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return False
+
+def raise_open_files_limit():
+    """
+        Raises the soft limit of open files to the hard limit, as each port and
+        each connection in progress uses a file descriptor.
+    """
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError) as e:
+        print(f"Could not raise the open files limit: {e}")
 
 def main():
     """
         Main method.
     """
-    global server_name, server_ips
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Firewall Tester server")
+    parser.add_argument("--arrival-mode", choices=["listeners", "capture"], default="listeners",
+                        help="listeners: open the ports in conf/ports.conf; "
+                             "capture: record packets to any port without listening")
+    parser.add_argument("--backlog", type=int, default=1024,
+                        help="Pending connections queue of each TCP port (default: 1024)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Print every probe received (slows the server down under load)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Server processes sharing every port through SO_REUSEPORT (default: 1)")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print the aggregated counters of the running server and exit")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(collect_stats(), indent=4))
+        return
+
+    global server_name, server_ips, verbose
+    verbose = args.verbose
     server_name = socket.getfqdn() # dont remove, not used in main method, but is used is another methods.
     print(socket.getfqdn())
     server_ips = get_ips() # dont remove, not used in main method, but is used is another methods.
-    # start tcpdump-based SYN monitor (logs SYN attempts to log/syn_log.json)
-    try:
-        _start_tcpdump_monitor()
-    except Exception as e:
-        print(f"[SYN-MONITOR] failed to start: {e}")
+    if args.arrival_mode == "capture":
+        start_monitors()
+        if _start_arrival_capture():
+            signal.signal(signal.SIGUSR1, write_worker_stats)
+            write_workers_file([os.getpid()])
+            start_metrics_writer()
+            wait_forever()
+            return
+
     host = '0.0.0.0'  # Server IP address (localhost)
-    #ports = [5000, 5001]  # Ports for the server
-    threads = []
     ports_file = "conf/ports.conf"
     tuples = read_ports_from_file(ports_file)
-    tuples = list(set(tuples)) # removing duplicates
+    tuples = sorted(set(tuples or [])) # removing duplicates
     print(f"Starting servers with ports present in file: {ports_file} - This file must contain lines with port/protocol, example 80/tcp.")
+
+    raise_open_files_limit()
+    supported = []
     if tuples:
         print("Tuples read from file:")
+        supported = [(port, protocol) for port, protocol in tuples if protocol in ("tcp", "udp")]
         for port, protocol in tuples:
-            if protocol == "tcp" or protocol == "udp":
-                print(f"Starting {port}/{protocol}")
-                kill_pid_by_port(protocol, port)
-                thread = threading.Thread(target=start_server, args=(host, protocol, port), daemon=True)
-                threads.append(thread)
-                thread.start()
-            else:
+            if (port, protocol) not in supported:
                 print(f"Protocol not supported: {protocol}")
+        kill_processes_on_ports(supported)
     else:
         print(f"Could not read ports and protocols from file {ports_file}.")
 
-    time.sleep(3)
+    print("\nIf needed, press Ctrl+C to terminate the program.")
+    if args.workers > 1:
+        run_workers(args.workers, host, supported, args.backlog)
+        return
+
+    write_workers_file([os.getpid()])
+    if args.arrival_mode != "capture":
+        start_monitors()
+    try:
+        serve(host, supported, args.backlog)
+    except KeyboardInterrupt:
+        print("\nProgram terminated with Ctrl+C.")
+        show_total_msgs()
+
+def wait_forever():
+    """
+        Keeps the main program running until Ctrl+C.
+    """
     print("\nIf needed, press Ctrl+C to terminate the program.")
     try:
         while True:
@@ -0,0 +1,91 @@
+"""
+This module defines the TestExecutor class, which runs independent firewall
+tests concurrently while respecting a global limit and a per-source-container
+limit.
+"""
+
+import collections
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class TestExecutor:
+    """Bounded concurrent scheduler for test jobs.
+
+    Jobs are ``(source, payload)`` tuples. At most ``max_workers`` jobs run at
+    the same time, and at most ``max_per_source`` of them share the same
+    ``source`` (usually the source container ID), so a single container is
+    never flooded with ``docker exec`` calls.
+    """
+    def __init__(self, max_workers=8, max_per_source=4):
+        self.max_workers = max(1, int(max_workers))
+        self.max_per_source = max(1, int(max_per_source))
+
+    def run(self, jobs, run_job, on_result, is_cancelled=lambda: False):
+        """
+        Runs all jobs and reports each result as soon as it is available.
+
+        Args:
+            jobs (list): A list of (source, payload) tuples.
+            run_job (callable): Called as run_job(payload) in a pool thread;
+                its return value is the job result.
+            on_result (callable): Called as on_result(payload, result) in the
+                caller's thread, in completion order.
+            is_cancelled (callable): Polled between completions; once it
+                returns True no new job is started and pending results are
+                discarded.
+
+        Returns:
+            int: The number of results delivered to on_result.
+        """
+        pending = collections.deque(jobs)
+        in_flight = {}
+        active_per_source = collections.Counter()
+        delivered = 0
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="test-executor")
+        try:
+            while pending or in_flight:
+                if is_cancelled():
+                    break
+
+                self._fill(pool, pending, in_flight, active_per_source, run_job)
+                if not in_flight:
+                    break
+
+                done, _ = wait(list(in_flight), timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source, payload = in_flight.pop(future)
+                    active_per_source[source] -= 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error TestExecutor: {e}", file=sys.stderr)
+                        sys.stderr.flush()
+                        result = None
+
+                    if is_cancelled():
+                        continue
+                    on_result(payload, result)
+                    delivered += 1
+        finally:
+            # On cancellation, running subprocesses cannot be interrupted, but
+            # nothing new is started and the caller is released immediately.
+            pool.shutdown(wait=not is_cancelled(), cancel_futures=True)
+
+        return delivered
+
+    def _fill(self, pool, pending, in_flight, active_per_source, run_job):
+        """Submits pending jobs while there is room globally and per source."""
+        skipped = 0
+        while pending and len(in_flight) < self.max_workers and skipped < len(pending):
+            source, payload = pending[0]
+            if active_per_source[source] >= self.max_per_source:
+                pending.rotate(-1)
+                skipped += 1
+                continue
+
+            pending.popleft()
+            skipped = 0
+            active_per_source[source] += 1
+            in_flight[pool.submit(run_job, payload)] = (source, payload)
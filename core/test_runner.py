@@ -3,67 +3,200 @@ This module defines the TestRunner class, which is responsible for
 executing individual firewall tests and analyzing their results.
 """
 
+import functools
 import json
 import re
 import subprocess
 import sys
+import threading
 from . import containers
 import time
 import random
+from .agent_pool import AgentPool, AgentUnavailableError
+from .arrivals import ArrivalMonitor, packet_entry_matches, syn_entry_matches
+from . import calibration
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from .docker_backend import get_backend
+from .jsonl_log import JsonlCursor
+from .timeline import PhaseTimer, distribution
+from .port_inventory import PortInventory
+
+# Directory of server.py inside the containers; its logs are relative to it.
+SERVER_WORKDIR = "/firewallTester/src"
+
+# Outcomes reported at once by the client (TCP RST, ICMP unreachable).
+FAST_FAIL_MESSAGES = {
+    "rejected-by-firewall": "Rejected by firewall",
+    "no-listener": "No listener on destination port",
+    "unreachable": "Destination unreachable",
+}
+
+# Flood test types: many TCP connections or UDP datagrams at a target rate
+# (see client.run_flood), judged against the thresholds in TestRunner.flood.
+FLOOD_PROTOCOLS = {"tcp-flood": "tcp", "udp-flood": "udp"}
+FLOOD_DEFAULTS = {
+    "count": 100,               # probes sent by a flood test
+    "rate": 50,                 # target probes per second (0: as fast as possible)
+    "max_loss_percent": 1.0,    # pass thresholds of an allowed flood
+    "max_p99_ms": 250.0,
+    "min_rate_percent": 90.0,   # achieved rate, as a percentage of the target
+}
+FLOOD_IN_FLIGHT = 256  # probes of a flood in flight at once (client.MAX_FLOOD_IN_FLIGHT)
 
 class TestRunner:
     """Orchestrates the execution of tests and interpretation of outcomes."""
+    def __init__(self, use_agent=True, backend=None, port_inventory=None, arrival_mode="listeners",
+                 adaptive_timeouts=True, payload_size=0, flood=None, rtt_samples=1):
+        self.backend = backend or get_backend("cli")
+        self.port_inventory = port_inventory or PortInventory(self.backend)
+        # In 'capture' mode server.py records packets to any port, so there is
+        # no listener to check before a test and an arrival counts as reaching it.
+        self.arrival_mode = arrival_mode
+        # Timeouts derived from the RTT of each (source, destination IP) pair,
+        # measured by begin_run; pairs missing here use the fixed defaults.
+        self.adaptive_timeouts = adaptive_timeouts
+        self._timeouts = {}
+        # One-way delays of the run, {(container_id_src, dst_ip): {"forward": [ms], "return": [ms]}}.
+        self._one_way = {}
+        self._one_way_lock = threading.Lock()
+        # Bytes of payload sent with each TCP/UDP probe, besides its metadata.
+        self.payload_size = payload_size
+        # RTT samples taken by each probe: probe/response exchanges over the
+        # same TCP connection or UDP socket, echo requests for ICMP.
+        self.rtt_samples = max(1, int(rtt_samples))
+        # Size, rate and pass thresholds of the flood tests (see FLOOD_DEFAULTS).
+        self.flood = dict(FLOOD_DEFAULTS, **(flood or {}))
+        # Long-lived probe agents, one per source container; None disables them
+        # and every probe goes through docker exec client.py.
+        self.agent_pool = AgentPool(self.backend) if use_agent else None
+        # Arrival events pushed by server.py, followed once per run.
+        self.arrivals = ArrivalMonitor(self.backend)
+        # Runs the docker exec fallback of client.py, so its result can race
+        # the destination's confirmation like an agent request does.
+        self._client_threads = ThreadPoolExecutor(max_workers=64, thread_name_prefix="client-exec")
+        # Read position of each polled log, keyed by (container_id, log_path).
+        self._log_cursors = {}
+        self._log_cursors_lock = threading.Lock()
+
+    def start_agent(self, container_id):
+        """Starts the probe agent of a container ahead of the first test."""
+        if self.agent_pool is None:
+            return
+        try:
+            self.agent_pool.start(container_id)
+        except AgentUnavailableError as e:
+            print(f"Probe agent unavailable in {container_id}: {e}", file=sys.stderr)
+
+    def begin_run(self, destination_container_ids, host_pairs=None):
+        """
+        Subscribes to the arrival events of the destinations of a run, so the
+        server's confirmation reaches the runner as soon as it is logged, and
+        calibrates the timeouts of each host pair.
+
+        Args:
+            destination_container_ids (iterable): IDs of the destination containers.
+            host_pairs (dict, optional): {(container_id_src, dst_ip): tcp_port or None} pairs
+                to calibrate; tcp_port is the port used for the RTT handshakes (None: ICMP echo).
+        """
+        for container_id in set(destination_container_ids):
+            if container_id and not self.arrivals.subscribe(container_id):
+                print(f"Arrival events unavailable in {container_id}; polling its server log.", file=sys.stderr)
+        if self.adaptive_timeouts and host_pairs:
+            self.calibrate(host_pairs)
+
+    def calibrate(self, host_pairs):
+        """
+        Measures the RTT of each host pair (TCP handshakes, or ICMP echo for a
+        pair without a TCP port, from the source container, in parallel) and
+        derives the pair's timeouts from it.
+
+        Args:
+            host_pairs (dict): {(container_id_src, dst_ip): tcp_port or None}.
+        """
+        def measure(pair):
+            (container_id_src, dst_ip), port = pair
+            try:
+                return pair[0], self._measure_rtt(container_id_src, dst_ip, port)
+            except Exception as e:
+                print(f"RTT calibration failed for {container_id_src} -> {dst_ip}: {e}", file=sys.stderr)
+                return pair[0], []
+
+        with ThreadPoolExecutor(max_workers=min(16, len(host_pairs))) as pool:
+            for key, rtts_ms in pool.map(measure, host_pairs.items()):
+                self._timeouts[key] = calibration.derive_timeouts(rtts_ms)
+
+    def _measure_rtt(self, container_id_src, dst_ip, port):
+        """Runs the RTT handshakes of one pair inside the source container."""
+        samples, timeout = calibration.CALIBRATION_SAMPLES, calibration.CALIBRATION_TIMEOUT
+        deadline = samples * timeout + calibration.EXEC_MARGIN
+        if self.agent_pool is not None:
+            request = {"op": "rtt", "server_host": dst_ip, "samples": samples, "timeout": timeout}
+            if port is not None:
+                request["server_port"] = int(port)
+            try:
+                return self.agent_pool.submit(container_id_src, request).result(timeout=deadline)["rtts_ms"]
+            except AgentUnavailableError:
+                pass
+
+        target = ["icmp"] if port is None else ["tcp", str(port)]
+        command = ["python3", "/firewallTester/src/client.py", dst_ip, *target,
+                   "--rtt", str(samples), "--timeout", str(timeout)]
+        result = self.backend.exec(container_id_src, command, timeout=deadline)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, command, stderr=result.stderr)
+        return json.loads(result.stdout)["rtts_ms"]
+
+    def timeouts_for(self, container_id_src, dst_ip):
+        """
+        Returns the timeouts of a host pair: calibrated if begin_run measured
+        it, the fixed defaults otherwise.
+        """
+        return dict(self._timeouts.get((container_id_src, dst_ip)) or calibration.default_timeouts())
+
+    def end_run(self):
+        """Closes the arrival subscriptions opened by begin_run and forgets the
+        log entries read (the read offsets are kept) and timeouts of the run."""
+        self.arrivals.close()
+        self._timeouts = {}
+        with self._one_way_lock:
+            self._one_way = {}
+        with self._log_cursors_lock:
+            cursors = list(self._log_cursors.values())
+        for cursor in cursors:
+            with cursor.lock:
+                cursor.entries = []
+
+    def close(self):
+        """Stops the probe agents and arrival subscriptions of this runner."""
+        self.end_run()
+        if self.agent_pool is not None:
+            self.agent_pool.close()
+        self._client_threads.shutdown(wait=False)
+
     def _list_open_ports(self, port:str, protocol: str, container_id: str) -> bool:
         """
         Checks if there is a open port on container, checking port and protocol.
 
+        The answer comes from the listening-socket snapshot of the container,
+        so every test of a run shares one 'ss' call per destination.
+
         Args:
             port (str): The port to be tested.
             protocol (str): The protocol to use (TCP, UDP).
-            container_id (str): The ID of the source container.
+            container_id (str): The ID of the destination container.
 
         Returns:
             boolean: Returns true if there is a port open on container, otherwise, returns false
         """
-
-        # filter tcp: ss -tln | grep <port>
-        # filter upd: ss -uln | grep <port>
-
-        if protocol.lower() == "tcp":
-            flag = "-tln"
-        else:
-            flag = "-uln"
-
-        check_port_command = f"ss {flag} | grep {port}"
-
-        docker_command = [
-            "docker", "exec", container_id,
-            "sh", "-c", check_port_command
-        ]
-
-        try:
-            result = subprocess.run(docker_command, capture_output=True, text=True, encoding='utf-8', timeout=10)
-            
-            if result.returncode != 0 or (not result.stdout):
-                return False
-            
-            return True
-
-        except Exception as e:
-            error_msg = str(e)
-            if hasattr(e, 'stderr') and e.stderr:
-                error_msg = e.stderr.strip()
-            
-            print(f"Error TestRunner: {error_msg}", file=sys.stderr)
-            sys.stderr.flush()
-            error_result = {"status": "1", "status_msg": f"Execution Error: {error_msg}"}
-            return False, error_result
+        return self.port_inventory.is_open(container_id, protocol, port)
 
     def _server_log_confirms_packet(self, log_path, test_id, protocol, server_ip=None, server_port=None):
         """Checks whether the server log contains an entry for the packet.
 
+        Only the lines appended since the previous check of the same file are read.
+
         Args:
-            log_path (str): The path to the server log file.
+            log_path (str): The path to the server log file (JSON Lines).
             test_id (str): The unique identifier of the test.
             protocol (str): The protocol to check (TCP, UDP).
             server_ip (str, optional): The server IP address to filter by. Defaults to None.
@@ -72,25 +205,60 @@ class TestRunner:
         Returns:
             bool: True if the packet entry is found in the log with matching criteria, False otherwise.
         """
-        try:
-            with open(log_path, "r", encoding="utf-8") as handle:
-                log_data = json.load(handle)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return False
-
-        for entry in log_data.get("received", []):
-            if str(entry.get("id", "")) != str(test_id):
-                continue
-            if str(entry.get("protocol", "")).upper() != str(protocol).upper():
-                continue
-            if server_ip and str(entry.get("server_ip", "")) and str(entry.get("server_ip")) != str(server_ip):
-                continue
-            if server_port is not None and entry.get("server_port") is not None and int(entry.get("server_port")) != int(server_port):
-                continue
-            return bool(entry.get("packet_arrived", True))
+        cursor = self._log_cursor(None, log_path)
+        with cursor.lock:
+            cursor.read_local(log_path)
+            for entry in cursor.entries:
+                if packet_entry_matches(entry, test_id, protocol, server_ip, server_port):
+                    return bool(entry.get("packet_arrived", True))
 
         return False
 
+    def _log_cursor(self, container_id, log_path):
+        """Returns the read cursor of a log file (container_id None for local files)."""
+        with self._log_cursors_lock:
+            return self._log_cursors.setdefault((container_id, log_path), JsonlCursor())
+
+    def _container_log_entries(self, container_id, log_path):
+        """
+        Reads the lines appended to a container's JSON Lines log since the
+        previous read and returns every entry seen in this run.
+
+        Args:
+            container_id (str): The ID of the container.
+            log_path (str): The log path, relative to the server directory.
+
+        Returns:
+            list: The log entries.
+        """
+        cursor = self._log_cursor(container_id, log_path)
+        with cursor.lock:
+            result = self.backend.exec(
+                container_id, ["sh", "-c", f"stat -c %i {log_path} 2>/dev/null && tail -c +{cursor.offset + 1} {log_path}"],
+                timeout=10, workdir=SERVER_WORKDIR
+            )
+            if result.returncode != 0 or not result.stdout:
+                return list(cursor.entries)
+
+            inode, _, data = result.stdout.partition("\n")
+            previous_offset = cursor.offset
+            if cursor.rotated(inode.strip()):
+                # Finish the rotated file, then read the new one from the start.
+                rotated = self.backend.exec(
+                    container_id, ["sh", "-c", f"tail -c +{previous_offset + 1} {log_path}.1 2>/dev/null"],
+                    timeout=10, workdir=SERVER_WORKDIR
+                )
+                cursor.offset = previous_offset
+                cursor.feed(rotated.stdout.encode("utf-8"))
+                cursor.offset = 0
+                result = self.backend.exec(
+                    container_id, ["sh", "-c", f"cat {log_path} 2>/dev/null"], timeout=10, workdir=SERVER_WORKDIR
+                )
+                data = result.stdout
+
+            cursor.feed(data.encode("utf-8"))
+            return list(cursor.entries)
+
     def _server_log_confirms_packet_in_container(
             self,
             container_id,
@@ -104,6 +272,9 @@ class TestRunner:
             wait_seconds=1
         ):
         """Reads the server log from a container and checks whether the packet arrived.
+
+        Only the lines appended since the previous read of each log are transferred.
+
         Args:
             container_id (str): The ID of the destination container to query.
             timestamp_teste (str): The timestamp directory containing the server log.
@@ -121,56 +292,18 @@ class TestRunner:
                 - str: A descriptive message explaining the result (e.g., "Received by the server",
                         "TCP SYN received on server", or empty string if packet not found).
         """
-        log_path = f"log/{timestamp_teste}/server_log.json"
+        log_path = f"log/{timestamp_teste}/server_log.jsonl"
         deadline = time.monotonic() + wait_seconds
 
         while time.monotonic() < deadline:
-            docker_command = ["docker", "exec", container_id, "sh", "-c", f"cat {log_path} 2>/dev/null || true"]
-            try:
-                result = subprocess.run(docker_command, capture_output=True, text=True, encoding="utf-8", timeout=10)
-            except Exception:
-                result = None
-
-            if result and result.returncode == 0 and result.stdout.strip():
-                try:
-                    log_data = json.loads(result.stdout)
-                except json.JSONDecodeError:
-                    log_data = {"received": []}
-
-                for entry in log_data.get("received", []):
-                    if str(entry.get("id", "")) != str(test_id):
-                        continue
-                    if str(entry.get("protocol", "")).upper() != str(protocol).upper():
-                        continue
-                    if server_ip and str(entry.get("server_ip", "")) and str(entry.get("server_ip")) != str(server_ip):
-                        continue
-                    if server_port is not None and entry.get("server_port") is not None and int(entry.get("server_port")) != int(server_port):
-                        continue
+            for entry in self._container_log_entries(container_id, log_path):
+                if packet_entry_matches(entry, test_id, protocol, server_ip, server_port):
                     return (True, "Received by the server")
 
             time.sleep(0.2)
         if protocol.lower() == 'tcp':
-            path_syn_check = f"log/syn_log.json"
-            docker_command_check_syn = ["docker", "exec", container_id, "sh", "-c", f"cat {path_syn_check} 2>/dev/null || true"]
-            try:
-                result = subprocess.run(docker_command_check_syn, capture_output=True, text=True, encoding="utf-8", timeout=10)
-            except Exception:
-                result = None
-
-            if result and result.returncode == 0 and result.stdout.strip():
-                try:
-                    log_syn_data = json.loads(result.stdout)
-                except json.JSONDecodeError:
-                    log_syn_data = {"received": []}
-                for entry in log_syn_data.get("received",[]):
-                    if server_port is not None and entry.get("server_port") is not None and int(entry.get("server_port")) != int(server_port):
-                        continue
-                    if client_ip is not None and entry.get("client_ip") is not None and str(entry.get("client_ip") )!= str(client_ip):
-                        continue
-                    if server_ip and entry.get("server_ip", "") and str(entry.get("server_ip")) != str(server_ip):
-                        continue
-                    if client_port is not None and str(entry.get("client_port")) is not None and str(entry.get("client_port")) != str(client_port):
-                        continue
+            for entry in self._container_log_entries(container_id, "log/syn_log.jsonl"):
+                if syn_entry_matches(entry, server_ip, server_port, client_ip, client_port):
                     return (True, "TCP SYN recieved on server")
         
         return (False, "") # Packet did not reach destination according to server logs
@@ -182,7 +315,7 @@ class TestRunner:
         Args:
             container_id_src (str): The ID of the source container.
             dst_ip (str): The destination IP address or hostname.
-            protocol (str): The protocol to use (TCP, UDP, ICMP).
+            protocol (str): The protocol to use (TCP, UDP, ICMP, TCP-FLOOD, UDP-FLOOD).
             dst_port (str): The destination port.
             container_id_dest: The ID of the destination container
 
@@ -190,73 +323,472 @@ class TestRunner:
             tuple: A tuple containing a boolean for success and a dictionary
                     with the test result.
         """
+        timer = PhaseTimer()
+        probe, error_result = self._prepare_test(container_id_src, dst_ip, protocol, dst_port, container_id_dest)
+        timer.mark("precheck")
+        if error_result is not None:
+            error_result["timing"] = timer.as_dict()
+            return False, error_result
+
+        try:
+            # The destination's confirmation is awaited from the moment the probe
+            # is sent; a flood is not raced, its first packet arrives long before the end.
+            arrival = None if "flood" in probe else self.arrivals.watch(
+                probe["container_id_dest"], probe["test_id"], probe["protocol"],
+                probe["dst_ip"], int(probe["dst_port"])
+            )
+            probe["sent_at"] = time.monotonic()
+            client = self._submit_client(probe)
+            result_dict = self._race_confirmation(probe, client, arrival)
+            self._mark_client(timer, result_dict)
+            result_dict = self._finish_test(probe, result_dict)
+            timer.mark("confirm")
+            result_dict["timing"] = timer.as_dict()
+            return True, result_dict
+
+        except Exception as e:
+            error_result = self._execution_error(e)
+            timer.mark("client")
+            error_result["timing"] = timer.as_dict()
+            return False, error_result
+
+    @staticmethod
+    def _mark_client(timer, result_dict):
+        """
+        Ends the client phase of a test and splits it with the client's own
+        timing: 'startup' (interpreter start-up, docker exec only) and
+        'network' (the probe itself); what remains is 'exec', the cost of
+        reaching the container (docker exec or agent round trip).
+        """
+        timer.mark("exec")
+        client_timing = result_dict.get("client_timing") or {}
+        timer.split("exec", {"startup": client_timing.get("startup_ms"), "network": client_timing.get("probe_ms")})
+
+    def run_batch_tests(self, container_id_src, tests, concurrency=16):
+        """
+        Runs several tests from the same source container with a single
+        docker exec of client.py in batch mode.
+
+        Args:
+            container_id_src (str): The ID of the source container.
+            tests (list): A list of (key, dst_ip, protocol, dst_port, container_id_dest)
+                tuples; key is any value used by the caller to identify the test.
+            concurrency (int): Maximum number of probes running at the same time
+                inside the container.
+
+        Yields:
+            tuple: (key, success, result_dict) for each test, in completion order.
+        """
+        probes = {}
+        for key, dst_ip, protocol, dst_port, container_id_dest in tests:
+            timer = PhaseTimer()
+            probe, error_result = self._prepare_test(container_id_src, dst_ip, protocol, dst_port, container_id_dest)
+            timer.mark("precheck")
+            if error_result is not None:
+                error_result["timing"] = timer.as_dict()
+                yield key, False, error_result
+                continue
+            probe["key"] = key
+            probe["timer"] = timer
+            probes[probe["test_id"]] = probe
+
+        if not probes:
+            return
+
+        command = ["python3", "/firewallTester/src/client.py", "--batch", "--concurrency", str(concurrency)]
+        requests = "".join(
+            json.dumps({
+                "request_id": test_id,
+                "server_host": probe["dst_ip"],
+                "protocol": probe["protocol"],
+                "server_port": int(probe["dst_port"]),
+                "test_id": test_id,
+                "timestamp": probe["timestamp_teste"],
+                "timeout": probe["timeouts"]["probe_timeout_s"],
+                "payload_size": self.payload_size,
+                "count": self.rtt_samples,
+                "exchanges": self.rtt_samples,
+                **({"flood": probe["flood"]} if "flood" in probe else {}),
+            }) + "\n"
+            for test_id, probe in probes.items()
+        )
+
+        try:
+            proc = self.backend.exec_interactive(container_id_src, command)
+        except Exception as e:
+            for probe in probes.values():
+                yield probe["key"], False, self._execution_error(e)
+            return
+
+        def write_requests():
+            try:
+                proc.stdin.write(requests)
+                proc.stdin.flush()
+                proc.stdin.close()
+            except (OSError, ValueError):
+                pass
+        # Written from another thread so a full stdout pipe can never block the writer.
+        threading.Thread(target=write_requests, daemon=True).start()
+
+        # The caller may stop reading early (a cancelled run): the client is
+        # then killed and reaped when this generator is closed.
+        try:
+            for raw in proc.stdout:
+                try:
+                    response = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                probe = probes.pop(str(response.get("request_id")), None)
+                if probe is None:
+                    continue
+                if "error" in response:
+                    yield probe["key"], False, self._execution_error(RuntimeError(response["error"]))
+                    continue
+                try:
+                    result_dict = response.get("result", {})
+                    self._mark_client(probe["timer"], result_dict)
+                    result_dict = self._finish_test(probe, result_dict)
+                    probe["timer"].mark("confirm")
+                    result_dict["timing"] = probe["timer"].as_dict()
+                    yield probe["key"], True, result_dict
+                except Exception as e:
+                    yield probe["key"], False, self._execution_error(e)
+        finally:
+            proc.kill()
+            proc.wait()
+
+        error = f"No result from batch client (exit code {proc.returncode})."
+        for probe in probes.values():
+            yield probe["key"], False, self._execution_error(RuntimeError(error))
+
+    def _prepare_test(self, container_id_src, dst_ip, protocol, dst_port, container_id_dest):
+        """
+        Validates a test and checks the destination port before the probe is sent.
+
+        Returns:
+            tuple: (probe, None) with the parameters of the probe, or
+                    (None, error_result) if the test must not be sent.
+        """
         processed_dst_ip = self._extract_destination_host(dst_ip)
         if not processed_dst_ip:
             error_result = {"status": "1", "status_msg": f"Invalid destination: {dst_ip}"}
             print(f"Invalid destiny: {dst_ip}", file=sys.stderr)
             sys.stderr.flush()
-            return False, error_result
+            return None, error_result
 
-        if(protocol.lower() != 'icmp'):
+        flood = protocol.lower() in FLOOD_PROTOCOLS
+        protocol = FLOOD_PROTOCOLS.get(protocol.lower(), protocol)
+        if protocol.lower() != 'icmp' and self.arrival_mode != "capture":
             is_port_open = self._list_open_ports(dst_port,protocol, container_id_dest)
             if not is_port_open:
                 result_dict_warn = {
                     "status": "portNotOpen",
                     "status_msg": "port is not open on destination container"
                 }
-                return False, result_dict_warn
+                return None, result_dict_warn
+
+        probe = {
+            "container_id_src": container_id_src,
+            "container_id_dest": container_id_dest,
+            "dst_ip": processed_dst_ip,
+            "protocol": protocol.lower(),
+            "dst_port": dst_port,
+            "test_id": str(random.randint(10000, 999999)),
+            "timestamp_teste": "2025",
+            # A flood keeps the default timeouts: its probes queue behind each
+            # other, so an RTT-derived timeout would count them as lost.
+            "timeouts": (calibration.default_timeouts() if flood
+                         else self.timeouts_for(container_id_src, processed_dst_ip)),
+        }
+        if flood:
+            probe["flood"] = {"count": int(self.flood["count"]), "rate": self.flood["rate"]}
+        return probe, None
+
+    @staticmethod
+    def _client_deadline(probe):
+        """Returns the seconds the client of a probe may take: its timeout plus
+        the docker exec margin and, for a flood, the time to send it."""
+        timeout = probe["timeouts"]["probe_timeout_s"]
+        deadline = timeout + calibration.EXEC_MARGIN
+        if "flood" in probe:
+            count, rate = probe["flood"]["count"], probe["flood"]["rate"]
+            deadline += (count / rate if rate else 0.0) + timeout * (count // FLOOD_IN_FLIGHT)
+        return deadline
+
+    def _finish_test(self, probe, result_dict):
+        """
+        Completes the client result with the destination's point of view when
+        the client got no response.
+
+        A probe that failed fast (TCP RST, ICMP unreachable) already tells what
+        happened, so the destination's logs are not waited for.
+
+        Returns:
+            dict: The test result.
+        """
+        outcome = result_dict.get("outcome")
+        if outcome == "refused":
+            outcome = result_dict["outcome"] = self._classify_refusal(probe)
+            result_dict["status_msg"] = f"{FAST_FAIL_MESSAGES[outcome]} ({result_dict.get('status_msg', '')})"
+        # In capture mode nothing listens, so a refusal is only a rejection if
+        # the SYN never reached the destination: that still needs the logs.
+        fast_fail = outcome in FAST_FAIL_MESSAGES and not (
+            self.arrival_mode == "capture" and outcome == "no-listener")
+
+        wait_seconds = probe["timeouts"]["arrival_wait_s"]
+        if fast_fail:
+            result_dict["packet_arrived"] = outcome == "no-listener"
+        elif result_dict.get("confirmed_early"):
+            pass  # the destination's confirmation decided the test (see _race_confirmation)
+        elif(not result_dict.get("server_response")):
+            if self.arrivals.is_subscribed(probe["container_id_dest"]):
+                confirm = self.arrivals.wait_for_arrival
+                if "sent_at" in probe:
+                    # Followed since the probe was sent: only the part of the
+                    # arrival wait the client's own timeout did not cover is left.
+                    wait_seconds = max(0.0, probe["sent_at"] + wait_seconds - time.monotonic())
+            else:
+                confirm = functools.partial(
+                    self._server_log_confirms_packet_in_container, timestamp_teste=probe["timestamp_teste"]
+                )
+            (packet_arrived, message) = confirm(
+            container_id=probe["container_id_dest"],
+            test_id=probe["test_id"],
+            protocol=probe["protocol"],
+            server_ip=probe["dst_ip"],
+            server_port=int(probe["dst_port"]),
+            client_ip=result_dict.get("client_ip", None),
+            client_port=result_dict.get("client_port", None),
+            wait_seconds=wait_seconds
+            )
+            result_dict["packet_arrived"] = packet_arrived
+
+            result_dict["status_msg"] = message
+            result_dict["message"] = message
+            if outcome == "no-listener" and not packet_arrived:
+                result_dict["outcome"] = "rejected-by-firewall"  # RST sent by a firewall
+
+        if self.arrival_mode == "capture":
+            result_dict["arrival_mode"] = "capture"
+        result_dict["timeouts"] = probe["timeouts"]
+        self._record_one_way(probe, result_dict)
+
+        return result_dict
+
+    def _record_one_way(self, probe, result_dict):
+        """
+        Derives the forward and return one-way delays of a probe from the
+        timestamps of its exchanges (client.py's clock_ns). The tester's
+        containers share the host's kernel, so client and server read the same
+        clock and need no synchronization; a negative delay means they do not.
+        """
+        clock_ns = result_dict.get("clock_ns")
+        if not clock_ns:
+            return
+        forward = [(server_received - client_sent) / 1e6 for client_sent, server_received, _, _ in clock_ns]
+        back = [(client_received - server_sent) / 1e6 for _, _, server_sent, client_received in clock_ns]
+        if min(forward + back) < 0:
+            result_dict["one_way"] = {"error": "client and server clocks differ (negative delay)"}
+            return
+
+        result_dict["one_way"] = {"forward_ms": distribution(forward), "return_ms": distribution(back)}
+        with self._one_way_lock:
+            samples = self._one_way.setdefault((probe["container_id_src"], probe["dst_ip"]),
+                                               {"forward": [], "return": []})
+            samples["forward"] += forward
+            samples["return"] += back
+
+    def one_way_summary(self):
+        """
+        Returns the one-way delay distributions of each host pair of the run,
+        e.g. to compare the forward path through a DNAT with the return path.
+
+        Returns:
+            dict: {(container_id_src, dst_ip): {"forward_ms": dict, "return_ms": dict}}
+                  (see timeline.distribution).
+        """
+        with self._one_way_lock:
+            return {
+                pair: {"forward_ms": distribution(samples["forward"]), "return_ms": distribution(samples["return"])}
+                for pair, samples in self._one_way.items()
+            }
+
+    def _classify_refusal(self, probe):
+        """
+        Tells apart the two sources of a refusal (TCP RST or ICMP port
+        unreachable coming from the destination address): a firewall REJECT
+        rule if the port is listening on the destination, otherwise the
+        destination's own kernel.
+
+        Returns:
+            str: 'rejected-by-firewall' or 'no-listener'.
+        """
+        if self.port_inventory.is_open(probe["container_id_dest"], probe["protocol"], probe["dst_port"]):
+            return "rejected-by-firewall"
+        return "no-listener"
+
+    def _execution_error(self, e):
+        """Builds the error result reported when a test could not be executed."""
+        error_msg = str(e)
+        if hasattr(e, 'stderr') and e.stderr:
+            error_msg = e.stderr.strip()
+        
+        print(f"Error TestRunner: {error_msg}", file=sys.stderr)
+        sys.stderr.flush()
+        return {"status": "1", "status_msg": f"Execution Error: {error_msg}"}
+
+    def _race_confirmation(self, probe, client, arrival):
+        """
+        Waits for the client's result while the destination's confirmation is
+        awaited in parallel.
+
+        If the destination logs the packet first, the client still gets until
+        its own deadline to report. When it reports that no reply came, the
+        arrival event decides the test (sent, no reply back) without waiting
+        for the destination's logs again; when it does not report by then, the
+        result is built from the arrival event alone. A client that times out
+        without an arrival event gets a timeout result, confirmed against the
+        destination's logs by _finish_test.
+
+        Args:
+            probe (dict): The probe, as returned by _prepare_test.
+            client (Future): The client's result (see _submit_client).
+            arrival (Future): The arrival event (see ArrivalMonitor.watch), or None.
+
+        Returns:
+            dict: The client's result, or one built from the arrival event.
+        """
+        started = time.monotonic()
+        deadline = self._client_deadline(probe)
+        if arrival is not None:
+            wait([client, arrival], timeout=deadline, return_when=FIRST_COMPLETED)
+            event = arrival.result() if arrival.done() else None
+            if event is not None:
+                try:
+                    result_dict = self._client_result(
+                        probe, client, max(0.0, started + deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    return self._unanswered_result(probe, event)
+                if not result_dict.get("server_response") and result_dict.get("outcome") == "timeout":
+                    self._confirm_from_event(result_dict, event)
+                return result_dict
+        try:
+            return self._client_result(probe, client, max(0.0, started + deadline - time.monotonic()))
+        except FutureTimeoutError:
+            return self._unanswered_result(probe)
+
+    @staticmethod
+    def _confirm_from_event(result_dict, event):
+        """Marks a client result without reply as received by the destination,
+        as told by its arrival event."""
+        message = "Received by the server"
+        for key in ("client_ip", "client_port"):
+            if result_dict.get(key) is None:
+                result_dict[key] = event.get(key)
+        result_dict.update({
+            "status_msg": message,
+            "message": message,
+            "packet_arrived": True,
+            "confirmed_early": True,
+        })
+
+    def _unanswered_result(self, probe, event=None):
+        """Builds the result of a probe whose reply did not reach the client in
+        time. With the destination's arrival event the packet is known to have
+        been received; without it, _finish_test looks the arrival up."""
+        result_dict = {
+            "id": probe["test_id"],
+            "timestamp_teste": probe["timestamp_teste"],
+            "client_ip": None,
+            "client_port": None,
+            "server_ip": probe["dst_ip"],
+            "server_port": int(probe["dst_port"]),
+            "protocol": probe["protocol"],
+            "server_response": False,
+            "status": "0",
+            "status_msg": "Firewall Drop or Network Error",
+            "outcome": "timeout",
+        }
+        if event is not None:
+            self._confirm_from_event(result_dict, event)
+        return result_dict
+
+    def _submit_client(self, probe):
+        """
+        Starts client.py for one probe, through the container's probe agent
+        when available and through a new docker exec otherwise.
 
-        test_id = str(random.randint(10000, 999999))
+        Args:
+            probe (dict): The probe, as returned by _prepare_test.
+
+        Returns:
+            Future: Resolves to the JSON result printed by client.py.
+        """
+        if self.agent_pool is not None:
+            request = {
+                "server_host": probe["dst_ip"],
+                "protocol": probe["protocol"],
+                "server_port": int(probe["dst_port"]),
+                "test_id": probe["test_id"],
+                "timestamp": probe["timestamp_teste"],
+                "timeout": probe["timeouts"]["probe_timeout_s"],
+                "payload_size": self.payload_size,
+                "count": self.rtt_samples,
+                "exchanges": self.rtt_samples,
+            }
+            if "flood" in probe:
+                request["flood"] = probe["flood"]
+            try:
+                return self.agent_pool.submit(probe["container_id_src"], request)
+            except AgentUnavailableError:
+                pass  # fall back to a one-shot docker exec below
+        return self._client_threads.submit(self._exec_client, probe)
+
+    def _client_result(self, probe, client, timeout):
+        """Returns the result of a client Future, running the probe again
+        through docker exec if the agent died before answering."""
+        try:
+            return client.result(timeout=timeout)
+        except AgentUnavailableError:
+            return self._exec_client(probe)
+
+    def _exec_client(self, probe):
+        """
+        Runs client.py for one probe with a new docker exec.
+
+        Args:
+            probe (dict): The probe, as returned by _prepare_test.
+
+        Returns:
+            dict: The JSON result printed by client.py.
+        """
+        container_id_src, dst_ip, protocol, dst_port = (
+            probe["container_id_src"], probe["dst_ip"], probe["protocol"], probe["dst_port"])
+        test_id, timestamp_teste = probe["test_id"], probe["timestamp_teste"]
+        timeout = probe["timeouts"]["probe_timeout_s"]
         command = [
-            "docker", "exec", container_id_src,
             "python3",
             "/firewallTester/src/client.py",
-            processed_dst_ip,
-            protocol.lower(),
+            dst_ip,
+            protocol,
             dst_port,
-            test_id, "2025", "0" 
+            test_id, timestamp_teste, "0",
+            "--timeout", str(timeout),
+            "--payload-size", str(self.payload_size),
+            "--count", str(self.rtt_samples),
+            "--exchanges", str(self.rtt_samples)
         ]
-        
-        try:
-            result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', timeout=10)
-            
-            
-            if result.returncode != 0:
-                raise subprocess.CalledProcessError(result.returncode, command, stderr=result.stderr)
-                
-            if not result.stdout:
-                raise json.JSONDecodeError("The script output was empty.", "", 0)
-
-            result_dict = json.loads(result.stdout)
-
-            if(not result_dict.get("server_response")):
-                (packet_arrived, message) = self._server_log_confirms_packet_in_container(
-                container_id=container_id_dest,
-                timestamp_teste=command[9],
-                test_id=test_id,
-                protocol=protocol,
-                server_ip=processed_dst_ip,
-                server_port=int(dst_port),
-                client_ip=result_dict.get("client_ip", None),
-                client_port=result_dict.get("client_port", None)
-                )
-                result_dict["packet_arrived"] = packet_arrived
-
-                result_dict["status_msg"] = message
-                result_dict["message"] = message
-
-            return True, result_dict
+        if "flood" in probe:
+            command += ["--flood", str(probe["flood"]["count"]), "--rate", str(probe["flood"]["rate"])]
+        result = self.backend.exec(container_id_src, command, timeout=self._client_deadline(probe))
 
-        except Exception as e:
-            error_msg = str(e)
-            if hasattr(e, 'stderr') and e.stderr:
-                error_msg = e.stderr.strip()
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, command, stderr=result.stderr)
             
-            print(f"Error TestRunner: {error_msg}", file=sys.stderr)
-            sys.stderr.flush()
-            error_result = {"status": "1", "status_msg": f"Execution Error: {error_msg}"}
-            return False, error_result
+        if not result.stdout:
+            raise json.JSONDecodeError("The script output was empty.", "", 0)
 
+        return json.loads(result.stdout)
 
     def analyze_test_result(self, expected_result, test_output):
         """
@@ -268,7 +800,8 @@ class TestRunner:
 
         Returns:
             tuple: A tuple containing a dictionary with analysis details
-                   (result, flow, data) and a tag for UI color-coding.
+                   (result, flow, data, rtt) and a tag for UI color-coding;
+                   rtt is the probe's RTT summary (min/p50/p95/max) or None.
         """
         expected = expected_result.lower()
 
@@ -277,8 +810,10 @@ class TestRunner:
             network_flow = "Not Sent"
             tag = "error"
 
-        elif test_output.get("server_response"):
-            network_flow = "Sent/Received"
+        elif test_output.get("server_response") or (
+                test_output.get("arrival_mode") == "capture" and test_output.get("packet_arrived")):
+            # In capture mode nothing answers; the packet reaching the destination is the success.
+            network_flow = "Sent/Received" if test_output.get("server_response") else "Sent/Arrived"
             if expected in ["yes", "permitido"]:
                 result_status = "Pass"
                 tag = "yes"
@@ -288,6 +823,8 @@ class TestRunner:
 
         elif not test_output.get("server_response"):
             network_flow = "Sent"
+            if test_output.get("outcome") in FAST_FAIL_MESSAGES:
+                network_flow += f" ({test_output['outcome']})"
             if expected in ["no", "bloqueado"]:
                 result_status = "Pass"
                 tag = "yesFail"
@@ -295,10 +832,49 @@ class TestRunner:
                 result_status = "Fail"
                 tag = "no"
 
+        if "flood" in test_output and result_status != "ERROR":
+            result_status, network_flow, tag = self._analyze_flood(expected, test_output["flood"])
+
         if "dnat" in test_output:
             network_flow += " (DNAT)"
 
-        return {"result": result_status, "flow": network_flow, "data": str(test_output)}, tag
+        analysis = {"result": result_status, "flow": network_flow, "data": str(test_output),
+                    "rtt": test_output.get("rtt")}
+        return analysis, tag
+
+    def _analyze_flood(self, expected, flood):
+        """
+        Judges a flood test: an allowed flood must stay within the loss,
+        p99 latency and rate thresholds, a blocked one must get no answer.
+
+        Returns:
+            tuple: (result, flow, tag) as in analyze_test_result.
+        """
+        summary = f"{flood['received']}/{flood['sent']}"
+        if flood.get("achieved_rate") is not None:
+            summary += f", {flood['achieved_rate']:g}/s"
+        if flood.get("latency_p99_ms") is not None:
+            summary += f", p99 {flood['latency_p99_ms']:.1f} ms"
+
+        if expected in ["no", "bloqueado"]:
+            if flood["received"]:
+                return "Fail", f"Sent/Received (flood {summary})", "no"
+            return "Pass", f"Sent (flood {summary})", "yesFail"
+
+        if not flood["received"]:
+            return "Fail", f"Sent (flood {summary})", "no"
+        violations = []
+        loss_percent = flood["loss"] * 100
+        if loss_percent > self.flood["max_loss_percent"]:
+            violations.append(f"loss {loss_percent:.1f}% > {self.flood['max_loss_percent']:g}%")
+        if flood["latency_p99_ms"] > self.flood["max_p99_ms"]:
+            violations.append(f"p99 > {self.flood['max_p99_ms']:g} ms")
+        target, achieved = flood.get("target_rate"), flood.get("achieved_rate")
+        if target and achieved is not None and achieved < target * self.flood["min_rate_percent"] / 100:
+            violations.append(f"rate < {self.flood['min_rate_percent']:g}% of {target:g}/s")
+        if violations:
+            return "Fail", f"Sent/Received (flood {summary}; {', '.join(violations)})", "no"
+        return "Pass", f"Sent/Received (flood {summary})", "yes"
     
     def _extract_destination_host(self, destination):
         if ip_match := re.search(r'\((\d+\.\d+\.\d+\.\d+)\)', destination):
@@ -0,0 +1,177 @@
+"""
+This module defines PhaseTimer, which splits the wall time of one test into
+consecutive phases with monotonic timestamps, and RunTimeline, which gathers
+the phases of every test of a run into a summary (p50/p95 of each phase and
+the slowest tests). Both only take time.monotonic() readings, so they stay on
+for every run.
+"""
+
+import threading
+import time
+
+from .calibration import percentile
+
+# Order in which the phases are reported; phases not listed here follow.
+PHASE_ORDER = ["queue", "precheck", "exec", "startup", "network", "client", "confirm"]
+
+
+class PhaseTimer:
+    """Measures the consecutive phases of one test."""
+    def __init__(self, started=None):
+        self.started = time.monotonic() if started is None else started
+        self._last = self.started
+        self.phases = {}
+
+    def mark(self, phase):
+        """Ends the current phase: the time since the previous mark is added to `phase`."""
+        now = time.monotonic()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def split(self, phase, parts):
+        """
+        Splits a measured phase into parts reported by someone else (e.g. the
+        time client.py spent on the network); what the parts do not cover
+        stays in `phase`.
+
+        Args:
+            phase (str): The phase to split.
+            parts (dict): {part: milliseconds}.
+        """
+        for part, milliseconds in parts.items():
+            if milliseconds is None or phase not in self.phases:
+                continue
+            milliseconds = min(milliseconds, self.phases[phase])
+            self.phases[phase] -= milliseconds
+            self.phases[part] = self.phases.get(part, 0.0) + milliseconds
+
+    def as_dict(self):
+        """
+        Returns:
+            dict: {"<phase>_ms": float, ..., "total_ms": float}
+        """
+        timing = {f"{phase}_ms": round(milliseconds, 3) for phase, milliseconds in self.phases.items()}
+        timing["total_ms"] = round((self._last - self.started) * 1000, 3)
+        return timing
+
+
+def distribution(values_ms):
+    """
+    Summarizes a list of durations.
+
+    Args:
+        values_ms (list): Durations in milliseconds.
+
+    Returns:
+        dict: {"samples", "min_ms", "p50_ms", "p95_ms", "max_ms"}, or None for an empty list.
+    """
+    if not values_ms:
+        return None
+    return {
+        "samples": len(values_ms),
+        "min_ms": round(min(values_ms), 4),
+        "p50_ms": round(percentile(values_ms, 0.5), 4),
+        "p95_ms": round(percentile(values_ms, 0.95), 4),
+        "max_ms": round(max(values_ms), 4),
+    }
+
+
+class RunTimeline:
+    """Collects the timing of every test of a run; thread-safe."""
+    def __init__(self):
+        self.started = time.monotonic()
+        self.finished = None
+        self._tests = []
+        self._lock = threading.Lock()
+
+    def add(self, label, timing):
+        """
+        Records the timing of one test.
+
+        Args:
+            label (str): How the test is shown in the summary.
+            timing (dict): The test's result["timing"] (see PhaseTimer.as_dict).
+        """
+        if not timing:
+            return
+        with self._lock:
+            self._tests.append((label, timing))
+
+    def finish(self):
+        """Marks the end of the run."""
+        self.finished = time.monotonic()
+
+    def summary(self, slowest=5):
+        """
+        Summarizes the run.
+
+        Args:
+            slowest (int): Number of slowest tests listed.
+
+        Returns:
+            dict: {"tests": int, "wall_ms": float,
+                   "phases": {phase: {"p50_ms", "p95_ms", "max_ms", "sum_ms"}},
+                   "slowest": [{"test": label, "total_ms": float, ...phases}]}
+        """
+        with self._lock:
+            tests = list(self._tests)
+        end = self.finished if self.finished is not None else time.monotonic()
+
+        samples = {}
+        for _, timing in tests:
+            for key, milliseconds in timing.items():
+                if key.endswith("_ms") and key != "total_ms":
+                    samples.setdefault(key[:-3], []).append(milliseconds)
+        samples["total"] = [timing.get("total_ms", 0.0) for _, timing in tests]
+
+        ordered = sorted(samples, key=lambda phase: (
+            PHASE_ORDER.index(phase) if phase in PHASE_ORDER else len(PHASE_ORDER), phase == "total", phase))
+        phases = {
+            phase: {
+                "p50_ms": round(percentile(samples[phase], 0.5), 3),
+                "p95_ms": round(percentile(samples[phase], 0.95), 3),
+                "max_ms": round(max(samples[phase]), 3),
+                "sum_ms": round(sum(samples[phase]), 3),
+            }
+            for phase in ordered if samples[phase]
+        }
+
+        slowest_tests = sorted(tests, key=lambda test: test[1].get("total_ms", 0.0), reverse=True)[:slowest]
+        return {
+            "tests": len(tests),
+            "wall_ms": round((end - self.started) * 1000, 3),
+            "phases": phases,
+            "slowest": [dict(timing, test=label) for label, timing in slowest_tests],
+        }
+
+
+def format_summary(summary):
+    """
+    Formats a RunTimeline summary as a plain text table.
+
+    Returns:
+        str: The report.
+    """
+    lines = [f"{summary['tests']} tests in {summary['wall_ms'] / 1000:.2f} s", ""]
+    lines.append(f"{'phase':<10}{'p50 (ms)':>12}{'p95 (ms)':>12}{'max (ms)':>12}{'sum (ms)':>14}")
+    for phase, values in summary["phases"].items():
+        lines.append(f"{phase:<10}{values['p50_ms']:>12.1f}{values['p95_ms']:>12.1f}"
+                     f"{values['max_ms']:>12.1f}{values['sum_ms']:>14.1f}")
+
+    if summary["slowest"]:
+        lines += ["", "Slowest tests:"]
+        for test in summary["slowest"]:
+            phases = ", ".join(
+                f"{key[:-3]} {value:.0f}" for key, value in test.items()
+                if key.endswith("_ms") and key != "total_ms"
+            )
+            lines.append(f"  {test.get('total_ms', 0.0):>8.1f} ms  {test['test']}  ({phases})")
+
+    if summary.get("one_way"):
+        lines += ["", "One-way delays per host pair (ms; forward = to the server, return = back):",
+                  f"  {'pair':<40}{'fwd p50':>10}{'fwd p95':>10}{'ret p50':>10}{'ret p95':>10}{'samples':>9}"]
+        for pair in summary["one_way"]:
+            forward, back = pair["forward_ms"], pair["return_ms"]
+            lines.append(f"  {pair['pair']:<40}{forward['p50_ms']:>10.3f}{forward['p95_ms']:>10.3f}"
+                         f"{back['p50_ms']:>10.3f}{back['p95_ms']:>10.3f}{forward['samples']:>9}")
+    return "\n".join(lines)
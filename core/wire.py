@@ -0,0 +1,124 @@
+"""
+    Program Name: Firewall Tester - Wire format
+    Description: Framing of the messages exchanged by client.py and server.py.
+    Each message is one frame: a fixed header, compact JSON metadata (the probe
+    or response fields) and an opaque payload whose size is chosen independently
+    of the metadata. The explicit lengths let one TCP connection carry several
+    probe/response exchanges and let a message of any size be read whole.
+    License: GNU General Public License v3.0
+    Version: 1.0
+"""
+
+import json
+import struct
+
+# Header: magic, version, frame type, metadata length, payload length.
+MAGIC = b"FT"
+VERSION = 1
+HEADER = struct.Struct("!2sBBHI")
+HEADER_SIZE = HEADER.size  # 10 bytes
+
+PROBE = 1
+RESPONSE = 2
+ERROR = 3
+
+MAX_METADATA_BYTES = 0xFFFF
+MAX_PAYLOAD_BYTES = 1024 * 1024
+# Largest payload that fits a UDP probe with its header and metadata.
+MAX_UDP_PAYLOAD_BYTES = 60000
+
+
+class WireError(ValueError):
+    """Raised for data that is not a valid frame of a supported version."""
+
+
+def is_framed(data):
+    """Checks whether received bytes start with a frame (as opposed to the
+    legacy format: one indented JSON object per message)."""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def encode_frame(frame_type, metadata, payload=b""):
+    """
+    Builds a frame.
+
+    Args:
+        frame_type: PROBE, RESPONSE or ERROR.
+        metadata: Dictionary sent as compact JSON.
+        payload: Opaque bytes sent after the metadata.
+
+    :return: The frame bytes.
+    :raises WireError: If the metadata or the payload is too large.
+    """
+    meta = json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+    if len(meta) > MAX_METADATA_BYTES:
+        raise WireError(f"metadata too large ({len(meta)} bytes)")
+    if len(payload) > MAX_PAYLOAD_BYTES:
+        raise WireError(f"payload too large ({len(payload)} bytes)")
+    return HEADER.pack(MAGIC, VERSION, frame_type, len(meta), len(payload)) + meta + payload
+
+
+def decode_frame(data):
+    """
+    Decodes the frame at the start of a buffer.
+
+    Args:
+        data: Received bytes; may hold a partial frame or several frames.
+
+    :return: Tuple (frame_type, metadata, payload, frame_size), or None if the
+             buffer does not hold a whole frame yet.
+    :raises WireError: If the buffer does not start with a valid frame.
+    """
+    if len(data) < HEADER_SIZE:
+        if data and not MAGIC.startswith(bytes(data[:len(MAGIC)])):
+            raise WireError("not a frame")
+        return None
+
+    magic, version, frame_type, meta_length, payload_length = HEADER.unpack_from(data)
+    _check_header(magic, version, payload_length)
+
+    size = HEADER_SIZE + meta_length + payload_length
+    if len(data) < size:
+        return None
+    try:
+        metadata = json.loads(bytes(data[HEADER_SIZE:HEADER_SIZE + meta_length]).decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise WireError(f"invalid metadata: {e}") from e
+    if not isinstance(metadata, dict):
+        raise WireError("invalid metadata: not an object")
+    return frame_type, metadata, bytes(data[HEADER_SIZE + meta_length:size]), size
+
+
+def read_frame(sock):
+    """
+    Reads one whole frame from a stream socket.
+
+    :return: Tuple (frame_type, metadata, payload).
+    :raises WireError: If the peer sends an invalid frame.
+    :raises ConnectionError: If the connection closes in the middle of a frame.
+    """
+    header = _recv_exact(sock, HEADER_SIZE)
+    magic, version, _, meta_length, payload_length = HEADER.unpack(header)
+    _check_header(magic, version, payload_length)
+    frame_type, metadata, payload, _ = decode_frame(header + _recv_exact(sock, meta_length + payload_length))
+    return frame_type, metadata, payload
+
+
+def _check_header(magic, version, payload_length):
+    if magic != MAGIC:
+        raise WireError("not a frame")
+    if version != VERSION:
+        raise WireError(f"unsupported version {version}")
+    if payload_length > MAX_PAYLOAD_BYTES:
+        raise WireError(f"payload too large ({payload_length} bytes)")
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise ConnectionError("connection closed in the middle of a frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
@@ -6,71 +6,202 @@ against the containers to verify firewall rules. It supports saving and
 loading test suites.
 """
 
+import contextlib
 import json
 import os
+import threading
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
     QComboBox, QGroupBox, QGridLayout, QLineEdit,
     QRadioButton, QTreeWidget, QTreeWidgetItem,
-    QAbstractItemView, QProgressDialog, QMessageBox, QFileDialog, QDialog)
-from PyQt5.QtGui import QColor, QBrush
+    QAbstractItemView, QProgressDialog, QMessageBox, QFileDialog, QDialog, QPlainTextEdit)
+from PyQt5.QtGui import QColor, QBrush, QFontDatabase
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QObject, QEvent
 import time
+from core.test_executor import TestExecutor
+from core.test_runner import FLOOD_PROTOCOLS
+from core.timeline import RunTimeline, format_summary
 from .widgets.loading_bar import LoadingBar
 
+# Columns of the RTT summary of each test (see client.rtt_summary), between
+# "Flow" and "Data".
+RTT_COLUMNS = {"min_ms": 10, "p50_ms": 11, "p95_ms": 12, "max_ms": 13}
+DATA_COLUMN = 14
+
+
+def _sort_key(text):
+    """Sorts numbers by value, before any text (e.g. a test without RTT)."""
+    try:
+        return (0, float(text), "")
+    except ValueError:
+        return (1, 0.0, text.lower())
+
+
+class TestTreeItem(QTreeWidgetItem):
+    """A test row; numeric columns (#, ports, RTTs) sort by value."""
+    def __lt__(self, other):
+        column = self.treeWidget().sortColumn() if self.treeWidget() else 0
+        return _sort_key(self.text(column)) < _sort_key(other.text(column))
+
 class TestWorker(QObject):
     """A worker that runs firewall tests in a separate thread."""
     progress = pyqtSignal(int, str)
     item_tested = pyqtSignal(QTreeWidgetItem, dict, str)
+    timeline_ready = pyqtSignal(dict)
     finished = pyqtSignal()
 
-    def __init__(self, test_items, test_runner, hosts_map, parent=None):
+    def __init__(self, test_items, test_runner, hosts_map, max_workers=8, max_per_source=4, parent=None):
         super().__init__(parent)
         self.test_items = test_items
         self.test_runner = test_runner
         self.hosts_map = hosts_map 
+        self.executor = TestExecutor(max_workers, max_per_source)
         self.is_cancelled = False
         
     def run(self):
-        """Executes the test items and emits signals for progress and results."""
-        total = len(self.test_items)
-        for i, item in enumerate(self.test_items):
-            if self.is_cancelled:
-                break
-            
-            progress_msg = f"Testing {i+1}/{total}: {item.text(2)} -> {item.text(3)}"
-            self.progress.emit(int(((i + 1) / total) * 100), progress_msg)
-
-            _, container_id, _, dst_hostname, proto, _, dst_port, expected, _, _, _ = [
-                item.text(c) for c in range(item.columnCount())
-            ]
-            
-            destination_ip = dst_hostname
-            clean_name = dst_hostname.split(' (')[0].strip()
-
-            container_id_destination = self.hosts_map.get(dst_hostname, {}).get('id')
-            
-            found = False
-            for data in self.hosts_map.values():
-                if data['hostname'] == clean_name:
-                    destination_ip = data['ip']
-                    found = True
-                    break
-            if not found and dst_hostname in self.hosts_map:
-                destination_ip = self.hosts_map[dst_hostname]['ip']
-
-            effective_port = "1" if proto.upper() == "ICMP" else dst_port
+        """Executes the test items concurrently and emits signals for progress and
+        results in completion order."""
+        self._total = len(self.test_items)
+        self._done = 0
+        self._done_lock = threading.Lock()
+        self.timeline = RunTimeline()
+        specs = [self._build_test_spec(item) for item in self.test_items]
+
+        if self._total:
+            self.progress.emit(0, f"Testing {self._total} items...")
+
+        host_pairs = self._calibration_pairs(specs)
+        if host_pairs and self.test_runner.adaptive_timeouts:
+            self.progress.emit(0, f"Calibrating timeouts for {len(host_pairs)} host pairs...")
+        self.test_runner.begin_run((spec["container_id_destination"] for spec in specs), host_pairs)
+        # Queue time is counted from here, so it does not include the calibration.
+        self._tests_started = time.monotonic()
+        try:
+            self._run_specs(specs)
+            one_way = self.test_runner.one_way_summary()
+        finally:
+            self.test_runner.end_run()
+
+        self.timeline.finish()
+        summary = self.timeline.summary()
+        sources = {spec["container_id"]: spec["item"].text(2) for spec in specs}
+        summary["one_way"] = [
+            dict(delays, pair=f"{sources.get(container_id, container_id)} -> {dst_ip}")
+            for (container_id, dst_ip), delays in sorted(one_way.items())
+        ]
+        self.timeline_ready.emit(summary)
+        self.finished.emit()
 
-            _, result_dict = self.test_runner.run_single_test(container_id, destination_ip, proto, effective_port, container_id_destination)
+    @staticmethod
+    def _calibration_pairs(specs):
+        """Returns {(source container, destination IP): TCP port} for the RTT
+        calibration: a TCP port the tests expect to be allowed for the pair, or
+        else for the destination; None (ICMP echo) when there is none, as a
+        closed port is usually dropped by the firewall and gives no sample."""
+        pairs = {}
+        allowed_ports = {}
+        for spec in specs:
+            key = (spec["container_id"], spec["destination_ip"])
+            if spec["protocol"].upper() == "TCP" and spec["expected"] == "yes":
+                pairs[key] = spec["dst_port"]
+                allowed_ports.setdefault(spec["destination_ip"], spec["dst_port"])
+            else:
+                pairs.setdefault(key, None)
+        return {key: allowed_ports.get(key[1]) if port is None else port for key, port in pairs.items()}
+
+    def _run_specs(self, specs):
+        """Runs the tests, one agent request per row or one batch per source host."""
+        if self.test_runner.agent_pool is None:
+            # Without probe agents, send all rows of a source host in one docker exec.
+            groups = {}
+            for spec in specs:
+                groups.setdefault(spec["container_id"], []).append(spec)
+            jobs = [(container_id, group) for container_id, group in groups.items()]
+            self.executor.run(jobs, self._run_batch, lambda group, result: None, lambda: self.is_cancelled)
+        else:
+            jobs = [(spec["container_id"], spec) for spec in specs]
+            self.executor.run(jobs, self._run_test, self._report_result, lambda: self.is_cancelled)
+
+    def _report_result(self, spec, result):
+        """Emits progress and the analysed result of one test; thread-safe."""
+        with self._done_lock:
+            self._done += 1
+            done = self._done
+        item = spec["item"]
+        progress_msg = f"Tested {done}/{self._total}: {item.text(2)} -> {item.text(3)}"
+        self.progress.emit(int((done / self._total) * 100), progress_msg)
+
+        if result is None:
+            result = {"status": "1", "status_msg": "Execution Error: test worker failed"}
+        self.timeline.add(f"{item.text(2)} -> {item.text(3)} {item.text(4)}/{item.text(6)}", result.get("timing"))
+        analysis, tag = self.test_runner.analyze_test_result(spec["expected"], result)
+        self.item_tested.emit(item, analysis, tag)
+
+    def _build_test_spec(self, item):
+        """Reads a tree item into a plain dict so it can be tested off the GUI thread."""
+        _, container_id, _, dst_hostname, proto, _, dst_port, expected = [
+            item.text(c) for c in range(8)
+        ]
+        
+        destination_ip = dst_hostname
+        clean_name = dst_hostname.split(' (')[0].strip()
 
-            if self.is_cancelled:
+        container_id_destination = self.hosts_map.get(dst_hostname, {}).get('id')
+        
+        found = False
+        for data in self.hosts_map.values():
+            if data['hostname'] == clean_name:
+                destination_ip = data['ip']
+                found = True
                 break
-            
-            expected_back= "yes" if expected == "Allowed" else "no"
-            analysis, tag = self.test_runner.analyze_test_result(expected_back, result_dict)
-            self.item_tested.emit(item, analysis, tag)
-            
-            
-        self.finished.emit()
+        if not found and dst_hostname in self.hosts_map:
+            destination_ip = self.hosts_map[dst_hostname]['ip']
+
+        return {
+            "item": item,
+            "container_id": container_id,
+            "destination_ip": destination_ip,
+            "protocol": proto,
+            "dst_port": "1" if proto.upper() == "ICMP" else dst_port,
+            "container_id_destination": container_id_destination,
+            "expected": "yes" if expected == "Allowed" else "no",
+        }
+
+    def _run_test(self, spec):
+        """Runs one test spec; called from an executor thread."""
+        if self.is_cancelled:
+            return None
+        queue_ms = (time.monotonic() - self._tests_started) * 1000
+        _, result_dict = self.test_runner.run_single_test(
+            spec["container_id"], spec["destination_ip"], spec["protocol"],
+            spec["dst_port"], spec["container_id_destination"]
+        )
+        self._add_queue_time(result_dict, queue_ms)
+        return result_dict
+
+    @staticmethod
+    def _add_queue_time(result_dict, queue_ms):
+        """Adds the time a test waited for an executor slot to its timing."""
+        timing = result_dict.get("timing")
+        if timing is not None:
+            timing["queue_ms"] = round(queue_ms, 3)
+            timing["total_ms"] = round(timing.get("total_ms", 0.0) + queue_ms, 3)
+
+    def _run_batch(self, specs):
+        """Runs every spec of one source host with a single batch exec; called
+        from an executor thread and reports each result as it arrives."""
+        tests = [
+            (index, spec["destination_ip"], spec["protocol"], spec["dst_port"], spec["container_id_destination"])
+            for index, spec in enumerate(specs)
+        ]
+        concurrency = self.executor.max_per_source
+        queue_ms = (time.monotonic() - self._tests_started) * 1000
+        # Closed on cancel, which kills the batch client in the container.
+        with contextlib.closing(self.test_runner.run_batch_tests(specs[0]["container_id"], tests, concurrency)) as results:
+            for index, _, result_dict in results:
+                if self.is_cancelled:
+                    break
+                self._add_queue_time(result_dict, queue_ms)
+                self._report_result(specs[index], result_dict)
 
     def cancel(self):
         """Flags the worker to stop processing tests."""
@@ -118,7 +249,9 @@ class FirewallTestsTab(QWidget):
         self.dst_ip_combo.setMinimumWidth(100)
         self.dst_ip_combo.setEditable(True)
         self.protocol_combo = QComboBox()
-        self.protocol_combo.addItems(["TCP", "UDP", "ICMP"])
+        self.protocol_combo.addItems(["TCP", "UDP", "ICMP", "TCP-FLOOD", "UDP-FLOOD"])
+        self.protocol_combo.setToolTip("TCP-FLOOD/UDP-FLOOD send many connections or datagrams at the rate "
+                                       "set in Settings and check loss, latency and rate against its thresholds")
         self.src_port_entry = QLineEdit("*")
         self.src_port_entry.setEnabled(False)
         self.dst_port_entry = QLineEdit("80")
@@ -149,6 +282,8 @@ class FirewallTestsTab(QWidget):
         self.btn_del_all = QPushButton("Delete all")
         self.btn_test = QPushButton("Test selected")
         self.btn_test_all = QPushButton("Test all")
+        self.btn_timeline = QPushButton("Run timeline")
+        self.btn_timeline.setToolTip("Where the time of the last run went, phase by phase")
 
         buttons_layout.addStretch(1)
         buttons_layout.addWidget(self.btn_add)
@@ -157,17 +292,23 @@ class FirewallTestsTab(QWidget):
         buttons_layout.addWidget(self.btn_del)
         buttons_layout.addWidget(self.btn_test)
         buttons_layout.addWidget(self.btn_test_all)
+        buttons_layout.addWidget(self.btn_timeline)
         buttons_layout.addStretch(1)
 
         self.tree = QTreeWidget()
         self.tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.header_labels = ["#","Container ID","Source","Destination","Protocol","Src Port","Dst Port",
-            "Expected","Result","Flow","Data"
+            "Expected","Result","Flow","RTT min (ms)","RTT p50 (ms)","RTT p95 (ms)","RTT max (ms)","Data"
         ]
 
         self.tree.setHeaderLabels(self.header_labels)
         main_layout.addWidget(self.tree)
         self.tree.setColumnWidth(0, 40)
+        for column in RTT_COLUMNS.values():
+            self.tree.setColumnWidth(column, 90)
+        # Click a header to sort, e.g. by RTT p95 to spot rules that slowed a path down.
+        self.tree.setSortingEnabled(True)
+        self.tree.sortByColumn(0, Qt.AscendingOrder)
         self.tree.setColumnHidden(1, not self.config.get("show_container_id", False))
         self.tree.viewport().installEventFilter(self)
 
@@ -207,6 +348,7 @@ class FirewallTestsTab(QWidget):
         self.btn_del.clicked.connect(self._delete_test)
         self.btn_test.clicked.connect(self._run_selected_test)
         self.btn_test_all.clicked.connect(self._run_all_tests)
+        self.btn_timeline.clicked.connect(self._show_run_timeline)
         self.tree.itemSelectionChanged.connect(self._on_item_selected)
         self.tree.itemDoubleClicked.connect(self._on_item_double_clicked)
         self.btn_save.clicked.connect(self._save_tests)
@@ -246,7 +388,7 @@ class FirewallTestsTab(QWidget):
         self.btn_del_all.setEnabled(False)
 
         self.thread = QThread()
-        self.worker = TestWorker(selected_items, self.test_runner, self.hosts_map)
+        self.worker = self._create_worker(selected_items)
         self.worker.moveToThread(self.thread)
 
         def on_cancel():
@@ -258,6 +400,7 @@ class FirewallTestsTab(QWidget):
         self.worker.finished.connect(self.worker.deleteLater)
         self.thread.finished.connect(self.thread.deleteLater)
         self.worker.item_tested.connect(self._update_tree_item)
+        self.worker.timeline_ready.connect(self._store_run_timeline)
         self.worker.progress.connect(self._update_progress_dialog)
         self.progress_dialog.canceled.connect(on_cancel)
         self.thread.finished.connect(self.progress_dialog.close)
@@ -287,6 +430,14 @@ class FirewallTestsTab(QWidget):
     #     return self.container_manager.update_host_ports(container_id, ports_on_host, local_path)
 
     
+    def _create_worker(self, test_items):
+        """Creates a TestWorker using the concurrency limits from the settings."""
+        return TestWorker(
+            test_items, self.test_runner, self.hosts_map,
+            max_workers=self.config.get("max_concurrent_tests", 8),
+            max_per_source=self.config.get("max_concurrent_per_source", 4)
+        )
+
     def _paint_test_result(self, item, analysis_dict, tag, clear_selection=True):
         print(f"\nResult: {analysis_dict['result']}")
         print(f"Container ID: {item.text(1)}")
@@ -294,7 +445,12 @@ class FirewallTestsTab(QWidget):
 
         item.setText(8, analysis_dict['result'])
         item.setText(9, analysis_dict['flow'])
-        item.setText(10, analysis_dict['data'])
+        rtt = analysis_dict.get('rtt') or {}
+        for key, column in RTT_COLUMNS.items():
+            item.setText(column, f"{rtt[key]:.3f}" if rtt.get(key) is not None else "")
+        if rtt:
+            item.setToolTip(RTT_COLUMNS["p50_ms"], f"{rtt['samples']} RTT samples")
+        item.setText(DATA_COLUMN, analysis_dict['data'])
 
         color_map = {
             "yes": "lightgreen", "yesFail": "lightblue",
@@ -328,11 +484,16 @@ class FirewallTestsTab(QWidget):
         """
 
         ports_not_open = {}
+        # Take fresh listening-socket snapshots for this run.
+        self.container_manager.port_inventory.invalidate()
+        if self.test_runner.arrival_mode == "capture":
+            return ports_not_open  # server.py captures every port
 
         for item in list_test:
-            _, _, _, dst_hostname, proto, _, dst_port, _, _, _, _ = [
-                item.text(c) for c in range(item.columnCount())
+            _, _, _, dst_hostname, proto, _, dst_port, _ = [
+                item.text(c) for c in range(8)
             ]
+            proto = FLOOD_PROTOCOLS.get(proto.lower(), proto)
             if proto.upper() != "ICMP":
                 container_id_destination = self.hosts_map.get(dst_hostname, {}).get('id')
                 result = self.container_manager.check_port_open(container_id_destination, dst_port, proto)
@@ -419,7 +580,7 @@ class FirewallTestsTab(QWidget):
         self.btn_del_all.setEnabled(False)
         
         self.thread = QThread()
-        self.worker = TestWorker(tests_to_run, self.test_runner, self.hosts_map)
+        self.worker = self._create_worker(tests_to_run)
         self.worker.moveToThread(self.thread)
         
         def on_cancel():
@@ -431,6 +592,7 @@ class FirewallTestsTab(QWidget):
         self.worker.finished.connect(self.worker.deleteLater)
         self.thread.finished.connect(self.thread.deleteLater)
         self.worker.item_tested.connect(self._update_tree_item)
+        self.worker.timeline_ready.connect(self._store_run_timeline)
         self.worker.progress.connect(self._update_progress_dialog)
         self.progress_dialog.canceled.connect(on_cancel)
         self.thread.finished.connect(self.progress_dialog.close)
@@ -446,6 +608,31 @@ class FirewallTestsTab(QWidget):
         self.dragging = False
         super().mouseReleaseEvent(event)   
         
+    def _store_run_timeline(self, summary):
+        """Keeps the timeline of the last run for the 'Run timeline' button."""
+        self.last_timeline = summary
+        if summary["tests"]:
+            print(format_summary(summary))
+
+    def _show_run_timeline(self):
+        """Shows where the time of the last run went."""
+        if not getattr(self, "last_timeline", None) or not self.last_timeline["tests"]:
+            QMessageBox.information(self, "Run timeline", "Run some tests first.")
+            return
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Run timeline")
+        dialog.resize(720, 420)
+        layout = QVBoxLayout(dialog)
+        text = QPlainTextEdit(format_summary(self.last_timeline))
+        text.setReadOnly(True)
+        text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(text)
+        btn_close = QPushButton("Close")
+        btn_close.clicked.connect(dialog.accept)
+        layout.addWidget(btn_close, alignment=Qt.AlignRight)
+        dialog.exec_()
+
     def _update_progress_dialog(self, value, text):
         """Updates the progress dialog's value and label text."""
         self.progress_dialog.setValue(value)
@@ -467,10 +654,10 @@ class FirewallTestsTab(QWidget):
             self.src_port_entry.text(),
             self.dst_port_entry.text(),
             "Allowed" if self.expected_yes_radio.isChecked() else "Blocked",
-            "-", "", ""
+            "-", "", "", "", "", "", ""
         ]
 
-        new_item = QTreeWidgetItem(values)
+        new_item = TestTreeItem(values)
         self.tree.addTopLevelItem(new_item)
         self._clear_selection_and_reset_buttons()
     
@@ -513,7 +700,7 @@ class FirewallTestsTab(QWidget):
             item.setText(6, self.dst_port_entry.text())
             item.setText(7, "Allowed" if self.expected_yes_radio.isChecked() else "Blocked")
             
-            for i in range(8, 11):
+            for i in range(8, item.columnCount()):
                 item.setText(i, "" if i > 8 else "-")
                 item.setBackground(i, QBrush(QColor("transparent")))
             
@@ -548,9 +735,15 @@ class FirewallTestsTab(QWidget):
             self._renumber_tests()
             self._set_buttons_normal_state()
 
+    def _tests_in_order(self):
+        """Returns the tests in the order they were added (by "#"), whatever
+        column the tree is sorted by."""
+        items = [self.tree.topLevelItem(i) for i in range(self.tree.topLevelItemCount())]
+        return sorted(items, key=lambda item: _sort_key(item.text(0)))
+
     def _renumber_tests(self):
-        for i in range(self.tree.topLevelItemCount()):
-            self.tree.topLevelItem(i).setText(0, str(i + 1))
+        for i, item in enumerate(self._tests_in_order()):
+            item.setText(0, str(i + 1))
             
     def _on_item_double_clicked(self):
         self.src_ip_combo.setFocus()
@@ -690,8 +883,7 @@ class FirewallTestsTab(QWidget):
             return
 
         tests_data = []
-        for i in range(self.tree.topLevelItemCount()):
-            item = self.tree.topLevelItem(i)
+        for item in self._tests_in_order():
             test_dict = {}
             for j, key in enumerate(self.header_labels):
                 test_dict[key] = item.text(j)
@@ -785,7 +977,7 @@ class FirewallTestsTab(QWidget):
                     expected = test.get("Expected", test.get("Esperado", ""))
 
                     values = [
-                        test.get("#", ""), 
+                        str(self.tree.topLevelItemCount() + 1),
                         final_src_id, 
                         final_src_text, 
                         final_dst_text,
@@ -793,9 +985,9 @@ class FirewallTestsTab(QWidget):
                         src_port, 
                         dst_port, 
                         expected,
-                        "-", "", ""
+                        "-", "", "", "", "", "", ""
                     ]
-                    self.tree.addTopLevelItem(QTreeWidgetItem(values))
+                    self.tree.addTopLevelItem(TestTreeItem(values))
 
                 except StopIteration:
                     was_aborted = True
@@ -3,8 +3,8 @@
 import pathlib
 from functools import partial
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
-    QPushButton, QScrollArea, QDialog)
-from PyQt5.QtGui import QFont, QIcon
+    QPushButton, QScrollArea, QDialog, QMessageBox, QPlainTextEdit)
+from PyQt5.QtGui import QFont, QFontDatabase, QIcon
 from PyQt5.QtCore import Qt
 from .widgets.edit_ports import EditPortsDialog
 
@@ -87,6 +87,7 @@ class HostsTab(QWidget):
                 new_card.btn_toggle.clicked.connect(partial(self._toggle_server, host_id))
                 edit_ports_handler = partial(self._edit_ports, host_id, host_data['hostname'])
                 new_card.btn_edit_ports.clicked.connect(edit_ports_handler)
+                new_card.btn_metrics.clicked.connect(partial(self._show_metrics, host_id, host_data['hostname']))
 
                 self.layout_all_hosts.addWidget(new_card)
                 self.hosts_cards[host_id] = new_card
@@ -126,4 +127,24 @@ class HostsTab(QWidget):
             if container_id in self.hosts_cards:
                 success, status = self.container_manager.check_server_status(container_id)
                 if success:
-                    self.hosts_cards[container_id].update_status(status)
\ No newline at end of file
+                    self.hosts_cards[container_id].update_status(status)
+
+    def _show_metrics(self, container_id, hostname):
+        """Shows the metrics snapshot written by the server of a host."""
+        success, metrics_text = self.container_manager.get_server_metrics(container_id)
+        if not success:
+            QMessageBox.information(self, "Server metrics", metrics_text)
+            return
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"Server metrics - {hostname}")
+        dialog.resize(720, 480)
+        layout = QVBoxLayout(dialog)
+        text = QPlainTextEdit(metrics_text)
+        text.setReadOnly(True)
+        text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(text)
+        btn_close = QPushButton("Close")
+        btn_close.clicked.connect(dialog.accept)
+        layout.addWidget(btn_close, alignment=Qt.AlignRight)
+        dialog.exec_()
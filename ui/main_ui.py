@@ -15,6 +15,7 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
 from PyQt5.QtGui import QIcon
 
 from core.container_manager import ContainerManager
+from core.docker_backend import get_backend
 from core.test_runner import TestRunner
 
 from .hosts_tab import HostsTab
@@ -70,8 +71,26 @@ class MainWindow(QMainWindow):
 
         self.config = self._load_app_config()
         docker_image = self.config.get("docker_image", "firewall_tester")
-        self.container_manager = ContainerManager(docker_image)
-        self.test_runner = TestRunner()
+        docker_backend = get_backend(self.config.get("docker_backend", "cli"))
+        arrival_mode = self.config.get("arrival_mode", "listeners")
+        self.container_manager = ContainerManager(
+            docker_image, backend=docker_backend, arrival_mode=arrival_mode,
+            server_workers=self.config.get("server_workers", 1)
+        )
+        self.test_runner = TestRunner(
+            use_agent=self.config.get("use_probe_agent", True), backend=docker_backend,
+            port_inventory=self.container_manager.port_inventory, arrival_mode=arrival_mode,
+            adaptive_timeouts=self.config.get("adaptive_timeouts", True),
+            payload_size=self.config.get("probe_payload_size", 0),
+            rtt_samples=self.config.get("rtt_samples", 1),
+            flood={
+                "count": self.config.get("flood_count", 100),
+                "rate": self.config.get("flood_rate", 50),
+                "max_loss_percent": self.config.get("flood_max_loss_percent", 1.0),
+                "max_p99_ms": self.config.get("flood_max_p99_ms", 250.0),
+                "min_rate_percent": self.config.get("flood_min_rate_percent", 90.0),
+            }
+        )
 
         # Initialize tab attributes
         self.tests_tab = None
@@ -126,9 +145,9 @@ class MainWindow(QMainWindow):
             return SettingsTab.DEFAULT_SETTINGS.copy()
 
     def _create_tabs(self):
+        # One discovery, shared by every tab (and reused by the initial _update_all_hosts).
+        all_hosts_data = self.container_manager.refresh_hosts()
         hosts_for_combobox = self.container_manager.get_hosts_for_combobox()
-
-        all_hosts_data = self.container_manager.get_all_containers_data()
         print(f"Detected host data: {all_hosts_data}", file=sys.stderr)
         sys.stderr.flush()
         
@@ -149,7 +168,10 @@ class MainWindow(QMainWindow):
         self.tab_widget.addTab(self.about_tab, "About")
 
     def _update_all_hosts(self, is_initial_load=False):
-        all_hosts_data = self.container_manager.get_all_containers_data()
+        if is_initial_load:
+            all_hosts_data = self.container_manager.get_all_containers_data()
+        else:
+            all_hosts_data = self.container_manager.refresh_hosts()
         hosts_for_combobox = self.container_manager.get_hosts_for_combobox()
 
         self.hosts_tab.update_hosts_display(all_hosts_data)
@@ -166,16 +188,10 @@ class MainWindow(QMainWindow):
                     "Also verify that the Docker image name in the 'Settings' tab is correct."
                 )
             else:
-                servers_on = 0
-                
                 QApplication.setOverrideCursor(Qt.WaitCursor)
+                servers_on = self.container_manager.prepare_hosts([host['id'] for host in all_hosts_data])
                 for host in all_hosts_data:
-                    host_id = host['id']
-                    _, status = self.container_manager.check_server_status(host_id)
-                    if status == 'off':
-                        success, _ = self.container_manager.start_server(host_id)
-                        if success:
-                            servers_on += 1
+                    self.test_runner.start_agent(host['id'])
                 
                 QApplication.restoreOverrideCursor()
 
@@ -192,6 +208,8 @@ class MainWindow(QMainWindow):
                         5000
                     )
         elif not is_initial_load:
+            # Hosts started since the last discovery get the current scripts too.
+            self.container_manager.prepare_hosts([host['id'] for host in all_hosts_data], start_stopped=False)
             QMessageBox.information(
                 self,
                 "Success",
@@ -218,6 +236,7 @@ class MainWindow(QMainWindow):
             "Do you really want to exit the application?",
             QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes:
+            self.test_runner.close()
             event.accept()
         else:
             event.ignore()
\ No newline at end of file
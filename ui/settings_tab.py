@@ -3,7 +3,7 @@
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
     QLabel, QPushButton, QLineEdit, QCheckBox,
-    QGroupBox, QMessageBox
+    QGroupBox, QMessageBox, QSpinBox, QDoubleSpinBox, QComboBox
 )
 from PyQt5.QtGui import QFont
 from PyQt5.QtCore import Qt
@@ -27,7 +27,21 @@ class SettingsTab(QWidget):
         "show_container_id": False,
         "include_filter_table": True,
         "include_nat_table": True,
-        "include_mangle_table": False
+        "include_mangle_table": False,
+        "max_concurrent_tests": 8,
+        "max_concurrent_per_source": 4,
+        "use_probe_agent": True,
+        "docker_backend": "cli",
+        "arrival_mode": "listeners",
+        "server_workers": 1,
+        "adaptive_timeouts": True,
+        "probe_payload_size": 0,
+        "rtt_samples": 1,
+        "flood_count": 100,
+        "flood_rate": 50,
+        "flood_max_loss_percent": 1.0,
+        "flood_max_p99_ms": 250.0,
+        "flood_min_rate_percent": 90.0
     }
 
     def __init__(self, config, parent=None):
@@ -58,8 +72,56 @@ class SettingsTab(QWidget):
                            self.config_firewall_rules_entry)
         form_layout.addRow("Server Ports file (local):", self.config_server_ports_entry)
         form_layout.addRow("Default Docker image name:", self.config_docker_image_entry)
+
+        self.config_max_concurrent_spin = QSpinBox()
+        self.config_max_concurrent_spin.setRange(1, 64)
+        self.config_max_per_source_spin = QSpinBox()
+        self.config_max_per_source_spin.setRange(1, 64)
+        self.config_docker_backend_combo = QComboBox()
+        self.config_docker_backend_combo.addItems(["cli", "api"])
+        form_layout.addRow("Docker backend (cli or Engine API, restart required):",
+                           self.config_docker_backend_combo)
+        self.config_arrival_mode_combo = QComboBox()
+        self.config_arrival_mode_combo.addItems(["listeners", "capture"])
+        form_layout.addRow("Arrival detection (port listeners or packet capture, restart required):",
+                           self.config_arrival_mode_combo)
+        self.config_server_workers_spin = QSpinBox()
+        self.config_server_workers_spin.setRange(1, 64)
+        form_layout.addRow("Server processes per host (restart required):", self.config_server_workers_spin)
+        self.config_probe_payload_spin = QSpinBox()
+        self.config_probe_payload_spin.setRange(0, 60000)
+        form_layout.addRow("Probe payload size in bytes (TCP/UDP, restart required):", self.config_probe_payload_spin)
+        self.config_rtt_samples_spin = QSpinBox()
+        self.config_rtt_samples_spin.setRange(1, 1000)
+        form_layout.addRow("RTT samples per test (restart required):", self.config_rtt_samples_spin)
+        form_layout.addRow("Maximum concurrent tests:", self.config_max_concurrent_spin)
+        form_layout.addRow("Maximum concurrent tests per source host:",
+                           self.config_max_per_source_spin)
         main_layout.addLayout(form_layout)
 
+        flood_group = QGroupBox("Flood tests (TCP-FLOOD/UDP-FLOOD, restart required)")
+        flood_layout = QFormLayout(flood_group)
+        self.config_flood_count_spin = QSpinBox()
+        self.config_flood_count_spin.setRange(1, 100000)
+        self.config_flood_rate_spin = QSpinBox()
+        self.config_flood_rate_spin.setRange(0, 100000)
+        self.config_flood_rate_spin.setSpecialValueText("As fast as possible")
+        self.config_flood_max_loss_spin = QDoubleSpinBox()
+        self.config_flood_max_loss_spin.setRange(0, 100)
+        self.config_flood_max_loss_spin.setSuffix(" %")
+        self.config_flood_max_p99_spin = QDoubleSpinBox()
+        self.config_flood_max_p99_spin.setRange(0, 60000)
+        self.config_flood_max_p99_spin.setSuffix(" ms")
+        self.config_flood_min_rate_spin = QDoubleSpinBox()
+        self.config_flood_min_rate_spin.setRange(0, 100)
+        self.config_flood_min_rate_spin.setSuffix(" %")
+        flood_layout.addRow("Packets or connections per test:", self.config_flood_count_spin)
+        flood_layout.addRow("Target rate (per second):", self.config_flood_rate_spin)
+        flood_layout.addRow("Maximum loss to pass:", self.config_flood_max_loss_spin)
+        flood_layout.addRow("Maximum p99 latency to pass:", self.config_flood_max_p99_spin)
+        flood_layout.addRow("Minimum achieved rate to pass (of the target):", self.config_flood_min_rate_spin)
+        main_layout.addWidget(flood_group)
+
         checkbox_group = QGroupBox("Interface and listing options")
         checkbox_layout = QVBoxLayout(checkbox_group)
 
@@ -67,11 +129,15 @@ class SettingsTab(QWidget):
         self.config_include_filter_check = QCheckBox("Include 'Filter' table in the listing")
         self.config_include_nat_check = QCheckBox("Include 'Filter' table in the listing")
         self.config_include_mangle_check = QCheckBox("Include 'Mangle' table in the listing")
+        self.config_use_probe_agent_check = QCheckBox("Keep a persistent probe agent running in each host")
+        self.config_adaptive_timeouts_check = QCheckBox("Derive test timeouts from the RTT measured at the start of each run")
 
         checkbox_layout.addWidget(self.config_show_container_id_check)
         checkbox_layout.addWidget(self.config_include_filter_check)
         checkbox_layout.addWidget(self.config_include_nat_check)
         checkbox_layout.addWidget(self.config_include_mangle_check)
+        checkbox_layout.addWidget(self.config_use_probe_agent_check)
+        checkbox_layout.addWidget(self.config_adaptive_timeouts_check)
         main_layout.addWidget(checkbox_group)
 
         main_layout.addStretch(1)
@@ -96,11 +162,25 @@ class SettingsTab(QWidget):
         self.config_firewall_rules_entry.setText(self.config.get("firewall_rules_file", ""))
         self.config_server_ports_entry.setText(self.config.get("server_ports_file", ""))
         self.config_docker_image_entry.setText(self.config.get("docker_image", "firewall_tester"))
+        self.config_docker_backend_combo.setCurrentText(self.config.get("docker_backend", "cli"))
+        self.config_arrival_mode_combo.setCurrentText(self.config.get("arrival_mode", "listeners"))
+        self.config_max_concurrent_spin.setValue(self.config.get("max_concurrent_tests", 8))
+        self.config_max_per_source_spin.setValue(self.config.get("max_concurrent_per_source", 4))
+        self.config_server_workers_spin.setValue(self.config.get("server_workers", 1))
+        self.config_probe_payload_spin.setValue(self.config.get("probe_payload_size", 0))
+        self.config_rtt_samples_spin.setValue(self.config.get("rtt_samples", 1))
+        self.config_flood_count_spin.setValue(self.config.get("flood_count", 100))
+        self.config_flood_rate_spin.setValue(self.config.get("flood_rate", 50))
+        self.config_flood_max_loss_spin.setValue(self.config.get("flood_max_loss_percent", 1.0))
+        self.config_flood_max_p99_spin.setValue(self.config.get("flood_max_p99_ms", 250.0))
+        self.config_flood_min_rate_spin.setValue(self.config.get("flood_min_rate_percent", 90.0))
 
         self.config_show_container_id_check.setChecked(self.config.get("show_container_id", False))
         self.config_include_filter_check.setChecked(self.config.get("include_filter_table", True))
         self.config_include_nat_check.setChecked(self.config.get("include_nat_table", True))
         self.config_include_mangle_check.setChecked(self.config.get("include_mangle_table", False))
+        self.config_use_probe_agent_check.setChecked(self.config.get("use_probe_agent", True))
+        self.config_adaptive_timeouts_check.setChecked(self.config.get("adaptive_timeouts", True))
 
     def _save_settings(self):
         self.config["firewall_directory"] = self.config_firewall_dir_entry.text()
@@ -108,11 +188,25 @@ class SettingsTab(QWidget):
         self.config["firewall_rules_file"] = self.config_firewall_rules_entry.text()
         self.config["server_ports_file"] = self.config_server_ports_entry.text()
         self.config["docker_image"] = self.config_docker_image_entry.text()
+        self.config["docker_backend"] = self.config_docker_backend_combo.currentText()
+        self.config["arrival_mode"] = self.config_arrival_mode_combo.currentText()
+        self.config["max_concurrent_tests"] = self.config_max_concurrent_spin.value()
+        self.config["max_concurrent_per_source"] = self.config_max_per_source_spin.value()
+        self.config["server_workers"] = self.config_server_workers_spin.value()
+        self.config["probe_payload_size"] = self.config_probe_payload_spin.value()
+        self.config["rtt_samples"] = self.config_rtt_samples_spin.value()
+        self.config["flood_count"] = self.config_flood_count_spin.value()
+        self.config["flood_rate"] = self.config_flood_rate_spin.value()
+        self.config["flood_max_loss_percent"] = self.config_flood_max_loss_spin.value()
+        self.config["flood_max_p99_ms"] = self.config_flood_max_p99_spin.value()
+        self.config["flood_min_rate_percent"] = self.config_flood_min_rate_spin.value()
 
         self.config["show_container_id"] = self.config_show_container_id_check.isChecked()
         self.config["include_filter_table"] = self.config_include_filter_check.isChecked()
         self.config["include_nat_table"] = self.config_include_nat_check.isChecked()
         self.config["include_mangle_table"] = self.config_include_mangle_check.isChecked()
+        self.config["use_probe_agent"] = self.config_use_probe_agent_check.isChecked()
+        self.config["adaptive_timeouts"] = self.config_adaptive_timeouts_check.isChecked()
 
         QMessageBox.information(self,  "Success","Settings saved successfully!")
 
@@ -53,9 +53,12 @@ class HostCardWidget(QGroupBox):
         self.btn_toggle.setFixedSize(32, 32)
 
         self.btn_edit_ports = QPushButton("Edit Ports")
+        self.btn_metrics = QPushButton("Metrics")
+        self.btn_metrics.setToolTip("Per-port counters and latencies of this host's server")
 
         status_layout.addWidget(self.lbl_status)
         status_layout.addStretch(1)
+        status_layout.addWidget(self.btn_metrics)
         status_layout.addWidget(self.btn_edit_ports)
         status_layout.addWidget(self.btn_toggle)
 